@@ -0,0 +1,77 @@
+"""
+Benchmark of the map geometry stage: one year of fleet data, projected to EPSG:3857 and split into one line per flight.
+
+legacy: shapely Point per row -> GeoDataFrame.to_crs -> groupby("ID").apply(LineString)
+vectorized: main.track_geometry -> main.track_lines
+
+Usage: python benchmarks/bench_geometry.py [--aircraft 7] [--flights 150] [--points 400]
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point, LineString
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+
+
+def synthetic_tracks(flights, points, seed):
+    """
+    Random-walk tracks around Kansas City, formatted like the output of main.db_data_getter
+
+    :return: pandas df = [time, latitude, longitude, knots, altitude, ID]
+    """
+    rng = np.random.default_rng(seed)
+    n = flights * points
+    start_lat = np.repeat(rng.uniform(37.0, 40.5, flights), points)
+    start_lon = np.repeat(rng.uniform(-96.5, -92.5, flights), points)
+    steps = rng.normal(0, 0.01, (2, n)).reshape(2, flights, points).cumsum(axis=2).reshape(2, n)
+    return pd.DataFrame({"time": "12:00:00",
+                         "latitude": (start_lat + steps[0]).astype(str),
+                         "longitude": (start_lon + steps[1]).astype(str),
+                         "knots": 100,
+                         "altitude": 3000,
+                         "ID": np.repeat(np.arange(1, flights + 1).astype(str), points)})
+
+
+def legacy(data_df):
+    geom = [Point(xy) for xy in zip(data_df["longitude"].astype(float), data_df["latitude"].astype(float))]
+    gdf = gpd.GeoDataFrame(data_df, geometry=geom)
+    gdf.crs = "EPSG:4326"
+    gdf = gdf.to_crs(epsg=3857)
+    return gdf.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
+
+
+def vectorized(data_df):
+    x, y, offsets = main.track_geometry(data_df)
+    return main.track_lines(x, y, offsets)
+
+
+def timed(func, fleet_data):
+    start = perf_counter()
+    for data_df in fleet_data:
+        func(data_df)
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aircraft", type=int, default=7)
+    parser.add_argument("--flights", type=int, default=150, help="flights per aircraft")
+    parser.add_argument("--points", type=int, default=400, help="track points per flight")
+    args = parser.parse_args()
+
+    fleet_data = [synthetic_tracks(args.flights, args.points, seed) for seed in range(args.aircraft)]
+    total = sum(len(x) for x in fleet_data)
+    print(f" {args.aircraft} aircraft, {args.flights} flights each, {total:,} track points")
+
+    t_legacy = timed(legacy, fleet_data)
+    t_vector = timed(vectorized, fleet_data)
+    print(f" legacy:     {t_legacy:8.3f} s")
+    print(f" vectorized: {t_vector:8.3f} s  ({t_legacy / t_vector:.1f}x faster)")
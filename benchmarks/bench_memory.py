@@ -0,0 +1,94 @@
+"""
+Benchmark of the in-memory size of the track data loaded by db_data_getter: one aircraft, several years of flights.
+
+legacy: read_sql dtypes (float64, int64, str per row), string flight ID, pd.concat once per flight
+compact: main.track_compact per flight (float32/int16/int32 numpy columns), one main.track_frame for the selection
+(columns concatenated once, categorical times)
+
+The peak is the highest memory allocated while building the dataframe (tracemalloc), the time is measured on a
+separate run without tracemalloc.
+
+Usage: python benchmarks/bench_memory.py [--flights 1000] [--points 400]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+
+
+def synthetic_tables(flights, points, seed=0):
+    """
+    Flight details tables as returned by pd.read_sql
+
+    :return: list of pandas df = [time, timestamp, latitude, longitude, knots, altitude]
+    """
+    rng = np.random.default_rng(seed)
+    tables = []
+    for _ in range(flights):
+        start = int(rng.integers(1_600_000_000, 1_700_000_000))
+        timestamp = start + np.arange(points) * 20
+        tables.append(pd.DataFrame({
+            "time": pd.to_datetime(timestamp, unit="s").strftime("%H:%M:%S").tolist(),
+            "timestamp": timestamp,
+            "latitude": (rng.uniform(37.0, 40.5) + rng.normal(0, 0.01, points).cumsum()).round(4),
+            "longitude": (rng.uniform(-96.5, -92.5) + rng.normal(0, 0.01, points).cumsum()).round(4),
+            "knots": rng.integers(60, 130, points),
+            "altitude": rng.integers(1000, 9500, points)}))
+    return tables
+
+
+def legacy(tables):
+    total_df = pd.DataFrame()
+    for i, res_df in enumerate(tables, 1):
+        res_df = res_df.copy()
+        res_df["ID"] = str(i)
+        total_df = pd.concat([total_df, res_df], ignore_index=True)
+    return total_df
+
+
+def compact(tables):
+    return main.track_frame([main.track_compact(res_df, i) for i, res_df in enumerate(tables, 1)])
+
+
+def measured(func, tables):
+    """
+    Build the dataframe twice: timed, then with tracemalloc on (it slows every allocation down, the time of that
+    run is not representative).
+
+    :return: (dataframe, seconds, peak MB allocated while building it)
+    :rtype: tuple
+    """
+    start = perf_counter()
+    func(tables)
+    seconds = perf_counter() - start
+    tracemalloc.start()
+    data_df = func(tables)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return data_df, seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flights", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=400, help="track points per flight")
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.flights, args.points)
+    print(f" {args.flights} flights, {args.flights * args.points:,} track points")
+
+    results = {}
+    for name, func in [("legacy", legacy), ("compact", compact)]:
+        data_df, seconds, peak = measured(func, tables)
+        size = data_df.memory_usage(deep=True).sum() / 1024 / 1024
+        results[name] = size
+        print(f" {name + ':':<9} {size:8.1f} MB dataframe  {peak:8.1f} MB peak  {seconds:7.2f} s")
+    print(f" compact dataframe is {results['legacy'] / results['compact']:.1f}x smaller")
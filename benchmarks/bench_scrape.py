@@ -0,0 +1,105 @@
+"""
+Concurrency and backoff benchmark of the track log scraping, against the local stand-in server (standin_server.py)
+with injected latency, throttling and errors. No database needed.
+
+Every track log of the synthetic fleet is fetched with main.flightaware_getter by 1, 2, 4... parallel workers. The
+stand-in server draws its faults from a fixed seed, so two runs with the same parameters are comparable. Reported per
+worker count: wall time, track logs per second, responses by status code (the 429/500 are the retried requests) and
+track logs that failed after main.HTTP_RETRIES retries.
+
+Usage: python benchmarks/bench_scrape.py [--aircraft 3] [--flights 30] [--points 400] [--workers 1 2 4 8]
+                                         [--latency 100] [--jitter 50] [--throttle 0.05] [--error 0.02] [--max-rps 0]
+                                         [--backoff 0.1] [--retries 4] [--pages DIR]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+from bench_suite import fixtures_writer, flight_url  # noqa: E402
+from standin_server import standin_server  # noqa: E402
+
+
+def fetch(url):
+    """
+    :return: True if the track log was scraped, False if flightaware_getter gave up
+    :rtype: bool
+    """
+    try:
+        main.flightaware_getter(url)
+        return True
+    except (SystemExit, main.requests.RequestException):
+        return False
+
+
+def bench_workers(urls, workers, args, pages_dir):
+    """
+    Fetch every url with the given number of workers, from a fresh stand-in server (same fault sequence each time)
+
+    :return: {"workers", "seconds", "per_second", "failed", "responses"}
+    :rtype: dict
+    """
+    server, base_url = standin_server(pages_dir, latency_ms=args.latency, jitter_ms=args.jitter,
+                                      throttle=args.throttle, error=args.error, max_rps=args.max_rps, seed=args.seed)
+    main.FLIGHTAWARE_URL = base_url
+    try:
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            scraped = list(pool.map(fetch, urls))
+        seconds = perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {"workers": workers, "seconds": seconds, "per_second": len(urls) / seconds,
+            "failed": scraped.count(False), "responses": dict(sorted(server.stats.items()))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aircraft", type=int, default=3)
+    parser.add_argument("--flights", type=int, default=30, help="flights per aircraft (at most 124)")
+    parser.add_argument("--points", type=int, default=400, help="track points per flight")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=100, help="ms added to every request")
+    parser.add_argument("--jitter", type=float, default=50, help="random +/- ms added to the latency")
+    parser.add_argument("--throttle", type=float, default=0.05, help="share of the requests answered 429")
+    parser.add_argument("--error", type=float, default=0.02, help="share of the requests answered 500")
+    parser.add_argument("--max-rps", type=int, default=0, help="requests per second above which 429 is answered")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backoff", type=float, default=0.1, help="main.HTTP_BACKOFF, seconds")
+    parser.add_argument("--retries", type=int, default=main.HTTP_RETRIES, help="main.HTTP_RETRIES")
+    parser.add_argument("--pages", help="recorded pages (see standin_server.py), default: synthetic pages")
+    parser.add_argument("--verbose", action="store_true", help="keep the main.py log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        main.logger.setLevel(logging.ERROR)
+    main.HTTP_BACKOFF = args.backoff
+    main.HTTP_RETRIES = args.retries
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.pages is None:
+            fleet = [f"NBENCH{i + 1}" for i in range(args.aircraft)]
+            histories = fixtures_writer(tmp, fleet, args.flights, args.points)
+            urls = [flight_url(aircraft, *flight) for aircraft, history in histories.items() for flight in history]
+            pages_dir = tmp
+        else:
+            pages_dir = args.pages
+            urls = sorted("/" + os.path.relpath(os.path.join(root, name), pages_dir)[:-len("/tracklog.html")]
+                          for root, _, files in os.walk(pages_dir) for name in files if name == "tracklog.html")
+        if not urls:
+            sys.exit(f" No track log in {pages_dir}")
+
+        print(f" {len(urls)} track logs, latency {args.latency:g} +/- {args.jitter:g} ms, throttle {args.throttle:g}, "
+              f"error {args.error:g}, max rps {args.max_rps or '-'}, backoff {args.backoff:g} s x {args.retries}")
+        print(f" {'workers':>8}{'seconds':>10}{'logs/s':>10}{'failed':>8}  responses")
+        for workers in args.workers:
+            stage = bench_workers(urls, workers, args, pages_dir)
+            print(f" {stage['workers']:>8}{stage['seconds']:>10.2f}{stage['per_second']:>10.1f}"
+                  f"{stage['failed']:>8}  {stage['responses']}")
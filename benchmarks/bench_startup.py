@@ -0,0 +1,56 @@
+"""
+Benchmark of the startup time: how long "import main" takes before the GUI window can be created.
+
+lazy: import main (the heavy modules are loaded on first use, see main._LazyModule)
+eager: import main + main.warm_imports(), everything loaded up front like before the lazy imports
+
+Each case runs in a fresh interpreter with -X importtime. The slowest top-level imports are listed.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from statistics import median
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CASES = {"lazy": "import main",
+         "eager": "import main; main.warm_imports()"}
+
+
+def importtime(code):
+    """
+    Run code in a fresh interpreter with -X importtime.
+
+    :return: {module: cumulative import time in seconds} of the top-level imports
+    :rtype: dict
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO, capture_output=True,
+                            text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        # nested imports are indented, only keep the top-level ones
+        if match and not match.group(2):
+            times[match.group(3)] = times.get(match.group(3), 0) + int(match.group(1)) / 1e6
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    totals = {}
+    for case, code in CASES.items():
+        runs = [importtime(code) for _ in range(args.runs)]
+        totals[case] = median(sum(run.values()) for run in runs)
+        print(f" {case}: {totals[case]:6.3f} s  (median of {args.runs})")
+        for module, seconds in sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"     {seconds:6.3f} s  {module}")
+    print(f" lazy imports: {totals['eager'] / totals['lazy']:.1f}x faster startup")
@@ -0,0 +1,372 @@
+"""
+Benchmark suite of the hot paths, run locally against saved pages and a local MySQL server.
+
+parse: convert24, convert_date and between_parentheses over large batches
+scrape: flightaware_getter on saved track log pages (no database needed)
+database: flightaware_history on a saved history page, db_data_saver and db_data_getter on synthetic flights,
+calculate_stats and headless full_area_map (no basemap)
+
+The pages are generated in a temporary directory and served by the local stand-in server without fault injection
+(standin_server.py, main.FLIGHTAWARE_URL and main.AIRNAV_URL point to it). The database stages use throw-away
+schemas (NBENCH1, NBENCH2, ...) and fake airports (ZZ01, ZZ02, ...) that are dropped at the end. They are skipped
+when no MySQL password is available (--password, FCKC_MYSQL_PW or config.json, see main.load_credentials).
+
+Results are written to JSON and compared against the stored baseline: a stage more than --threshold slower than the
+baseline is reported as a regression and the exit code is 1.
+
+Usage: python benchmarks/bench_suite.py [--aircraft 3] [--flights 30] [--points 400] [--batch 200000] [--repeat 3]
+                                        [--password ...] [--output benchmarks/results.json]
+                                        [--baseline benchmarks/baseline.json] [--threshold 0.2] [--save-baseline]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+from statistics import median
+from time import perf_counter
+
+import numpy as np
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+from standin_server import page_writer, standin_server  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Fake airports around Kansas City, (code, lat, lon)
+AIRPORTS = [("ZZ01", 38.8476, -94.7376), ("ZZ02", 38.9597, -94.3715), ("ZZ03", 39.1232, -94.5928),
+            ("ZZ04", 38.8309, -94.8903), ("ZZ05", 39.7719, -94.9097), ("ZZ06", 39.0687, -95.6225),
+            ("ZZ07", 38.8181, -92.2196), ("ZZ08", 37.2457, -93.3886)]
+MONTH, YEAR = "July", 2022
+
+
+def clock12(seconds, sep=""):
+    """
+    :param seconds: seconds since midnight
+    :return: 12-hour time, ex: 02:27:31PM
+    :rtype: str
+    """
+    hour = seconds // 3600 % 24
+    return (f"{(hour - 1) % 12 + 1:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}{sep}"
+            f"{'AM' if hour < 12 else 'PM'}")
+
+
+def synthetic_history(flights, seed):
+    """
+    Flights of one aircraft during MONTH YEAR, at most 4 per day so that every flight table name is unique.
+
+    :return: list of (day, local departure hour, origin index, destination index)
+    """
+    if flights > 31 * 4:
+        sys.exit(f" At most {31 * 4} flights per aircraft! ({flights})")
+    rng = np.random.default_rng(seed)
+    history = []
+    for i in range(flights):
+        origin, destination = rng.choice(len(AIRPORTS), 2, replace=False)
+        history.append((1 + i // 4, 8 + 2 * (i % 4), int(origin), int(destination)))
+    return history
+
+
+def flight_url(aircraft, day, hour, origin, destination):
+    """
+    :return: url of a synthetic flight, it holds the UTC departure (CDT + 5)
+    :rtype: str
+    """
+    return (f"/live/flight/{aircraft}/history/{YEAR}{7:02d}{day:02d}/{hour + 5:02d}27Z/"
+            f"{AIRPORTS[origin][0]}/{AIRPORTS[destination][0]}")
+
+
+def history_html(aircraft, history):
+    """
+    FlightAware history page (table "prettyTable fullWidth tablesaw tablesaw-stack"), parsed by flightaware_history
+    """
+    rows = ["<tr><th>Date</th><th>Aircraft Type</th><th>Origin</th><th>Destination</th><th>Departure</th>"
+            "<th>Arrival</th><th>Total</th></tr>"]
+    for day, hour, origin, destination in history:
+        orig, dest = AIRPORTS[origin][0], AIRPORTS[destination][0]
+        url = flight_url(aircraft, day, hour, origin, destination)
+        rows.append(f"<tr><td><a href=\"{url}\">{day:02d}-Jul-{YEAR}</a></td><td>P28A</td>"
+                    f"<td>Bench ({orig})</td><td>Bench ({dest})</td>"
+                    f"<td>{clock12(hour * 3600 + 1651)}</td><td>{clock12(hour * 3600 + 5530)}</td>"
+                    f"<td>1:05</td></tr>")
+    rows.append("<tr><td colspan=\"7\">Showing the last flights</td></tr>")
+    return ("<html><body><table class=\"prettyTable fullWidth tablesaw tablesaw-stack\">" +
+            "\n".join(rows) + "</table></body></html>")
+
+
+def tracklog_html(origin, destination, points):
+    """
+    FlightAware track log page (table "prettyTable fullWidth"), parsed by flightaware_getter.
+    Straight track between the two airports, one point every 30 seconds, climb/cruise/descent altitude profile.
+    Each data row has 10 cells separated by newlines: len(row) == 21 like the real pages.
+    """
+    lat = np.linspace(AIRPORTS[origin][1], AIRPORTS[destination][1], points)
+    lon = np.linspace(AIRPORTS[origin][2], AIRPORTS[destination][2], points)
+    climb = np.minimum(np.arange(points), np.arange(points)[::-1])
+    altitude = np.minimum(1000 + climb * 250, 5500)
+
+    rows = ["<tr><th colspan=\"10\">Track log</th></tr>", "<tr><th>Time</th><th>Latitude</th><th>Longitude</th>"
+            "<th>Course</th><th>kts</th><th>mph</th><th>feet</th><th>Rate</th><th>Delta</th><th>Facility</th></tr>"]
+    for i in range(points):
+        cells = [f"<td><span class=\"show-for-medium-up\">Fri {clock12(10 * 3600 + 1651 + i * 30, ' ')}</span></td>",
+                 f"<td><span class=\"show-for-medium-up\">{lat[i]:.4f}</span></td>",
+                 f"<td><span class=\"show-for-medium-up\">{lon[i]:.4f}</span></td>",
+                 "<td>90&deg;</td>",
+                 "<td class=\"show-for-medium-up-table\">105</td>",
+                 "<td>121</td>",
+                 f"<td><span class=\"show-for-medium-up\">{altitude[i]:,}</span></td>",
+                 "<td class=\"show-for-medium-up-table\">0</td>",
+                 "<td><span class=\"show-for-medium-up\">Level</span></td>",
+                 "<td>FlightAware ADS-B</td>"]
+        rows.append("<tr>\n" + "\n".join(cells) + "\n</tr>")
+    return "<html><body><table class=\"prettyTable fullWidth\">" + "\n".join(rows) + "</table></body></html>"
+
+
+def airnav_html(lat, lon):
+    """
+    airnav.com airport page: the decimal coordinates are the 3rd line of the 3rd row of the 7th table
+    """
+    tables = ["<table><tr><td></td></tr></table>"] * 6
+    tables.append(f"<table><tr><td>Location</td></tr><tr><td>FAA</td></tr>"
+                  f"<tr><td>Lat/Long:</td><td>{lat:.4f}N {-lon:.4f}W<br>estimated<br>{lat:.7f},{lon:.7f}<br>"
+                  f"(estimated)</td></tr></table>")
+    return "<html><body>" + "".join(tables) + "</body></html>"
+
+
+def fixtures_writer(fixture_dir, fleet, flights, points):
+    """
+    Save the pages of every synthetic aircraft at their url path, as served by standin_server: history page, track
+    log of every flight and airnav.com page of every airport
+
+    :return: {aircraft: history}
+    :rtype: dict
+    """
+    histories = {}
+    tracklogs = {}
+    for seed, aircraft in enumerate(fleet):
+        histories[aircraft] = synthetic_history(flights, seed)
+        page_writer(fixture_dir, f"/live/flight/{aircraft}/history/80", history_html(aircraft, histories[aircraft]))
+        for flight in histories[aircraft]:
+            route = flight[2:]
+            if route not in tracklogs:
+                tracklogs[route] = tracklog_html(*route, points)
+            page_writer(fixture_dir, flight_url(aircraft, *flight) + "/tracklog", tracklogs[route])
+    for code, lat, lon in AIRPORTS:
+        page_writer(fixture_dir, f"/airport/{code}", airnav_html(lat, lon))
+    return histories
+
+
+def timed(func, repeat, setup=None):
+    """
+    Run func repeat times.
+
+    :param setup: called before each run, not timed
+    :return: duration of each run in seconds
+    :rtype: list
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        func()
+        runs.append(perf_counter() - start)
+    return runs
+
+
+def result(runs, items):
+    """
+    :return: {"seconds": best run, "median", "runs", "items", "us_per_item"}
+    :rtype: dict
+    """
+    return {"seconds": min(runs), "median": median(runs), "runs": runs, "items": items,
+            "us_per_item": min(runs) / items * 1e6}
+
+
+def bench_parse(batch, repeat):
+    """
+    convert24, convert_date and between_parentheses over batches of FlightAware strings
+    """
+    rng = np.random.default_rng(0)
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    times = [f"{h:02d}:{m:02d}:{s:02d}{ampm}" for h, m, s, ampm in
+             zip(rng.integers(1, 13, batch), rng.integers(0, 60, batch), rng.integers(0, 60, batch),
+                 rng.choice(["AM", "PM"], batch))]
+    dates = [f"{d:02d}-{months[m]}-{y}" for d, m, y in
+             zip(rng.integers(1, 29, batch), rng.integers(0, 12, batch), rng.integers(2015, 2030, batch))]
+    titles = [f"Flight Track Log ✈ N81673 22-Jul-2022 ({AIRPORTS[a][0]}-{AIRPORTS[b][0]}) - FlightAware"
+              for a, b in zip(rng.integers(0, 8, batch), rng.integers(0, 8, batch))]
+
+    return {"convert24": result(timed(lambda: [main.convert24(x) for x in times], repeat), batch),
+            "convert_date": result(timed(lambda: [main.convert_date(x) for x in dates], repeat), batch),
+            "between_parentheses": result(timed(lambda: [main.between_parentheses(x) for x in titles], repeat),
+                                          batch)}
+
+
+def bench_scrape(histories, repeat):
+    """
+    flightaware_getter on every saved track log
+    """
+    urls = [flight_url(aircraft, *flight) for aircraft, history in histories.items() for flight in history]
+    runs = timed(lambda: [main.flightaware_getter(url) for url in urls], repeat)
+    return {"flightaware_getter": result(runs, len(urls))}
+
+
+def bench_schemas(fleet, create):
+    """
+    Drop the benchmark schemas and fake airports, then recreate empty schemas with a date_last_ran in the past
+    (every synthetic flight is new) when create is True.
+
+    :rtype: None
+    """
+    db = main.mysql_connector.connect(host=main.MYSQL_HOST, port=main.MYSQL_PORT, user=main.MYSQL_USER,
+                                      passwd=main.pw)
+    mycursor = db.cursor()
+    mycursor.execute("CREATE DATABASE IF NOT EXISTS date_last_ran")
+    mycursor.execute("CREATE TABLE IF NOT EXISTS date_last_ran.fleet(aircraft VARCHAR(10), date DATE)")
+    mycursor.execute("CREATE DATABASE IF NOT EXISTS airport_coords")
+    mycursor.execute("CREATE TABLE IF NOT EXISTS airport_coords.coords("
+                     "latitude FLOAT(9,4), "
+                     "longitude FLOAT(9,4), "
+                     "airport VARCHAR(15))")
+    codes = ", ".join(f"\"{code}\"" for code, _, _ in AIRPORTS)
+    mycursor.execute(f"DELETE FROM airport_coords.coords WHERE airport IN ({codes})")
+    for aircraft in fleet:
+        mycursor.execute(f"DROP DATABASE IF EXISTS {aircraft}")
+        mycursor.execute(f"DELETE FROM date_last_ran.fleet WHERE aircraft = \"{aircraft}\"")
+        if create:
+            mycursor.execute(f"CREATE DATABASE {aircraft}")
+            mycursor.execute(f"INSERT INTO date_last_ran.fleet (aircraft, date) "
+                             f"VALUES (\"{aircraft}\", \"2000-01-01\")")
+    db.commit()
+    db.close()
+
+
+def bench_database(fleet, flights, repeat, render_dir):
+    """
+    flightaware_history, db_data_saver, db_data_getter, calculate_stats and full_area_map on the synthetic fleet.
+    Every run starts from empty schemas and a cold in-memory layers cache.
+    """
+    runs = {name: [] for name in ["flightaware_history", "db_data_saver", "db_data_getter", "calculate_stats",
+                                  "full_area_map_lines", "full_area_map_points", "full_area_map_heatmap"]}
+    for _ in range(repeat):
+        bench_schemas(fleet, create=True)
+        runs["flightaware_history"] += timed(lambda: [main.flightaware_history(a) for a in fleet], 1)
+        runs["db_data_saver"] += timed(lambda: [main.db_data_saver(a) for a in fleet], 1)
+        runs["db_data_getter"] += timed(lambda: [main.db_data_getter(a, MONTH, YEAR) for a in fleet], 1)
+        runs["calculate_stats"] += timed(lambda: main.calculate_stats(fleet, MONTH, YEAR), 1, main.layers_cache.clear)
+        for option in ["Lines", "Points", "Heatmap"]:
+            output = os.path.join(render_dir, f"{option}.png")
+            runs[f"full_area_map_{option.lower()}"] += timed(
+                lambda: main.full_area_map(fleet, MONTH, YEAR, option, False, output=output), 1,
+                main.layers_cache.clear)
+
+    items = {"flightaware_history": len(fleet) * flights, "db_data_saver": len(fleet) * flights,
+             "db_data_getter": len(fleet) * flights}
+    return {name: result(values, items.get(name, 1)) for name, values in runs.items()}
+
+
+def compare(results, baseline, threshold):
+    """
+    Print each stage against the baseline.
+
+    :return: names of the stages more than threshold slower than the baseline
+    :rtype: list
+    """
+    if baseline["params"] != results["params"]:
+        print(f" Warning: the baseline was run with other parameters: {baseline['params']}")
+    regressions = []
+    print(f" {'stage':<24}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, current in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if "seconds" not in current or base is None or "seconds" not in base:
+            continue
+        ratio = current["seconds"] / base["seconds"]
+        status = ""
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        print(f" {name:<24}{base['seconds']:>11.4f}s{current['seconds']:>11.4f}s{ratio:>7.2f}x  {status}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aircraft", type=int, default=3)
+    parser.add_argument("--flights", type=int, default=30, help="flights per aircraft (at most 124)")
+    parser.add_argument("--points", type=int, default=400, help="track points per flight")
+    parser.add_argument("--batch", type=int, default=200_000, help="strings per parse batch")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best one is kept")
+    parser.add_argument("--password", help="MySQL password, default: FCKC_MYSQL_PW or config.json")
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as a regression (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--verbose", action="store_true", help="keep the main.py log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        main.logger.setLevel(logging.WARNING)
+    main.HEADLESS = True
+    main.BASEMAP = False
+    main.SCRAPE_DELAY = 0
+    fleet = [f"NBENCH{i + 1}" for i in range(args.aircraft)]
+
+    results = {"created": datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "machine": platform.machine(),
+               "params": {"aircraft": args.aircraft, "flights": args.flights, "points": args.points,
+                          "batch": args.batch},
+               "stages": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        histories = fixtures_writer(tmp, fleet, args.flights, args.points)
+        server, main.FLIGHTAWARE_URL = standin_server(tmp)
+        main.AIRNAV_URL = main.FLIGHTAWARE_URL
+
+        print(f" parse: {args.batch:,} strings per batch")
+        results["stages"].update(bench_parse(args.batch, args.repeat))
+        print(f" scrape: {args.aircraft * args.flights} track logs of {args.points} points")
+        results["stages"].update(bench_scrape(histories, args.repeat))
+
+        if args.password is not None:
+            main.pw = args.password
+        if args.password is None and not main.load_credentials():
+            print(" database: skipped, no MySQL password (--password, FCKC_MYSQL_PW or config.json)")
+            results["stages"]["database"] = {"skipped": "no MySQL password"}
+        else:
+            print(f" database: {args.aircraft} aircraft, {args.flights} flights each")
+            try:
+                results["stages"].update(bench_database(fleet, args.flights, args.repeat, tmp))
+            finally:
+                bench_schemas(fleet, create=False)
+
+    for name, stage in results["stages"].items():
+        if "seconds" in stage:
+            print(f"     {name:<24}{stage['seconds']:>9.4f} s  ({stage['us_per_item']:,.1f} us/item)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f" Results saved to {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f" Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    else:
+        print(f" No baseline at {args.baseline}, run with --save-baseline to store one")
+
+    if regressions:
+        print(f" {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
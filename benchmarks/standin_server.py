@@ -0,0 +1,207 @@
+"""
+Local stand-in for FlightAware and airnav.com: serves recorded pages with configurable latency, throttling and errors,
+for repeatable concurrency and backoff benchmarks without hitting the real sites.
+
+Pages are stored under the pages directory at their url path + ".html":
+    live/flight/<aircraft>/history/80.html                                       history page
+    live/flight/<aircraft>/history/<date>/<time>Z/<orig>/<dest>/tracklog.html    track log
+    airport/<code>.html                                                          airnav.com airport page
+
+Each request is delayed by --latency +/- --jitter ms, then answered 429 (Retry-After: 1) above --max-rps requests per
+second or with probability --throttle, 500 with probability --error, else the recorded page (404 if there is none).
+The faults are drawn from a seeded generator (--seed). GET /__stats returns the number of responses per status code.
+
+Point main.py at it with FCKC_FLIGHTAWARE_URL and FCKC_AIRNAV_URL (both sites are served on the same port).
+
+Usage: python benchmarks/standin_server.py serve --pages DIR [--port 8080] [--latency 0] [--jitter 0] [--throttle 0]
+                                                 [--error 0] [--max-rps 0] [--seed 0]
+       python benchmarks/standin_server.py generate --pages DIR [--aircraft 3] [--flights 30] [--points 400]
+       python benchmarks/standin_server.py record --pages DIR --tail N81673 [--limit 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import monotonic, sleep
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+
+
+def page_path(pages_dir, url_path):
+    """
+    :param url_path: path of the url, ex: /airport/KOJC
+    :return: file of the recorded page, None if the path leaves the pages directory
+    :rtype: str
+    """
+    root = os.path.abspath(pages_dir)
+    path = os.path.abspath(os.path.join(root, url_path.split("?")[0].strip("/") + ".html"))
+    return path if path.startswith(root + os.sep) else None
+
+
+def page_writer(pages_dir, url_path, body):
+    """
+    Save a page at its url path
+
+    :rtype: None
+    """
+    path = page_path(pages_dir, url_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+
+
+def standin_server(pages_dir, port=0, latency_ms=0.0, jitter_ms=0.0, throttle=0.0, error=0.0, max_rps=0, seed=0):
+    """
+    Serve the recorded pages on localhost in a background thread.
+
+    :param port: 0 picks a free port
+    :param throttle: share of the requests answered 429
+    :param error: share of the requests answered 500
+    :param max_rps: requests per second above which the requests are answered 429, 0 for no limit
+    :return: (server, base url). server.stats counts the responses per status code, server.shutdown() stops it
+    :rtype: tuple
+    """
+    rng = random.Random(seed)
+    lock = Lock()
+    recent = deque()
+
+    def fault():
+        """
+        :return: (delay in seconds, status code forced by the fault injection or None)
+        """
+        with lock:
+            delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+            now = monotonic()
+            while recent and recent[0] < now - 1:
+                recent.popleft()
+            recent.append(now)
+            if (max_rps and len(recent) > max_rps) or rng.random() < throttle:
+                return delay, 429
+            if rng.random() < error:
+                return delay, 500
+        return delay, None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/__stats":
+                with lock:
+                    self.reply(200, json.dumps(dict(server.stats)).encode(), "application/json")
+                return
+            delay, status = fault()
+            sleep(delay)
+            if status == 429:
+                self.reply(429, b"Too Many Requests", headers={"Retry-After": "1"})
+                return
+            if status == 500:
+                self.reply(500, b"Internal Server Error")
+                return
+            path = page_path(pages_dir, self.path)
+            if path is None or not os.path.exists(path):
+                self.reply(404, b"Not Found")
+                return
+            with open(path, "rb") as f:
+                self.reply(200, f.read())
+
+        def reply(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+            if self.path != "/__stats":
+                with lock:
+                    server.stats[status] += 1
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.stats = Counter()
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def record(pages_dir, tail, limit):
+    """
+    Save the live FlightAware history page of an aircraft, the track logs of its last flights and the airnav.com
+    pages of their airports. The requests are spaced by main.SCRAPE_DELAY.
+
+    :param limit: most recent flights recorded
+    :rtype: None
+    """
+    history_path = f"/live/flight/{tail}/history/80"
+    r = main.http_get(main.FLIGHTAWARE_URL + history_path)
+    if r.status_code != 200:
+        sys.exit(f" Failed to get {history_path}: status code {r.status_code}")
+    page_writer(pages_dir, history_path, r.text)
+
+    soup = main.bs4.BeautifulSoup(r.text, "html.parser")
+    urls = []
+    for link in soup.select("table.prettyTable a[href]"):
+        href = link["href"].split("?")[0]
+        if href.startswith(f"/live/flight/{tail}/history/") and href.count("/") == 8 and href not in urls:
+            urls.append(href)
+    airports = set()
+    for url in urls[:limit]:
+        main.pause(main.SCRAPE_DELAY)
+        r = main.http_get(main.FLIGHTAWARE_URL + url + "/tracklog")
+        if r.status_code == 200:
+            page_writer(pages_dir, url + "/tracklog", r.text)
+            airports |= set(url.split("/")[-2:])
+        print(f" {r.status_code} {url}/tracklog")
+    for airport in sorted(airports):
+        r = main.http_get(main.AIRNAV_URL + "/airport/" + airport)
+        if r.status_code == 200:
+            page_writer(pages_dir, "/airport/" + airport, r.text)
+        print(f" {r.status_code} /airport/{airport}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="serve the recorded pages")
+    serve.add_argument("--pages", required=True, help="directory of the recorded pages")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--latency", type=float, default=0, help="ms added to every request")
+    serve.add_argument("--jitter", type=float, default=0, help="random +/- ms added to the latency")
+    serve.add_argument("--throttle", type=float, default=0, help="share of the requests answered 429")
+    serve.add_argument("--error", type=float, default=0, help="share of the requests answered 500")
+    serve.add_argument("--max-rps", type=int, default=0, help="requests per second above which 429 is answered")
+    serve.add_argument("--seed", type=int, default=0)
+    generate = commands.add_parser("generate", help="write synthetic pages of NBENCH1, NBENCH2... (bench_suite)")
+    generate.add_argument("--pages", required=True)
+    generate.add_argument("--aircraft", type=int, default=3)
+    generate.add_argument("--flights", type=int, default=30, help="flights per aircraft (at most 124)")
+    generate.add_argument("--points", type=int, default=400, help="track points per flight")
+    recorder = commands.add_parser("record", help="save the live pages of an aircraft")
+    recorder.add_argument("--pages", required=True)
+    recorder.add_argument("--tail", required=True, help="aircraft tail number, ex: N81673")
+    recorder.add_argument("--limit", type=int, default=20, help="most recent flights recorded")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        from bench_suite import fixtures_writer
+        fixtures_writer(args.pages, [f"NBENCH{i + 1}" for i in range(args.aircraft)], args.flights, args.points)
+        print(f" Synthetic pages saved to {args.pages}")
+    elif args.command == "record":
+        record(args.pages, args.tail, args.limit)
+    else:
+        server, base_url = standin_server(args.pages, args.port, args.latency, args.jitter, args.throttle,
+                                          args.error, args.max_rps, args.seed)
+        print(f" Serving {args.pages} on {base_url}")
+        print(f" export FCKC_FLIGHTAWARE_URL={base_url} FCKC_AIRNAV_URL={base_url}")
+        try:
+            while True:
+                sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+            print(f" Responses: {dict(server.stats)}")
@@ -0,0 +1,379 @@
+"""
+Synthetic fleet generator for load testing. Writes realistic flights into the real MySQL storage schema, so that every
+storage, stats and render path can be run at a multiple of the real club data.
+
+Each aircraft (NSYN001, NSYN002, ...) gets its own schema with flight_history and one track table per flight, then
+the same derived tables as an ingest: landings, track_index, heatmap, utilization_daily and data_version. The aircraft
+are added to date_last_ran.fleet and the airports to airport_coords.coords (when missing).
+
+Flights start from a home airport around Kansas City: local flights to a practice area and back, or trips to another
+airport of the region followed by the return leg. Tracks follow the great circle between the airports, one point every
+--interval seconds, with a climb/cruise/descent altitude profile and the matching ground speeds.
+
+Scale: 7 aircraft x 2 years x ~12 flights a month is roughly the real club data.
+    10x:  --aircraft 70
+    100x: --aircraft 70 --flights 120
+
+The synthetic aircraft are not in main.FLEET, select them with --fleet:
+    python main.py stats --fleet NSYN001 NSYN002 --year 2023 --month All
+    python main.py render --fleet NSYN001 NSYN002 --year 2023 --month July
+
+Usage: python benchmarks/synthetic_fleet.py [--aircraft 7] [--years 2] [--flights 12] [--interval 20] [--seed 0]
+                                            [--workers 4] [--prefix NSYN] [--password ...] [--drop]
+"""
+
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+
+# Airports of the region: (code, lat, lon, elevation in feet). The first ones are the home airports
+AIRPORTS = [("KOJC", 38.8476, -94.7376, 1096), ("KLXT", 38.9597, -94.3715, 1004), ("KMKC", 39.1232, -94.5928, 759),
+            ("KIXD", 38.8309, -94.8903, 1087), ("KGPH", 39.3325, -94.3096, 777), ("KSTJ", 39.7719, -94.9097, 826),
+            ("KTOP", 39.0687, -95.6225, 881), ("KFOE", 38.9509, -95.6636, 1078), ("KLWC", 39.0112, -95.2166, 833),
+            ("KOWI", 38.5387, -95.2530, 966), ("KMHK", 39.1410, -96.6708, 1066), ("KEMP", 38.3321, -96.1912, 1208),
+            ("KICT", 37.6499, -97.4331, 1333), ("KSLN", 38.7910, -97.6522, 1288), ("KCOU", 38.8181, -92.2196, 889),
+            ("KJEF", 38.5912, -92.1561, 549), ("KSGF", 37.2457, -93.3886, 1268), ("KDMO", 38.7074, -93.1759, 909),
+            ("KCDJ", 39.8203, -93.5761, 764), ("KIRK", 40.0935, -92.5449, 966), ("KJLN", 37.1518, -94.4983, 981),
+            ("KOMA", 41.3032, -95.8941, 984), ("KLNK", 40.8510, -96.7592, 1219), ("KDSM", 41.5340, -93.6631, 958),
+            ("KSUS", 38.6621, -90.6520, 463), ("KBVO", 36.7625, -96.0112, 715), ("KXNA", 36.2819, -94.3068, 1287)]
+HOME_AIRPORTS = 4
+# Share of the flights that are local (practice area and back to the home airport)
+LOCAL_SHARE = 0.4
+# No outing leaves the home airport later than this (local time)
+LAST_DEPARTURE = pd.Timedelta(hours=19)
+
+
+def great_circle(lat1, lon1, lat2, lon2, fraction):
+    """
+    Points along the great circle between two positions.
+
+    :param fraction: array of positions along the route, 0 = start, 1 = end
+    :return: lat, lon arrays in degrees
+    :rtype: tuple
+    """
+    lat1, lon1, lat2, lon2 = np.radians([lat1, lon1, lat2, lon2])
+    start = np.array([np.cos(lat1) * np.cos(lon1), np.cos(lat1) * np.sin(lon1), np.sin(lat1)])
+    end = np.array([np.cos(lat2) * np.cos(lon2), np.cos(lat2) * np.sin(lon2), np.sin(lat2)])
+    angle = np.arccos(np.clip(start @ end, -1, 1))
+    if angle < 1e-9:
+        xyz = np.repeat(start[:, None], len(fraction), axis=1)
+    else:
+        # spherical linear interpolation between the two unit vectors
+        xyz = (np.sin((1 - fraction) * angle) * start[:, None] +
+               np.sin(fraction * angle) * end[:, None]) / np.sin(angle)
+    return np.degrees(np.arcsin(xyz[2])), np.degrees(np.arctan2(xyz[1], xyz[0]))
+
+
+def synthetic_track(waypoints, elevation, cruise_kts, interval, rng):
+    """
+    Track of one flight along the great circles between its waypoints.
+    Climb at 700 fpm and 80 kts, cruise, descent at 500 fpm and 120 kts, slower on the runway and in the pattern.
+
+    :param waypoints: [(lat, lon), ...] from the departure to the arrival airport
+    :type waypoints: list
+    :param elevation: field elevation (ft) of the departure and arrival airports
+    :type elevation: tuple
+    :param cruise_kts: cruise ground speed
+    :param interval: seconds between two track points
+    :param rng: numpy random generator
+    :return: seconds since departure, lat, lon, knots, altitude arrays
+    :rtype: tuple
+    """
+    legs = [main.haversine_nm(a[0], a[1], b[0], b[1]) for a, b in zip(waypoints[:-1], waypoints[1:])]
+    distance = sum(legs)
+
+    # cruise altitude grows with the distance, lowered when the flight is too short to reach it
+    cruise_alt = min(9500, 3500 + 500 * int(distance // 25))
+    while cruise_alt > max(elevation) + 1500:
+        climb_nm = 80 * (cruise_alt - elevation[0]) / 700 / 60
+        descent_nm = 120 * (cruise_alt - elevation[1]) / 500 / 60
+        if climb_nm + descent_nm < 0.8 * distance:
+            break
+        cruise_alt -= 500
+    climb_s = (cruise_alt - elevation[0]) / 700 * 60
+    descent_s = (cruise_alt - elevation[1]) / 500 * 60
+    cruise_s = max(0.0, (distance - 80 * climb_s / 3600 - 120 * descent_s / 3600) / cruise_kts * 3600)
+    total_s = 60 + climb_s + cruise_s + descent_s + 120
+
+    t = np.arange(0, total_s + interval, interval, dtype=float)
+    phases = np.cumsum([60, climb_s, cruise_s, descent_s])
+    knots = np.select([t < phases[0], t < phases[1], t < phases[2], t < phases[3]], [55, 80, cruise_kts, 120], 70)
+    altitude = np.select([t < phases[0], t < phases[1], t < phases[2], t < phases[3]],
+                         [elevation[0],
+                          elevation[0] + (t - phases[0]) / 60 * 700,
+                          cruise_alt,
+                          cruise_alt - (t - phases[2]) / 60 * 500],
+                         elevation[1] + 200 * (1 - (t - phases[3]) / 120))
+    knots = knots + rng.normal(0, 3, len(t))
+    altitude = altitude + rng.normal(0, 25, len(t))
+
+    # position along the route from the ground speed, stretched to end exactly on the arrival airport
+    flown = np.r_[0, np.cumsum(knots[1:] * interval / 3600)]
+    flown = flown / flown[-1] * distance
+    lat = np.empty(len(t))
+    lon = np.empty(len(t))
+    start = 0.0
+    # each leg overwrites the points flown past its start
+    for (a, b), length in zip(zip(waypoints[:-1], waypoints[1:]), legs):
+        on_leg = flown >= start
+        lat[on_leg], lon[on_leg] = great_circle(a[0], a[1], b[0], b[1],
+                                                np.clip((flown[on_leg] - start) / max(length, 1e-9), 0, 1))
+        start += length
+    return t, lat, lon, np.round(knots).astype(int), np.round(altitude).astype(int)
+
+
+def practice_area(lat, lon, rng):
+    """
+    Random point 12 to 30 nm away from an airport, used as the turnaround of the local flights
+
+    :rtype: tuple
+    """
+    bearing = rng.uniform(0, 2 * np.pi)
+    distance = rng.uniform(12, 30) / 60
+    return lat + distance * np.cos(bearing), lon + distance * np.sin(bearing) / np.cos(np.radians(lat))
+
+
+def synthetic_flights(home, start, end, flights, interval, rng):
+    """
+    Flights of one aircraft between two dates: on average `flights` legs a month, a Poisson number of outings a day.
+    An outing is a local flight, or a trip to another airport and the return leg on the same day. The outings of a
+    day follow each other, an hour on the ground in between, and none leaves after LAST_DEPARTURE (local time).
+
+    :param home: index of the home airport in AIRPORTS
+    :param start: first day
+    :type start: datetime.date
+    :param end: last day
+    :type end: datetime.date
+    :return: list of (flight_history row [date, route, dept_time, time_aloft, url], track dataframe)
+    :rtype: list
+    """
+    result = []
+    days = (end - start).days + 1
+    # a trip counts as two legs
+    outings_per_day = flights / 30.4 / (2 - LOCAL_SHARE)
+    # nearby airports are visited more often
+    dist = np.array([main.haversine_nm(AIRPORTS[home][1], AIRPORTS[home][2], a[1], a[2]) for a in AIRPORTS])
+    weights = np.where(dist > 0, 1 / np.maximum(dist, 10), 0)
+    weights = weights / weights.sum()
+    outings = rng.poisson(outings_per_day, days)
+    for day in np.flatnonzero(outings):
+        flight_date = start + timedelta(days=int(day))
+        cruise_kts = rng.normal(112, 8)
+        legs = []
+        for _ in range(outings[day]):
+            if rng.random() < LOCAL_SHARE:
+                legs.append((home, home))
+            else:
+                destination = int(rng.choice(len(AIRPORTS), p=weights))
+                legs += [(home, destination), (destination, home)]
+
+        # local departure time (Central), the next leg leaves an hour after landing.
+        # The busier the day, the earlier the first departure.
+        latest = max(8 * 60, 15 * 60 - 90 * (len(legs) - 1))
+        departure = pd.Timestamp(flight_date) + pd.Timedelta(minutes=int(rng.integers(7 * 60, latest + 1)))
+        last_departure = pd.Timestamp(flight_date) + LAST_DEPARTURE
+        for origin, destination in legs:
+            # an outing only starts if it is back home by the night (a return leg always flies)
+            if departure > last_departure and origin == home:
+                break
+            orig, dest = AIRPORTS[origin], AIRPORTS[destination]
+            if origin == destination:
+                waypoints = [orig[1:3], practice_area(orig[1], orig[2], rng), dest[1:3]]
+            else:
+                waypoints = [orig[1:3], dest[1:3]]
+            t, lat, lon, knots, altitude = synthetic_track(waypoints, (orig[3], dest[3]), cruise_kts, interval, rng)
+
+            dept_utc = departure.tz_localize("America/Chicago").tz_convert("UTC")
+            epoch = int(dept_utc.timestamp()) + t.astype(np.int64)
+            # FlightAware lists the track times in its own timezone (see main.track_timestamps)
+            clock = pd.to_datetime(epoch, unit="s", utc=True).tz_convert(main.FLIGHTAWARE_TZ).strftime("%H:%M:%S")
+            track_df = pd.DataFrame({"time": clock, "timestamp": epoch, "latitude": lat.round(4),
+                                     "longitude": lon.round(4), "knots": knots, "altitude": altitude})
+
+            aloft = int(t[-1] // 60)
+            route = f"{orig[0]}_{dest[0]}"
+            url = f"/live/flight/{{aircraft}}/history/{dept_utc:%Y%m%d}/{dept_utc:%H%M}Z/{orig[0]}/{dest[0]}"
+            row = [str(flight_date), route, departure.strftime("%H_%M"), f"{aloft // 60}:{aloft % 60:02d}", url]
+            result.append((row, track_df))
+            departure += pd.Timedelta(seconds=float(t[-1]) + 3600)
+    return result
+
+
+def admin_execute(statements):
+    """
+    Run statements on the MySQL server without selecting a schema.
+
+    :type statements: list
+    :return: rows returned by the last statement
+    :rtype: list
+    """
+    db = main.mysql_connector.connect(host=main.MYSQL_HOST, port=main.MYSQL_PORT, user=main.MYSQL_USER,
+                                      passwd=main.pw)
+    mycursor = db.cursor()
+    rows = []
+    for statement in statements:
+        mycursor.execute(statement)
+        rows = mycursor.fetchall() if mycursor.with_rows else []
+    db.commit()
+    db.close()
+    return rows
+
+
+def synthetic_schemas(prefix):
+    """
+    Schemas created by this generator: <prefix>### that are not club aircraft
+
+    :rtype: list
+    """
+    known = {entry[0].lower() for entry in main.FLEET}
+    schemas = [row[0] for row in admin_execute(["SHOW DATABASES"])]
+    return [s for s in schemas if re.fullmatch(f"{prefix.lower()}\\d{{3}}", s.lower()) and s.lower() not in known]
+
+
+def airports_saver():
+    """
+    Add the AIRPORTS missing from airport_coords.coords, used by the landing detection and the map labels
+
+    :rtype: None
+    """
+    existing = {row[0] for row in admin_execute(["CREATE DATABASE IF NOT EXISTS airport_coords",
+                                                 "CREATE TABLE IF NOT EXISTS airport_coords.coords("
+                                                 "latitude FLOAT(9,4), longitude FLOAT(9,4), airport VARCHAR(15))",
+                                                 "SELECT airport FROM airport_coords.coords"])}
+    missing = [a for a in AIRPORTS if a[0] not in existing]
+    if missing:
+        admin_execute(["INSERT INTO airport_coords.coords (latitude, longitude, airport) VALUES " +
+                       ", ".join(f"({lat}, {lon}, \"{code}\")" for code, lat, lon, _ in missing)])
+    main.logger.info(f" {len(missing)} airports added to airport_coords.coords")
+
+
+def aircraft_writer(aircraft, home, start, end, flights, interval, seed, index):
+    """
+    Generate and store the flights of one aircraft, then build its derived tables like an ingest does.
+
+    :param index: airport spatial index from main.airport_index()
+    :return: (number of flights, number of track points)
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    generated = synthetic_flights(home, start, end, flights, interval, rng)
+    admin_execute([f"DROP DATABASE IF EXISTS {aircraft}",
+                   f"CREATE DATABASE {aircraft}",
+                   f"DELETE FROM date_last_ran.fleet WHERE aircraft = \"{aircraft}\"",
+                   f"INSERT INTO date_last_ran.fleet (aircraft, date) VALUES (\"{aircraft}\", \"{date.today()}\")"])
+
+    db = main.mysql_connect(aircraft)
+    mycursor = db.cursor()
+    mycursor.execute("CREATE TABLE IF NOT EXISTS flight_history("
+                     "date DATE, "
+                     "route VARCHAR(15), "
+                     "dept_time VARCHAR(15), "
+                     "time_aloft VARCHAR(6), "
+                     "url VARCHAR(100))")
+    mycursor.executemany("INSERT INTO flight_history (date, route, dept_time, time_aloft, url) "
+                         "VALUES (%s, %s, %s, %s, %s)",
+                         [row[:4] + [row[4].format(aircraft=aircraft)] for row, _ in generated])
+
+    saved = []
+    landings = []
+    index_rows = []
+    points = 0
+    for row, track_df in generated:
+        flight = main.flight_table_name(*row[:3])
+        if flight in saved:
+            continue
+        mycursor.execute(f"CREATE TABLE {flight}("
+                         "time VARCHAR(8), "
+                         "timestamp BIGINT, "
+                         "latitude FLOAT, "
+                         "longitude FLOAT, "
+                         "knots MEDIUMINT(5), "
+                         "altitude MEDIUMINT(5))")
+        mycursor.executemany(f"INSERT INTO {flight} (time, timestamp, latitude, longitude, knots, altitude) "
+                             f"VALUES (%s, %s, %s, %s, %s, %s)",
+                             list(track_df.astype(object).itertuples(index=False, name=None)))
+        db.commit()
+        saved.append(flight)
+        points += len(track_df)
+
+        landings_df = main.detect_landings(track_df, index)
+        landings_df.insert(0, "flight", flight)
+        landings_df.insert(1, "date", row[0])
+        landings.append(landings_df)
+        index_row = main.track_index_row(flight, row[0], track_df)
+        if index_row is not None:
+            index_rows.append(index_row)
+
+    main.create_landings_table(mycursor)
+    main.create_track_index_table(mycursor)
+    mycursor.executemany("REPLACE INTO track_index (flight, date, min_lon, min_lat, max_lon, max_lat, geom) "
+                         "VALUES (%s, %s, %s, %s, %s, %s, %s)", index_rows)
+    db.commit()
+    db.close()
+    if landings:
+        pd.concat(landings, ignore_index=True).to_sql("landings", main.mysql_engine(aircraft), if_exists="append",
+                                                     index=False)
+
+    main.data_version_bump(aircraft, saved)
+    main.heatmap_update(aircraft)
+    main.utilization_refresh(aircraft)
+    main.logger.info(f" {aircraft}: {len(saved)} flights, {points:,} track points")
+    return len(saved), points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aircraft", type=int, default=7)
+    parser.add_argument("--years", type=int, default=2, help="years of history, ending today")
+    parser.add_argument("--flights", type=float, default=12, help="average legs per aircraft per month")
+    parser.add_argument("--interval", type=int, default=20, help="seconds between two track points")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4, help="aircraft generated in parallel")
+    parser.add_argument("--prefix", default="NSYN", help="tail number prefix of the synthetic aircraft")
+    parser.add_argument("--password", help="MySQL password, default: FCKC_MYSQL_PW or config.json")
+    parser.add_argument("--drop", action="store_true", help="only drop the synthetic aircraft and exit")
+    args = parser.parse_args()
+
+    if len(args.prefix) < 3 or not args.prefix.isalpha():
+        sys.exit(f" The prefix must be at least 3 letters! ({args.prefix})")
+    if args.password is not None:
+        main.pw = args.password
+    elif not main.load_credentials():
+        sys.exit(" No MySQL password (--password, FCKC_MYSQL_PW or config.json)")
+
+    admin_execute(["CREATE DATABASE IF NOT EXISTS date_last_ran",
+                   "CREATE TABLE IF NOT EXISTS date_last_ran.fleet(aircraft VARCHAR(10), date DATE)"])
+    if args.drop:
+        schemas = synthetic_schemas(args.prefix)
+        admin_execute([f"DROP DATABASE {schema}" for schema in schemas] +
+                      [f"DELETE FROM date_last_ran.fleet WHERE aircraft = \"{schema}\"" for schema in schemas])
+        main.logger.info(f" {len(schemas)} synthetic aircraft dropped")
+        sys.exit()
+
+    fleet = [f"{args.prefix.upper()}{i + 1:03d}" for i in range(args.aircraft)]
+    if any(aircraft in [entry[0] for entry in main.FLEET] for aircraft in fleet):
+        sys.exit(f" The prefix {args.prefix} matches club aircraft!")
+    end = date.today()
+    start = (pd.Timestamp(end) - pd.DateOffset(years=args.years)).date()
+
+    started = perf_counter()
+    airports_saver()
+    airport_idx = main.airport_index()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(aircraft_writer, aircraft, i % HOME_AIRPORTS, start, end, args.flights, args.interval,
+                               [args.seed, i], airport_idx) for i, aircraft in enumerate(fleet)]
+        totals = np.array([future.result() for future in futures])
+
+    print(f" {len(fleet)} aircraft from {start} to {end}: {totals[:, 0].sum():,} flights, "
+          f"{totals[:, 1].sum():,} track points in {perf_counter() - started:.0f} s")
+    print(f" Fleet: {' '.join(fleet)}")
@@ -6,25 +6,85 @@ Author: Jordan Becquer
 """
 
 import sys
+import os
+import re
+import json
+import hashlib
+import shutil
+import argparse
+import multiprocessing
+import csv
+import getpass
+import random
+import signal
+from urllib.parse import quote_plus
+import importlib
 from math import radians, cos, sin, asin, sqrt
-import geopandas
-import mysql.connector
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-from sqlalchemy import create_engine
-from shapely.geometry import Point, LineString
-import geopandas as gpd
-from geopandas import GeoDataFrame
-import matplotlib.pyplot as plt
 import logging
+from logging.handlers import QueueHandler
 import tkinter as tk
 from tkinter import ttk
 from tkinter.scrolledtext import ScrolledText
-from time import sleep
+from time import sleep, perf_counter
 from datetime import datetime
-from threading import Thread
-import contextily as ctx
+import queue
+from threading import Event, Lock, Thread, local
+from collections import OrderedDict
+from itertools import count
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+
+class _LazyModule:
+    """
+    Stand-in for a heavy module, imported on the first attribute access (ex: pd.DataFrame).
+    The GUI window opens without waiting for pandas, shapely, matplotlib... to load, see warm_imports.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        _lazy_modules.append(self)
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{'' if self._module is None else ' (loaded)'}>"
+
+
+_lazy_modules = []
+np = _LazyModule("numpy")
+pd = _LazyModule("pandas")
+requests = _LazyModule("requests")
+bs4 = _LazyModule("bs4")
+mysql_connector = _LazyModule("mysql.connector")
+sqlalchemy = _LazyModule("sqlalchemy")
+shapely_geometry = _LazyModule("shapely.geometry")
+strtree = _LazyModule("shapely.strtree")
+wkb = _LazyModule("shapely.wkb")
+plt = _LazyModule("matplotlib.pyplot")
+mcollections = _LazyModule("matplotlib.collections")
+mcolors = _LazyModule("matplotlib.colors")
+ctx = _LazyModule("contextily")
+
+
+def warm_imports():
+    """
+    Import every lazily loaded module, meant to run in a background thread once the GUI is up: the first map or
+    ingest does not have to wait for the imports.
+
+    :rtype: None
+    """
+    for module in _lazy_modules:
+        try:
+            module._load()
+        except ImportError as e:
+            logger.warning(f" Unable to import {module._name}: {e}")
 
 
 # create logger (copied from https://docs.python.org/3/howto/logging.html#logging-advanced-tutorial)
@@ -50,10 +110,156 @@ ch.setFormatter(formatter)
 # add ch to logger
 logger.addHandler(ch)
 
+# GUI log panel (see LogPanelHandler): records queued at most, records drawn per refresh, refresh period, lines kept
+LOG_QUEUE_SIZE = 10_000
+LOG_PANEL_BATCH = 200
+LOG_PANEL_INTERVAL_MS = 200
+LOG_PANEL_MAX_LINES = 2000
+
+
+class LogPanelHandler(QueueHandler):
+    """
+    Logging handler feeding the GUI log panel. Records from any thread are put on a bounded queue, drained by the Tk
+    thread on a timer (see main). When the panel falls too far behind, records are dropped and counted instead of
+    blocking the pipeline or growing the queue.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 # Global variables used by function unkw_airport_finder.
 origin_fixed = "UNKW"
 destination_fixed = "UNKW"
 
+# Set by the GUI while it runs background jobs: runs a function on the Tk thread and returns its result (see main)
+# None = call the function directly
+gui_invoke = None
+
+# In-memory STRtree over the indexed flight tracks, rebuilt by track_tree when new flights are indexed.
+track_tree_cache = {}
+
+# In-memory cache of loaded aircraft-months (see layers_cached), warmed by the GUI prefetch in the render process
+# and in the GUI process. LRU, in entries
+LAYERS_CACHE_SIZE = 16
+layers_cache = OrderedDict()
+layers_cache_lock = Lock()
+
+# Integer columns of the compact track data (see track_compact)
+TRACK_INT_DTYPES = {"timestamp": "int64", "knots": "int16", "altitude": "int32"}
+
+# Stage timing spans recorded since the last trace_report (see span), and the attributes of the open spans per thread.
+# Spans recorded under a run id (run attribute, see trace_run_id) are only collected by the report of that run
+trace_spans = []
+trace_lock = Lock()
+trace_state = local()
+trace_runs = count(1)
+
+# Club fleet registry: (tail number, model, map color)
+FLEET = [("N81673", "Archer", "red"),
+         ("N3892Q", "C172", "blue"),
+         ("N20389", "C172", "green"),
+         ("N182WK", "C182", "orange"),
+         ("N58843", "C182", "grey"),
+         ("N82145", "Saratoga", "black"),
+         ("N4803P", "Debonair", "magenta")]
+
+# Landing detection thresholds used by detect_landings.
+# A landing is a local altitude minimum that is slow, low relative to the rest of the flight and close to an airport.
+LANDING_MAX_KNOTS = 100  # ground speed at the bottom of the approach
+LANDING_MAX_HEIGHT = 1500  # feet above the lowest altitude of the flight
+LANDING_MIN_CLIMB = 300  # feet climbed between two separate landing events (or after the takeoff roll)
+LANDING_RADIUS_NM = 1.5  # max distance from the airport reference point
+
+# Months, in order. Used to convert between month names (GUI, db_data_getter) and month numbers
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+
+# Heatmap grid: 4 km cells in Web Mercator (EPSG:3857) covering the continental US. [xmin, ymin, xmax, ymax]
+HEATMAP_BOUNDS = (-13_950_000, 2_700_000, -7_300_000, 6_500_000)
+HEATMAP_CELL = 4000
+HEATMAP_SHAPE = ((HEATMAP_BOUNDS[2] - HEATMAP_BOUNDS[0]) // HEATMAP_CELL,
+                 (HEATMAP_BOUNDS[3] - HEATMAP_BOUNDS[1]) // HEATMAP_CELL)
+
+# Persistent basemap tile cache and geocoded place bounds, so repeated renders never touch the network.
+TILE_CACHE_DIR = os.environ.get("FCKC_TILE_CACHE",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "tile_cache"))
+TILE_CACHE_MAX_MB = int(os.environ.get("FCKC_TILE_CACHE_MB", "500"))
+tile_cache_state = {}
+# Basemap tile provider, None = contextily default. Prefetch and renders must use the same provider.
+BASEMAP_SOURCE = None
+# False = draw the tracks without basemap tiles
+BASEMAP = os.environ.get("FCKC_BASEMAP", "1") != "0"
+# Usual flying area (west, south, east, north) and zoom levels seeded by tile_prefetch
+PREFETCH_BOUNDS = (-104.0, 33.0, -87.0, 43.5)
+PREFETCH_ZOOMS = range(4, 10)
+# Local map place and zoom level
+KC_PLACE = ("Kansas City", 12)
+
+# Rendered map archive, organized by year & month (see archive_path)
+ARCHIVE_DIR = os.environ.get("FCKC_ARCHIVE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+RENDER_DPI = 150
+# Above this many track points, the map layers are rasterized (see density_plotter) instead of drawn one by one
+RENDER_MAX_POINTS = 250_000
+RASTER_BINS = 800
+
+# Rendered map cache, keyed by the selection and the data version of the selected aircraft-months (see render_cached)
+RENDER_CACHE_DIR = os.environ.get("FCKC_RENDER_CACHE",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_cache"))
+RENDER_CACHE_MAX_MB = int(os.environ.get("FCKC_RENDER_CACHE_MB", "200"))
+
+# Web map export (see geojson_export). Zoom bands: (name, min zoom, max zoom, simplify tolerance in meters, decimals)
+EXPORT_DIR = os.environ.get("FCKC_EXPORT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_export"))
+EXPORT_BANDS = [("low", 0, 7, 1000, 2),
+                ("mid", 8, 10, 150, 3),
+                ("high", 11, 18, 15, 5)]
+
+# Timezone used by FlightAware to display the track log times (EDT/EST)
+FLIGHTAWARE_TZ = "America/New_York"
+
+# Scraped sites. Can be pointed at a local stand-in server serving recorded pages (see benchmarks/standin_server.py)
+FLIGHTAWARE_URL = os.environ.get("FCKC_FLIGHTAWARE_URL", "https://flightaware.com")
+AIRNAV_URL = os.environ.get("FCKC_AIRNAV_URL", "https://airnav.com")
+# Seconds waited between two FlightAware track log requests
+SCRAPE_DELAY = float(os.environ.get("FCKC_SCRAPE_DELAY", "3"))
+# Throttled (429), failed (5xx) or timed out requests are retried HTTP_RETRIES times, waiting HTTP_BACKOFF seconds,
+# then 2x, 4x... longer or the Retry-After delay of the server (see http_get)
+HTTP_RETRIES = int(os.environ.get("FCKC_HTTP_RETRIES", "4"))
+HTTP_BACKOFF = float(os.environ.get("FCKC_HTTP_BACKOFF", "2"))
+HTTP_TIMEOUT = float(os.environ.get("FCKC_HTTP_TIMEOUT", "5"))
+
+# MySQL server. Unattended runs (see load_credentials) read the password from FCKC_MYSQL_PW or the config file
+MYSQL_HOST = os.environ.get("FCKC_MYSQL_HOST", "127.0.0.1")
+MYSQL_PORT = int(os.environ.get("FCKC_MYSQL_PORT", "3306"))
+MYSQL_USER = os.environ.get("FCKC_MYSQL_USER", "root")
+CONFIG_FILE = os.environ.get("FCKC_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+
+# GUI: import the heavy modules in a background thread once the window is up (see warm_imports)
+WARM_IMPORTS = os.environ.get("FCKC_WARM_IMPORTS", "1") != "0"
+
+# Headless runs (CLI/daemon) cannot prompt for unknown airports, they are saved as "UNKW" (see airport_prompt)
+HEADLESS = False
+
+# Scheduled ingest (see ingest_daemon): hours between runs, random +/- minutes added to each run, run report
+DAEMON_INTERVAL_H = 24
+DAEMON_JITTER_MIN = 30
+RUN_REPORT = os.environ.get("FCKC_RUN_REPORT",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_report.json"))
+
+# Stage timing spans (see span), off unless FCKC_TRACE=1 (or FCKC_MEMORY=1). The summary of each run is appended to
+# TRACE_LOG: JSON lines, or CSV when the file name ends with .csv
+TRACE = os.environ.get("FCKC_TRACE", "0") != "0"
+# Memory report mode (FCKC_MEMORY=1): every span also records the peak resident memory of the process (see span)
+MEMORY_REPORT = os.environ.get("FCKC_MEMORY", "0") != "0"
+TRACE_LOG = os.environ.get("FCKC_TRACE_LOG",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "trace_log.jsonl"))
+
 
 def mysql_connect(database):
     """
@@ -65,9 +271,10 @@ def mysql_connect(database):
     """
     try:
         # Init connection to MySQL database
-        db = mysql.connector.connect(
-            host="localhost",
-            user="root",
+        db = mysql_connector.connect(
+            host=MYSQL_HOST,
+            port=MYSQL_PORT,
+            user=MYSQL_USER,
             passwd=pw,
             database=database
         )
@@ -78,6 +285,98 @@ def mysql_connect(database):
         sys.exit(e)
 
 
+def load_credentials(path=CONFIG_FILE):
+    """
+    Load the MySQL connection settings for unattended runs, without prompting.
+    The config file is read first, the environment variables (FCKC_MYSQL_PW, FCKC_MYSQL_HOST, FCKC_MYSQL_PORT,
+    FCKC_MYSQL_USER) override it.
+    ex config.json: {"mysql": {"host": "127.0.0.1", "port": 3306, "user": "root", "password": "..."}}
+
+    :param path: JSON config file
+    :type path: str
+    :return: True if a password was found
+    :rtype: bool
+    """
+    global pw, MYSQL_HOST, MYSQL_PORT, MYSQL_USER
+
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f).get("mysql", {})
+
+    MYSQL_HOST = os.environ.get("FCKC_MYSQL_HOST", config.get("host", MYSQL_HOST))
+    MYSQL_PORT = int(os.environ.get("FCKC_MYSQL_PORT", config.get("port", MYSQL_PORT)))
+    MYSQL_USER = os.environ.get("FCKC_MYSQL_USER", config.get("user", MYSQL_USER))
+    password = os.environ.get("FCKC_MYSQL_PW", config.get("password"))
+    if password is None:
+        return False
+    pw = password
+    return True
+
+
+def mysql_engine(database):
+    """
+    Create an SQLAlchemy engine connected to a MySQL schema.
+    Used with pandas .to_sql() and pd.read_sql()
+
+    :param database: Name of the schema (database) to be accessed
+    :type database: str
+    :return: sqlalchemy engine
+    """
+    user = MYSQL_USER
+    passwd = quote_plus(pw)
+    host_ip = MYSQL_HOST
+    port = str(MYSQL_PORT)
+
+    return sqlalchemy.create_engine(
+        'mysql+mysqlconnector://' + user + ':' + passwd + '@' + host_ip + ':' + port + '/' + database,
+        echo=False)
+
+
+def flight_table_name(date, route, dept_time):
+    """
+    Build the name of the flight details table from a flight_history row.
+    ex: (2022-07-22, MO3_KOJC, 14_05) converts to 2022_07_22__mo3_kojc__14
+
+    :param date: flight_history date
+    :type date: datetime.date or str
+    :param route: flight_history route. ex: MO3_KOJC
+    :type route: str
+    :param dept_time: flight_history departure time. ex: 14_05
+    :type dept_time: str
+    :rtype: str
+    """
+    return str(date).replace("-", "_") + "__" + route.lower() + "__" + dept_time[0:2:]
+
+
+def haversine_nm(lat1, lon1, lat2, lon2):
+    """
+    Vectorized Haversine distance. Accepts scalars or numpy arrays (broadcasting rules apply).
+
+    :return: distance in nautical miles
+    :rtype: numpy.ndarray
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    # Radius of earth in nautical miles.
+    return 2 * np.arcsin(np.sqrt(a)) * 3440.065
+
+
+def lonlat_to_mercator(lon, lat):
+    """
+    Vectorized projection of lon/lat (EPSG:4326) into Web Mercator (EPSG:3857) meters.
+
+    :param lon: array of longitudes
+    :param lat: array of latitudes
+    :return: x, y arrays
+    :rtype: tuple
+    """
+    r = 6378137.0
+    x = np.radians(lon) * r
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * r
+    return x, y
+
+
 def between_parentheses(s):
     """
     Take in a string and return what is in-between the parentheses.
@@ -295,7 +594,7 @@ def unkw_airport_finder(url, orig_flag=False):
         columnspan=4,
         padx=25,
         sticky="W")
-    url_output.insert(tk.END, "https://flightaware.com" + str(url))
+    url_output.insert(tk.END, FLIGHTAWARE_URL + str(url))
     # Disable editing of the text.
     url_output.configure(state="disabled")
 
@@ -579,17 +878,336 @@ def unkw_airport_finder(url, orig_flag=False):
             sticky="N")
 
     # Execute the window
-    Thread(target=finder.mainloop()).start()
+    finder.mainloop()
+
+
+def airport_prompt(url, orig_flag=False):
+    """
+    Run unkw_airport_finder on the Tk thread when called from a background job, the prompt windows can only be
+    created by the thread that runs the GUI. Headless runs do not prompt.
+
+    :type url: str
+    :type orig_flag: bool
+    :rtype: None
+    """
+    global origin_fixed, destination_fixed
+    if HEADLESS:
+        logger.warning(f" Unknown airport in {url}, saved as UNKW (headless run, use the GUI to fix it)")
+        if orig_flag:
+            origin_fixed = "UNKW"
+        else:
+            destination_fixed = "UNKW"
+    elif gui_invoke is None:
+        unkw_airport_finder(url, orig_flag)
+    else:
+        gui_invoke(unkw_airport_finder, url, orig_flag)
+
+
+def cancelled(cancel):
+    """
+    Check a cancellation token. The pipeline functions take an optional threading.Event (cancel), set by the caller
+    to stop them at the next safe point.
+
+    :param cancel: cancellation token, or None
+    :type cancel: threading.Event
+    :rtype: bool
+    """
+    return cancel is not None and cancel.is_set()
+
+
+def pause(seconds, cancel=None):
+    """
+    sleep() between two FlightAware requests, that returns as soon as the cancellation token is set.
+
+    :type seconds: float
+    :param cancel: cancellation token, or None
+    :type cancel: threading.Event
+    :rtype: None
+    """
+    if cancel is None:
+        sleep(seconds)
+    else:
+        cancel.wait(seconds)
+
+
+def http_get(url, headers=None, cancel=None):
+    """
+    GET a scraped page. Throttled (429), failed (5xx) and timed out or refused requests are retried with an exponential
+    backoff: HTTP_BACKOFF seconds doubled at each attempt, or the Retry-After delay of the server if longer, plus up
+    to 10% random jitter so that parallel workers do not retry in lockstep.
+
+    :param headers: requests headers
+    :param cancel: cancellation token, stops retrying (and waiting) when set
+    :type cancel: threading.Event
+    :return: the response of the last attempt (the caller checks the status code)
+    :rtype: requests.Response
+    """
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            r = requests.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == HTTP_RETRIES or cancelled(cancel):
+                raise
+            r, error, reason = None, e, type(e).__name__
+        else:
+            if r.status_code != 429 and r.status_code < 500:
+                return r
+            if attempt == HTTP_RETRIES or cancelled(cancel):
+                return r
+            reason = f"status code {r.status_code}"
+
+        delay = HTTP_BACKOFF * 2 ** attempt
+        retry_after = r.headers.get("Retry-After", "") if r is not None else ""
+        if retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        delay *= random.uniform(1, 1.1)
+        logger.warning(f" {reason}, retry {attempt + 1}/{HTTP_RETRIES} in {delay:.1f} s: {url}")
+        pause(delay, cancel)
+        # cancelled during the backoff: give up without another request
+        if cancelled(cancel):
+            if r is None:
+                raise error
+            return r
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Time a pipeline stage when tracing is on (TRACE). Spans opened inside another span, on the same thread, inherit
+    its attributes: a "to_sql" span inside the span of a leg is recorded with the aircraft and the leg.
+    ex: with span("track_log", leg=table_name): ...
+
+    Concurrent runs (GUI jobs, prefetch) open their outer span with a run id, trace_report only collects the spans of
+    its own run. ex: with span("job", run=trace_run_id("Stats")): ...
+    Work handed to a thread pool is wrapped with trace_bound to keep the attributes of the calling thread.
+
+    In memory report mode (MEMORY_REPORT), the span also records the peak resident memory of the process at the end
+    of the stage (peak_rss_mb) and how much the stage raised it (rss_growth_mb).
+
+    :param stage: stage name, the summary is grouped by stage (see trace_summary)
+    :type stage: str
+    :param attrs: attributes recorded with the span. ex: aircraft="N81673"
+    """
+    if not (TRACE or MEMORY_REPORT):
+        yield
+        return
+    parent = getattr(trace_state, "attrs", {})
+    attrs = {**parent, **attrs}
+    trace_state.attrs = attrs
+    peak_start = peak_rss_mb() if MEMORY_REPORT else None
+    start = perf_counter()
+    record = {}
+    try:
+        yield
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["seconds"] = round(perf_counter() - start, 6)
+        if peak_start is not None:
+            record["peak_rss_mb"] = round(peak_rss_mb(), 1)
+            record["rss_growth_mb"] = round(record["peak_rss_mb"] - peak_start, 1)
+        trace_state.attrs = parent
+        with trace_lock:
+            trace_spans.append({"stage": stage, **attrs, **record})
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory (high-water mark) of this process, in MB.
+
+    :return: None where it cannot be measured (Windows)
+    :rtype: float
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        # POSIX only, kilobytes on Linux, bytes on macOS
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def trace_run_id(name):
+    """
+    :param name: run name. ex: "Stats"
+    :return: unique run id, recorded as the run attribute of the spans. ex: Stats-4711-3
+    :rtype: str
+    """
+    return f"{name}-{os.getpid()}-{next(trace_runs)}"
+
+
+def trace_attrs():
+    """
+    :return: attributes of the open spans of this thread (including the run id)
+    :rtype: dict
+    """
+    return dict(getattr(trace_state, "attrs", {}))
+
+
+def trace_bound(func, attrs=None):
+    """
+    Bind func to span attributes, for work handed to a thread pool: spans are inherited per thread, the pool threads
+    would otherwise record theirs without the run id of the caller.
+    ex: pool.submit(trace_bound(layers_cached), aircraft, month, year)
+
+    :param attrs: span attributes. None = the attributes of the calling thread (see trace_attrs)
+    :type attrs: dict
+    :return: function running func(*args, **kwargs) with these attributes
+    """
+    attrs = trace_attrs() if attrs is None else attrs
+
+    def bound(*args, **kwargs):
+        parent = getattr(trace_state, "attrs", {})
+        trace_state.attrs = attrs
+        try:
+            return func(*args, **kwargs)
+        finally:
+            trace_state.attrs = parent
+    return bound
+
+
+def trace_collect(run=None):
+    """
+    Take the spans recorded so far, they are removed from this process.
+
+    :param run: only take the spans of this run id. None = every span
+    :type run: str
+    :return: list of {stage, seconds, attributes...}
+    :rtype: list
+    """
+    with trace_lock:
+        if run is None:
+            spans = trace_spans[:]
+            trace_spans.clear()
+        else:
+            spans = [entry for entry in trace_spans if entry.get("run") == run]
+            trace_spans[:] = [entry for entry in trace_spans if entry.get("run") != run]
+    return spans
+
+
+def trace_merge(spans):
+    """
+    Add the spans recorded in another process (see traced) to this process.
+
+    :type spans: list
+    :rtype: None
+    """
+    with trace_lock:
+        trace_spans.extend(spans)
+
+
+def traced(func, *args, attrs=None):
+    """
+    Run func(*args) in a worker process and send the spans it recorded back with the result. Only the spans of this
+    call are sent, not those of other tasks run by the same worker.
+
+    :param attrs: span attributes of the caller (see trace_attrs), its run id is kept. None = a new run id
+    :type attrs: dict
+    :return: (result of func, spans), merge the spans with trace_merge
+    :rtype: tuple
+    """
+    attrs = dict(attrs or {})
+    attrs.setdefault("run", trace_run_id(getattr(func, "__name__", "traced")))
+    result = trace_bound(func, attrs)(*args)
+    return result, trace_collect(attrs["run"])
+
+
+def trace_summary(spans):
+    """
+    Total, mean and 95th percentile (nearest rank) duration of each stage.
+
+    :param spans: spans from trace_collect
+    :type spans: list
+    :return: {stage: {count, total, mean, p95}} in seconds, in order of first appearance. In memory report mode, also
+    the highest peak_rss_mb and rss_growth_mb of the stage
+    :rtype: dict
+    """
+    durations = {}
+    memory = {}
+    for entry in spans:
+        durations.setdefault(entry["stage"], []).append(entry["seconds"])
+        if "peak_rss_mb" in entry:
+            peak, growth = memory.get(entry["stage"], (0, 0))
+            memory[entry["stage"]] = (max(peak, entry["peak_rss_mb"]), max(growth, entry["rss_growth_mb"]))
+    summary = {}
+    for stage, seconds in durations.items():
+        seconds = sorted(seconds)
+        summary[stage] = {"count": len(seconds),
+                          "total": round(sum(seconds), 3),
+                          "mean": round(sum(seconds) / len(seconds), 4),
+                          "p95": round(seconds[max(0, -(-len(seconds) * 95 // 100) - 1)], 4)}
+        if stage in memory:
+            summary[stage]["peak_rss_mb"], summary[stage]["rss_growth_mb"] = memory[stage]
+    return summary
+
+
+def trace_report(run, path=None, run_id=None):
+    """
+    End of a run: log the per-stage summary of the recorded spans and append it to the run log, then start over.
+    JSON lines log: one {run, finished, stages, spans} object per run. CSV log: one row per run and stage.
+    Does nothing when tracing and the memory report are off, or no span was recorded.
+
+    :param run: name of the run. ex: "ingest"
+    :type run: str
+    :param path: run log. None = TRACE_LOG
+    :type path: str
+    :param run_id: only report the spans of this run id (see trace_run_id). None = every span recorded
+    :type run_id: str
+    :rtype: None
+    """
+    spans = trace_collect(run_id)
+    if not (TRACE or MEMORY_REPORT) or not spans:
+        return
+    path = TRACE_LOG if path is None else path
+    summary = trace_summary(spans)
+    finished = datetime.now().isoformat(timespec="seconds")
+
+    logger.info(f" ~~~~~~~~~~~~~~~~~ {run} timings ~~~~~~~~~~~~~~~~~")
+    for stage, entry in sorted(summary.items(), key=lambda item: item[1]["total"], reverse=True):
+        memory = ""
+        if "peak_rss_mb" in entry:
+            memory = f"  peak {entry['peak_rss_mb']:>8.1f} MB (+{entry['rss_growth_mb']:.1f})"
+        logger.info(f" {stage:<20} {entry['count']:>6}x  total {entry['total']:>9.3f} s  "
+                    f"mean {entry['mean']:>8.4f} s  p95 {entry['p95']:>8.4f} s{memory}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.lower().endswith(".csv"):
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["run", "finished", "stage", "count", "total", "mean", "p95", "peak_rss_mb",
+                                 "rss_growth_mb"])
+            for stage, entry in summary.items():
+                writer.writerow([run, finished, stage, entry["count"], entry["total"], entry["mean"], entry["p95"],
+                                 entry.get("peak_rss_mb", ""), entry.get("rss_growth_mb", "")])
+    else:
+        with open(path, "a") as f:
+            f.write(json.dumps({"run": run, "finished": finished, "stages": summary, "spans": spans}) + "\n")
+    logger.info(f" Timings saved to {path}")
 
 
-def flightaware_history(aircraft):
+def flightaware_history(aircraft, cancel=None):
     """
     Grab the aircraft history from flight aware and return pandas dataframe containing history data.
 
     :param aircraft: aircraft ID. ex: N182WK
     :type aircraft: str
+    :param cancel: cancellation token, set to stop the scrape. Returns None once cancelled
+    :type cancel: threading.Event
     :return: pandas df = [date, route, dept_time, time_aloft, URL]
     """
+    if cancelled(cancel):
+        return None
+
     # requests headers
     headers = {
         'User_Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
@@ -599,17 +1217,20 @@ def flightaware_history(aircraft):
         "DNT": "1"
     }
     # Make a GET request to flightaware
-    url = f"https://flightaware.com/live/flight/{aircraft}/history/80"
+    url = f"{FLIGHTAWARE_URL}/live/flight/{aircraft}/history/80"
     logger.info(f" Getting plane history from: {url}")
-    r = requests.get(url, headers=headers, timeout=5)
+    with span("history_http"):
+        r = http_get(url, headers=headers, cancel=cancel)
     # Check the status code
+    if r.status_code != 200 and cancelled(cancel):
+        return None
     if r.status_code != 200:
         logger.critical(f" Failed to connect to FlightAware! URL: {url}")
         logger.critical(f" Status code: {r.status_code}")
         sys.exit()
 
     # Parse the HTML
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = bs4.BeautifulSoup(r.text, "html.parser")
 
     try:
         # ------------------------------------------------------------------------------------------------------------------
@@ -629,6 +1250,11 @@ def flightaware_history(aircraft):
         rows = table.find_all("tr")
         for row in rows[1:-1:]:
 
+            # Nothing has been saved yet, stopping here leaves the database untouched
+            if cancelled(cancel):
+                logger.info(f" {aircraft} history scrape cancelled.")
+                return None
+
             # Catch edge case if there is no history data from the past 14 days
             if "No History Data" in row.text:
                 logger.warning(f" {aircraft} has no history in the last 14 days!")
@@ -664,12 +1290,12 @@ def flightaware_history(aircraft):
                 # If the airport is unknown it is listed as "Near" and no airport code given.
                 # unkw_airport_finder allows to modify the global variable and get the correct airport code
                 if "Near" in columns[2].text:
-                    Thread(target=unkw_airport_finder(url, orig_flag=True)).start()
+                    airport_prompt(url, orig_flag=True)
                     origin = origin_fixed.upper().strip()
                 else:
                     origin = between_parentheses(columns[2].text)
                 if "Near" in columns[3].text:
-                    Thread(target=unkw_airport_finder(url, orig_flag=False)).start()
+                    airport_prompt(url, orig_flag=False)
                     destination = destination_fixed.upper().strip()
                 else:
                     destination = between_parentheses(columns[3].text)
@@ -715,28 +1341,33 @@ def flightaware_history(aircraft):
         logger.critical(f" Attempting to skip this row: {row}")
 
 
-def flightaware_getter(url):
+def flightaware_getter(url, cancel=None):
     """
     Web scraping to grab track data from flight aware and save to pandas dataframe
 
     :param url: The url extracted from MySQL flight_history table, EXCLUDING flightaware.com and /track
     example: https://flightaware.com/live/flight/N81673/history/20220715/1927Z/KLXT/KAMW/tracklog
     should be given as: live/flight/N81673/history/20220715/1927Z/KLXT/KAMW
+    :param cancel: cancellation token, stops the retries of a throttled request. Returns None once cancelled
+    :type cancel: threading.Event
     :return: Panda dataframe containing [time, lat, long, kts, altitude]
     """
 
     # Make a GET request to flightaware
-    url = "https://flightaware.com" + f"{url}" + "/tracklog"
+    url = FLIGHTAWARE_URL + f"{url}" + "/tracklog"
     logger.info(f" Getting track data from URL: {url}")
-    r = requests.get(url, timeout=5)
+    with span("track_http"):
+        r = http_get(url, cancel=cancel)
     # Check the status code
+    if r.status_code != 200 and cancelled(cancel):
+        return None
     if r.status_code != 200:
         logger.critical(f" Failed to connect to FlightAware! (flightaware_getter)")
         logger.critical(f" status code: {r.status_code}")
         sys.exit(r.status_code)
 
     # Parse the HTML
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = bs4.BeautifulSoup(r.text, "html.parser")
     # ------------------------------------------------------------------------------------------------------------------
     #   Extract table data
     # ------------------------------------------------------------------------------------------------------------------
@@ -751,10 +1382,8 @@ def flightaware_getter(url):
         logger.critical(f" Attempting to continue...")
         return
 
-    # Defining of the dataframe
-    df = pd.DataFrame(columns=["time", "latitude", "longitude", "knots", "altitude"])
-
-    # Scrape data
+    # Scrape data. Raw strings are collected first and converted column-wise once the table has been read
+    raw_rows = []
     rows = table.find_all("tr")
     # reject the first two rows, these are headers
     for row in rows[2::]:
@@ -772,49 +1401,122 @@ def flightaware_getter(url):
         [0] = kts
         [1] = Altitude delta
         """
-        builder = []
         # len(row) == 21 ensures all the data is present for a given row of data
-        if len(row) == 21:
-            columns = row.find_all('span', class_="show-for-medium-up")
-            # len(row) columns ensures all the column elements are present
-            if len(columns) == 5:
-                time = columns[0].text.strip()
-                time = time[3::].strip()  # remove the leading three letter weekday
-                time = convert24(time)  # convert from 12-hour to 24-hour
-                latitude = columns[1].text.strip()
-                longitude = columns[2].text.strip()
-                altitude = columns[3].text.strip()
-                altitude = altitude.replace(",", "")  # remove the comma to allow int() conversion
-            else:
-                continue
-            kts_columns = row.find_all("td", class_="show-for-medium-up-table")
-            if len(kts_columns) == 2:
-                kts = kts_columns[0].text.strip()
-            else:
-                continue
-            builder = [time, latitude, longitude, kts, altitude]  # TODO MAKE THESE FLOATS AND INTS
-
-        # Sometimes an empty list is generated due to scraping, reject these.
-        if len(builder) == 5:
-            df.loc[len(df)] = builder
+        if len(row) != 21:
+            continue
+        columns = row.find_all('span', class_="show-for-medium-up")
+        kts_columns = row.find_all("td", class_="show-for-medium-up-table")
+        # Sometimes incomplete rows are generated due to scraping, reject these.
+        if len(columns) != 5 or len(kts_columns) != 2:
+            continue
+        raw_rows.append([columns[0].text.strip()[3::],  # remove the leading three letter weekday
+                         columns[1].text.strip(),
+                         columns[2].text.strip(),
+                         kts_columns[0].text.strip(),
+                         columns[3].text.strip()])
+
+    df = pd.DataFrame(raw_rows, columns=["time", "latitude", "longitude", "knots", "altitude"])
+
+    # convert from 12-hour to 24-hour, then to UTC epoch timestamps
+    clock = pd.to_datetime(df["time"].str.replace(r"\s+", "", regex=True), format="%I:%M:%S%p", errors="coerce")
+    df["time"] = clock.dt.strftime("%H:%M:%S")
+    df.insert(1, "timestamp", track_timestamps(df["time"], url))
+
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    df["knots"] = pd.to_numeric(df["knots"], errors="coerce").astype("Int64")
+    # remove the comma to allow int conversion
+    df["altitude"] = pd.to_numeric(df["altitude"].str.replace(",", "", regex=False), errors="coerce").astype("Int64")
     return df
 
 
-def db_data_saver(aircraft):
+def track_timestamps(times, url):
     """
-    Export the web scrapped panda dataframe into MySQL
+    Convert the track log times into UTC epoch timestamps.
+    FlightAware lists the track times in local time (FLIGHTAWARE_TZ) without a date. The date is recovered from the
+    UTC departure contained in the url (ex: .../history/20220715/1927Z/KLXT/KAMW) and a day is added every time the
+    clock rolls over midnight.
+
+    :param times: 24-hour time strings (HH:MM:SS)
+    :type times: pandas.Series
+    :param url: flightaware url of the flight
+    :type url: str
+    :return: UTC epoch seconds, <NA> where the time could not be determined
+    :rtype: pandas.Series (Int64)
+    """
+    match = re.search(r"history/(\d{8})/(\d{4})Z", str(url))
+    clock = pd.to_timedelta(times, errors="coerce")
+    if match is None or clock.isna().all():
+        logger.warning(f" Unable to determine the date of the track log, no timestamps saved. URL: {url}")
+        return pd.Series(pd.NA, index=times.index, dtype="Int64")
+
+    departure = pd.Timestamp(match.group(1) + match.group(2), tz="UTC").tz_convert(FLIGHTAWARE_TZ)
+    dept_day = departure.tz_localize(None).normalize()
+
+    # The first track point can be on the other side of midnight from the (local) departure date
+    first_offset = clock.dropna().iloc[0] - (departure.tz_localize(None) - dept_day)
+    day_shift = 1 if first_offset < -pd.Timedelta(hours=12) else -1 if first_offset > pd.Timedelta(hours=12) else 0
+
+    # Midnight rollover: the local clock jumps backwards
+    rollover = (clock.diff() < -pd.Timedelta(hours=12)).cumsum()
+
+    local = dept_day + pd.to_timedelta(rollover + day_shift, unit="D") + clock
+    utc = local.dt.tz_localize(FLIGHTAWARE_TZ, ambiguous="NaT", nonexistent="shift_forward").dt.tz_convert("UTC")
+    return ((utc - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).astype("Int64")
+
+
+def timestamp_backfill(aircraft):
+    """
+    Add the UTC timestamp column to the flight details tables saved before timestamps existed.
+    The 24-hour time column and the flight_history url are used to rebuild the timestamps.
 
     :param aircraft: N# of club aircraft, used for MySQL schema name
     :type aircraft: str
     :rtype: None
     """
+    engine = mysql_engine(aircraft)
+    hist_df = pd.read_sql("SELECT date, route, dept_time, url FROM flight_history", engine)
+    tables_exist = set(pd.read_sql("SHOW TABLES", engine).iloc[:, 0])
+
+    updated = 0
+    for row in hist_df.itertuples(index=False):
+        flight = flight_table_name(row.date, row.route, row.dept_time)
+        if flight not in tables_exist:
+            continue
+        details_df = pd.read_sql(f"SELECT * FROM {flight}", engine)
+        if "timestamp" in details_df.columns or details_df.empty:
+            continue
+        details_df.insert(1, "timestamp", track_timestamps(details_df["time"].astype(str), row.url))
+        details_df.to_sql(flight, engine, if_exists="replace", index=False)
+        updated += 1
+    logger.info(f" {aircraft}: timestamps added to {updated} flight tables")
+
+
+def db_data_saver(aircraft, progress=None, cancel=None):
+    """
+    Export the web scrapped panda dataframe into MySQL
+
+    Cancellation (cancel set) stops at the next flight leg: the legs already saved are kept, the empty tables of the
+    legs not fetched yet are dropped and date_last_ran is not updated, so the next run picks up the remaining legs.
+
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :param progress: called with (legs done, legs total) after each flight leg is fetched
+    :type progress: callable
+    :param cancel: cancellation token
+    :type cancel: threading.Event
+    :return: number of flight legs saved
+    :rtype: int
+    """
 
     # Get pandas dataframe for plane history [date, route, dept_time, time_aloft, url]
-    hist_df = flightaware_history(aircraft)
+    with span("history", aircraft=aircraft):
+        hist_df = flightaware_history(aircraft, cancel)
 
     # catch edge case in flightaware_history, where no flight data exists from the past 14 days. Func will return None
-    if hist_df is None:
-        return
+    # (also returned when cancelled)
+    if hist_df is None or cancelled(cancel):
+        return 0
 
     # logger.debug(f" Size of the hist_df dataframe: {hist_df.size}")
 
@@ -831,15 +1533,7 @@ def db_data_saver(aircraft):
                      "url VARCHAR(100))")
 
     # Create SQLAlchemy engine to connect to MySQL Database
-    user = "root"
-    passwd = pw
-    database = aircraft
-    host_ip = '127.0.0.1'
-    port = "3306"
-
-    engine = create_engine(
-        'mysql+mysqlconnector://' + user + ':' + passwd + '@' + host_ip + ':' + port + '/' + database,
-        echo=False)
+    engine = mysql_engine(aircraft)
 
     try:
         # Convert dataframe to sql table (flight_history)
@@ -876,6 +1570,11 @@ def db_data_saver(aircraft):
         tables_exist.append(x[0])
     hist = [x for x in new_hist if x not in tables_exist]
 
+    # Index the stored flights missing from track_index (saved before it existed), the new legs are indexed as they
+    # are saved. Nothing is loaded when every flight is indexed
+    with span("track_index_update", aircraft=aircraft):
+        track_index_update(aircraft)
+
     # Exit condition if there are no new flights to add to the database
     if not hist:
         logger.info(f" {aircraft} has no new flights to add to the database!")
@@ -884,8 +1583,8 @@ def db_data_saver(aircraft):
         date_last_ran(aircraft)
 
         logger.info(f" Continuing...")
-        sleep(3)
-        return
+        pause(SCRAPE_DELAY, cancel)
+        return 0
 
     # Build new flight details tables
     for name in hist:
@@ -893,7 +1592,8 @@ def db_data_saver(aircraft):
         try:
             # Create a flight details CHILD table
             mycursor.execute(f"CREATE TABLE {name}("
-                             "time MEDIUMINT(10), "
+                             "time VARCHAR(8), "
+                             "timestamp BIGINT, "
                              "latitude FLOAT, "
                              "longitude FLOAT, "
                              "knots MEDIUMINT(5), "
@@ -935,39 +1635,76 @@ def db_data_saver(aircraft):
             new_flights.append(flightaware_combined_hist[new_leg])
             logger.info(f" New leg found: {new_leg}")
 
+    # Airport index used to detect the landings of each new flight
+    airport_idx = airport_index()
+
     # try to get specific history data from each url page
     logger.info(" Attempting to get flight details...")
+    saved = []
     for i in range(len(new_flights)):
+        if cancelled(cancel):
+            break
         try:
-            details_df = flightaware_getter(new_flights[i])
-            # logger.debug(f" The size of the details_df is: {details_df}")
-            if details_df is None:
-                logger.critical(f" details_df is empty!")
-                continue
             # get the table name using the flightaware_combined_hist,
             # by searching the dictionary with the URL (new_flights[i])
             table_name = [z for z in flightaware_combined_hist if flightaware_combined_hist[z] == new_flights[i]]
             table_name = str(table_name[0])
+            # timing span attributes of this leg
+            leg = {"aircraft": aircraft, "leg": table_name.lower()}
+            with span("track_log", **leg):
+                details_df = flightaware_getter(new_flights[i], cancel)
+            # logger.debug(f" The size of the details_df is: {details_df}")
+            if details_df is None:
+                logger.critical(f" details_df is empty!")
+                continue
             # Convert dataframe to sql table (flight details)
-            details_df.to_sql(table_name.lower(), engine, if_exists="replace", index=False)
+            with span("to_sql", **leg):
+                details_df.to_sql(table_name.lower(), engine, if_exists="replace", index=False)
+            with span("landings", **leg):
+                landings_saver(db, engine, table_name.lower(), details_df, airport_idx)
+            with span("track_index", **leg):
+                track_index_saver(aircraft, table_name.lower(), details_df)
+            saved.append(table_name.lower())
             logger.info(f" {i + 1} out of {len(new_flights)} completed!")
             if i != len(new_flights) - 1:
-                logger.info(" Waiting 3 seconds...")
-                sleep(3)
+                logger.info(f" Waiting {SCRAPE_DELAY:g} seconds...")
+                pause(SCRAPE_DELAY, cancel)
         except Exception as e:
             logger.warning(f" An error occurred while trying to populate the flight data tables! (db_data_saver)")
             logger.warning(f" Error: {e}")
-            logger.warning(" Waiting 3 seconds...")
-            sleep(3)
-    logger.info(f" Tables built successfully!")
+            logger.warning(f" Waiting {SCRAPE_DELAY:g} seconds...")
+            pause(SCRAPE_DELAY, cancel)
+        if progress is not None:
+            progress(i + 1, len(new_flights))
+
+    if cancelled(cancel):
+        # Drop the empty tables of the legs that were not fetched, the next run will find them missing again
+        pending = [name for name in hist if name not in saved]
+        for name in pending:
+            mycursor.execute(f"DROP TABLE IF EXISTS {name}")
+        db.commit()
+        logger.info(f" {aircraft} cancelled: {len(saved)} legs saved, {len(pending)} left for the next run.")
+    else:
+        logger.info(f" Tables built successfully!")
+
+    # Invalidate the cached maps of the saved flights, add them to the heatmap totals and utilization rollups.
+    # heatmap_update finds the changed months from the data versions, they are bumped first
+    data_version_bump(aircraft, saved)
+    with span("heatmap_update", aircraft=aircraft):
+        heatmap_update(aircraft)
+    with span("utilization_refresh", aircraft=aircraft):
+        utilization_refresh(aircraft, since=hist_df["date"].min() if not hist_df.empty else None)
 
     # Update the date last ran in MySQL to be used for future flightaware calls.
-    date_last_ran(aircraft)
+    # Skipped when cancelled, the next run has to scrape the history of the missing legs again
+    if not cancelled(cancel):
+        date_last_ran(aircraft)
 
     db.close()
+    return len(saved)
 
 
-def db_data_getter(aircraft, month, year):
+def db_data_getter(aircraft, month, year, viewport=None):
     """
     Import data from MySQL and convert into pandas dataframe.
 
@@ -976,22 +1713,26 @@ def db_data_getter(aircraft, month, year):
     :type year: int
     :param aircraft: N# of club aircraft, used for MySQL schema name
     :param month: used to filter the schema tables
-    :return: pandas dataframe
+    :param viewport: (west, south, east, north) lon/lat. Flights whose stored extent falls entirely outside of it
+    are not loaded. None = load every flight
+    :type viewport: tuple
+    :return: pandas dataframe in the compact format of track_frame, the flights are numbered 1, 2... in the ID
+    column. .attrs["history"] = [(flight table name, route), ...] of the selected flights
     """
+    # Flights entirely outside the viewport, using the extents stored at ingest
+    outside = set()
+    if viewport is not None:
+        w, s, e, n = viewport
+        extents = flight_extents(aircraft, month, year)
+        outside = set(extents.index[(extents["max_lon"] < w) | (extents["min_lon"] > e) |
+                                    (extents["max_lat"] < s) | (extents["min_lat"] > n)])
+
     # Establish connection with MySQL and init cursor
     db = mysql_connect(aircraft)
     mycursor = db.cursor()
 
     # Create SQLAlchemy engine to connect to MySQL Database
-    user = "root"
-    passwd = pw
-    database = aircraft
-    host_ip = '127.0.0.1'
-    port = "3306"
-
-    engine = create_engine(
-        'mysql+mysqlconnector://' + user + ':' + passwd + '@' + host_ip + ':' + port + '/' + database,
-        echo=False)
+    engine = mysql_engine(aircraft)
 
     # convert month string format to number (January -> 1)
     month_dates = {
@@ -1026,6 +1767,7 @@ def db_data_getter(aircraft, month, year):
             mycursor.execute(f"SELECT * FROM flight_history "
                              f"ORDER BY date ASC")
         hist = []
+        routes = []
         for x in mycursor:
             # convert DATE format to string with underscores to allow to be used as table name
             date = str(x[0])
@@ -1033,14 +1775,15 @@ def db_data_getter(aircraft, month, year):
             hour = x[2]
             hour = hour[0:2:]
             hist.append(date + "__" + x[1].lower() + "__" + hour)
+            routes.append(x[1])
     except Exception as e:
         db.close()
         logger.critical(" An error occurred while grabbing the flight history table names! (db_data_getter)")
         logger.critical(e)
         sys.exit(e)
 
-    # Defining of the dataframe that will contain all of the flight history data
-    total_df = pd.DataFrame()
+    # Compact flight columns, turned into a single dataframe at the end
+    parts = []
 
     # for each piece of history, get the flight data
     # Set the ID equal to a unique index, to allow seperate flights to have their own line segment (ref: full_area_map)
@@ -1049,725 +1792,2487 @@ def db_data_getter(aircraft, month, year):
     try:
         i = 1  # init counter
         for leg in hist:
+            if leg in outside:
+                continue
             query = f"SELECT * FROM {leg}"
             res_df = pd.read_sql(query, engine)
-            res_df["ID"] = str(i)
+            flight_id = i
             i += 1
             if res_df.empty:
                 continue
-            total_df = pd.concat([total_df, res_df], ignore_index=True)
+            parts.append(track_compact(res_df, flight_id))
     except Exception as e:
         logger.warning(f" Error while grabbing {leg}: {e}")
         logger.warning(f" Attempting to continue...")
 
+    # Defining of the dataframe that will contain all of the flight history data
+    total_df = track_frame(parts)
+
+    # flight metadata of the whole selection (including the flights outside the viewport), reused by the map overlays
+    total_df.attrs["history"] = list(zip(hist, routes))
     return total_df
 
 
-def calculate_stats(fleet, month, year):
+def track_compact(track_df, flight_id):
     """
-    Calculate various stats related to the aircraft's history
+    Compact columns of a flight details table, as plain numpy arrays: float32 coordinates (~1 m resolution), int16
+    knots, int32 altitude, int64 timestamp and int32 flight ID. The dataframe is only built once for the whole
+    selection (see track_frame), building it per flight costs more than the rest of the conversion.
+
+    :param track_df: flight details dataframe, as read from MySQL
+    :param flight_id: number of the flight in the selection
+    :type flight_id: int
+    :return: {column: array}. The integer columns are (values, missing mask) pairs, the clock times are seconds since
+    midnight (strings if any of them is not HH:MM:SS), the other columns are as stored
+    :rtype: dict
+    """
+    compact = {}
+    for column in track_df.columns:
+        values = track_df[column]
+        if column == "time":
+            compact[column] = clock_seconds(values.to_numpy(dtype=object))
+            continue
+        if column not in ("timestamp", "latitude", "longitude", "knots", "altitude"):
+            compact[column] = values.to_numpy(dtype=object)
+            continue
+        if values.dtype == object:
+            values = pd.to_numeric(values, errors="coerce")
+        values = values.to_numpy(dtype=float, na_value=np.nan)
+        if column in ("latitude", "longitude"):
+            compact[column] = values.astype(np.float32)
+        else:
+            # nullable integers: values + missing mask
+            dtype = TRACK_INT_DTYPES[column]
+            info = np.iinfo(dtype)
+            missing = np.isnan(values)
+            values = np.clip(np.round(np.where(missing, 0, values)), info.min, info.max).astype(dtype)
+            compact[column] = (values, missing)
+    compact["ID"] = np.full(len(track_df), flight_id, dtype=np.int32)
+    return compact
 
-    :type fleet: list
-    :type month: str
-    :type year: int
+
+def clock_seconds(times):
     """
+    Parse HH:MM:SS clock times into seconds since midnight, on the raw bytes (no Python object per time).
 
-    def dist_travelled(data_df):
-        """
-        Calculate the total distance travelled by the aircraft using lat/long data.
+    :param times: array of clock time strings
+    :type times: numpy.ndarray
+    :return: int32 seconds since midnight, -1 for a missing time. The strings themselves if any of them is not a
+    valid HH:MM:SS time
+    :rtype: numpy.ndarray
+    """
+    missing = pd.isna(times)
+    try:
+        raw = np.where(missing, "00:00:00", times).astype("S9")
+    except (UnicodeEncodeError, ValueError, TypeError):
+        return times
+    # 8 characters, the 9th byte is the padding
+    digits = raw.view(np.uint8).reshape(-1, 9).astype(np.int32) - ord("0")
+    valid = ((digits[:, [0, 1, 3, 4, 6, 7]] >= 0) & (digits[:, [0, 1, 3, 4, 6, 7]] <= 9)).all(axis=1)
+    valid &= (digits[:, 2] == ord(":") - ord("0")) & (digits[:, 5] == ord(":") - ord("0"))
+    valid &= digits[:, 8] == -ord("0")
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    seconds = digits[:, 6] * 10 + digits[:, 7]
+    valid &= (hours < 24) & (minutes < 60) & (seconds < 60)
+    if not valid.all():
+        return times
+    return np.where(missing, -1, hours * 3600 + minutes * 60 + seconds).astype(np.int32)
+
+
+def clock_labels(seconds):
+    """
+    :param seconds: seconds since midnight
+    :return: HH:MM:SS clock times
+    :rtype: list
+    """
+    return [f"{x // 3600:02d}:{x // 60 % 60:02d}:{x % 60:02d}" for x in seconds.tolist()]
 
-        :param data_df: pandas dataframe that contains all of the data
-        :return: Total distance travelled in miles
-        :rtype: float(2)
-        """
 
-        # TODO dist_travelled needs to be reviewed. Output is not correct at all... showing 10,000 miles travelled
-        def lat_long_dist(lat1, lat2, lon1, lon2):
-            """
-            Calculate the distance between 2 sets of lat/long coordinates using the Haversine formula
+def track_frame(parts):
+    """
+    Build the compact track dataframe of a selection from the track_compact columns of its flights: each column is
+    concatenated and wrapped once. The integer columns are nullable Int types, the clock times a categorical of the
+    distinct times of the selection (plain strings if some are not HH:MM:SS). Columns missing from older tables are
+    filled with missing values.
+
+    :param parts: track_compact output of each flight, emptied by the call
+    :type parts: list
+    :return: pandas df = [time, timestamp, latitude, longitude, knots, altitude, ID]
+    """
+    if not parts:
+        return pd.DataFrame()
+    sizes = [len(part["ID"]) for part in parts]
+    columns = list(dict.fromkeys(column for part in parts for column in part))
+
+    data = {}
+    for column in columns:
+        # taken out of the parts: the chunks of a column are freed once it is concatenated
+        chunks = [part.pop(column, None) for part in parts]
+        if column in TRACK_INT_DTYPES:
+            dtype = TRACK_INT_DTYPES[column]
+            values = np.concatenate([np.zeros(size, dtype) if chunk is None else chunk[0]
+                                     for chunk, size in zip(chunks, sizes)])
+            missing = np.concatenate([np.ones(size, bool) if chunk is None else chunk[1]
+                                      for chunk, size in zip(chunks, sizes)])
+            data[column] = pd.arrays.IntegerArray(values, missing)
+        elif column in ("latitude", "longitude"):
+            data[column] = np.concatenate([np.full(size, np.nan, np.float32) if chunk is None else chunk
+                                           for chunk, size in zip(chunks, sizes)])
+        elif column == "ID":
+            data[column] = np.concatenate(chunks)
+        elif column == "time" and all(chunk is None or chunk.dtype != object for chunk in chunks):
+            # categorical of the distinct times: 4 bytes per point instead of a Python string, built from the seconds
+            # since midnight without hashing the strings
+            seconds = np.concatenate([np.full(size, -1, np.int32) if chunk is None else chunk
+                                      for chunk, size in zip(chunks, sizes)])
+            distinct, codes = np.unique(seconds, return_inverse=True)
+            codes = codes.astype(np.int32)
+            if distinct[0] == -1:
+                distinct, codes = distinct[1:], codes - 1
+            data[column] = pd.Categorical.from_codes(codes, categories=clock_labels(distinct))
+        else:
+            if column == "time":
+                logger.debug(" Track times that are not HH:MM:SS, they are kept as strings (track_frame)")
+                chunks = [np.array(clock_labels(chunk), dtype=object) if chunk is not None and chunk.dtype != object
+                          else chunk for chunk in chunks]
+            data[column] = np.concatenate([np.full(size, None, object) if chunk is None else chunk
+                                           for chunk, size in zip(chunks, sizes)])
+    # the columns are already new arrays, no need for pandas to copy them again
+    return pd.DataFrame(data, copy=False)
 
-            :param lat1: Latitude point 1
-            :param lat2: Latitude point 2
-            :param lon1: Longitude point 1
-            :param lon2: Longitude point 2
-            :return: Distance between the two points in miles
-            :rtype: float
-            """
-            # The math module contains a function called radians which converts from degrees to radians.
-            lon1 = radians(lon1)
-            lon2 = radians(lon2)
-            lat1 = radians(lat1)
-            lat2 = radians(lat2)
 
-            # Haversine formula
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+def airport_index():
+    """
+    Build a spatial index (STRtree) over every airport saved in airport_coords.coords.
+    Used to match track points against the known airports without comparing every point to every airport.
 
-            c = 2 * asin(sqrt(a))
+    :return: dict = {tree, ids, codes, lat, lon}
+    :rtype: dict
+    """
+    try:
+        engine = mysql_engine("airport_coords")
+        coords_df = pd.read_sql("SELECT latitude, longitude, airport FROM coords", engine)
+    except Exception as e:
+        logger.warning(f" Unable to load the airport coordinates, no airports will be matched! (airport_index)")
+        logger.warning(f" Error: {e}")
+        coords_df = pd.DataFrame(columns=["latitude", "longitude", "airport"])
 
-            # Radius of earth in miles.
-            r = 3958.8
+    coords_df = coords_df.dropna().drop_duplicates(subset="airport")
+    lat = coords_df["latitude"].to_numpy(dtype=float)
+    lon = coords_df["longitude"].to_numpy(dtype=float)
+    points = [shapely_geometry.Point(x, y) for x, y in zip(lon, lat)]
 
-            # calculate the result
-            return c * r
+    return {"tree": strtree.STRtree(points),
+            "ids": {id(p): i for i, p in enumerate(points)},
+            "codes": coords_df["airport"].to_numpy(dtype=str),
+            "lat": lat,
+            "lon": lon}
 
-        total_dist = 0
-        latitude = []
-        longitude = []
-        for row in data_df.itertuples(index=False):
-            latitude.append(row.latitude)
-            longitude.append(row.longitude)
-        latitude = [float(x) for x in latitude]
-        longitude = [float(x) for x in longitude]
-        for x in range(len(longitude[:-1:])):
-            total_dist += lat_long_dist(latitude[x], latitude[x + 1], longitude[x], longitude[x + 1])
-        print(f" The total distance travelled was {round(total_dist, 2)} Miles")
-        return total_dist
 
-    def time_aloft(aircraft, month, year):
-        """
-        Calculate the max time aloft and average time aloft
+def spatial_query(index, geom):
+    """
+    Query the STRtree of a spatial index and return the integer positions of the hits.
+    shapely 1.8 returns the indexed geometries themselves while shapely 2.x returns positions, handle both.
 
-        :return: [total time aloft, average time aloft]
-        :rtype: tuple
-        """
+    :param index: dict containing "tree" (STRtree) and "ids" ({id(geometry): position})
+    :param geom: shapely geometry, any indexed geometry whose envelope intersects it is returned
+    :rtype: numpy.ndarray
+    """
+    hits = index["tree"].query(geom)
+    if len(hits) and not isinstance(hits[0], (int, np.integer)):
+        return np.array([index["ids"][id(g)] for g in hits], dtype=int)
+    return np.asarray(hits, dtype=int)
 
-        db = mysql_connect(aircraft)
-        mycursor = db.cursor()
 
-        # convert month string format to number (January -> 1)
-        month_dates = {
-            "January": 1,
-            "February": 2,
-            "March": 3,
-            "April": 4,
-            "May": 5,
-            "June": 6,
-            "July": 7,
-            "August": 8,
-            "September": 9,
-            "October": 10,
-            "November": 11,
-            "December": 12}
+def match_airports(lat, lon, index):
+    """
+    Find the closest known airport (within LANDING_RADIUS_NM) of each coordinate.
 
-        # convert the month to a number, if not all selected
-        if month != "All":
-            month = month_dates[month]
+    :param lat: array of latitudes
+    :param lon: array of longitudes
+    :param index: airport spatial index from airport_index()
+    :return: array of ICAO airport codes, "" where no airport is close enough
+    :rtype: numpy.ndarray
+    """
+    codes = np.full(len(lat), "", dtype=object)
+    dlat = LANDING_RADIUS_NM / 60
+    for k in range(len(lat)):
+        # search box around the point, widened in longitude to account for the meridians converging
+        dlon = dlat / max(cos(radians(lat[k])), 0.01)
+        hits = spatial_query(index, shapely_geometry.box(lon[k] - dlon, lat[k] - dlat, lon[k] + dlon, lat[k] + dlat))
+        if not hits.size:
+            continue
+        dist = haversine_nm(lat[k], lon[k], index["lat"][hits], index["lon"][hits])
+        nearest = dist.argmin()
+        if dist[nearest] <= LANDING_RADIUS_NM:
+            codes[k] = index["codes"][hits[nearest]]
+    return codes
 
-        # Use the flight history table
-        try:
-            if month != "All" and year != "All":
-                mycursor.execute(f"SELECT time_aloft FROM {aircraft}.flight_history "
-                                 f"WHERE month(date)={month} and year(date)={year}")
-            elif year != "All":
-                mycursor.execute(f"SELECT time_aloft FROM {aircraft}.flight_history "
-                                 f"WHERE year(date)={year}")
-            else:
-                mycursor.execute(f"SELECT time_aloft FROM {aircraft}.flight_history")
 
-        except Exception as e:
-            db.close()
-            logger.critical(" An error occurred while grabbing the time aloft! (time_aloft)")
-            logger.critical(e)
-            sys.exit(e)
+def detect_landings(track_df, index):
+    """
+    Find every landing (full stop and touch-and-go) in a single flight track.
+    Candidates are low, slow, local altitude minima after the takeoff roll. These are matched against the airport
+    spatial index and consecutive candidates at the same airport are merged unless the aircraft climbed out in-between.
+
+    :param track_df: flight details dataframe [time, latitude, longitude, knots, altitude]
+    :type track_df: pandas.DataFrame
+    :param index: airport spatial index from airport_index()
+    :type index: dict
+    :return: pandas df = [time, latitude, longitude, airport, touch_and_go]
+    """
+    columns = ["time", "latitude", "longitude", "airport", "touch_and_go"]
+    if track_df is None or len(track_df) < 3 or not len(index["codes"]):
+        return pd.DataFrame(columns=columns)
+
+    lat = pd.to_numeric(track_df["latitude"], errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(track_df["longitude"], errors="coerce").to_numpy(dtype=float)
+    alt = pd.to_numeric(track_df["altitude"], errors="coerce").to_numpy(dtype=float)
+    # A missing speed should never qualify as slow
+    kts = pd.to_numeric(track_df["knots"], errors="coerce").fillna(np.inf).to_numpy(dtype=float)
+    time = track_df["time"].astype(str).to_numpy()
+
+    # Drop incomplete rows
+    valid = ~(np.isnan(lat) | np.isnan(lon) | np.isnan(alt))
+    lat, lon, alt, kts, time = lat[valid], lon[valid], alt[valid], kts[valid], time[valid]
+    if len(alt) < 3:
+        return pd.DataFrame(columns=columns)
+
+    # Local altitude minima, plateaus included. The last point is a candidate since the track ends on the ground
+    minima = (alt <= np.r_[np.inf, alt[:-1]]) & (alt <= np.r_[alt[1:], np.inf])
+
+    # Ignore the takeoff roll: only look after the aircraft first climbed out.
+    # Tracks that start in the air never climb above their first point, in that case everything is fair game.
+    climbed = np.flatnonzero(alt >= alt[0] + LANDING_MIN_CLIMB)
+    start = climbed[0] if climbed.size else 1
+
+    candidate = minima & (kts <= LANDING_MAX_KNOTS) & (alt - alt.min() <= LANDING_MAX_HEIGHT)
+    candidate[:start] = False
+    idx = np.flatnonzero(candidate)
+    if not idx.size:
+        return pd.DataFrame(columns=columns)
+
+    airport = match_airports(lat[idx], lon[idx], index)
+    idx, airport = idx[airport != ""], airport[airport != ""]
+    if not idx.size:
+        return pd.DataFrame(columns=columns)
+
+    # Merge consecutive candidates at the same airport into a single event, unless the aircraft climbed out between
+    # them (touch-and-go followed by a full stop at the same field)
+    new_event = np.ones(len(idx), dtype=bool)
+    if len(idx) > 1:
+        between_max = np.maximum.reduceat(alt, idx)[:-1]
+        climb = between_max - np.minimum(alt[idx[:-1]], alt[idx[1:]])
+        new_event[1:] = (airport[1:] != airport[:-1]) | (climb >= LANDING_MIN_CLIMB)
+    event = np.cumsum(new_event) - 1
+
+    # Keep the lowest point of each event
+    order = np.lexsort((alt[idx], event))
+    first = order[np.r_[True, event[order][1:] != event[order][:-1]]]
+    idx, airport = idx[first], airport[first]
+
+    # A touch-and-go is a landing the aircraft climbs out of. Highest altitude after each point:
+    after_max = np.r_[np.maximum.accumulate(alt[::-1])[::-1][1:], -np.inf]
+    touch_and_go = after_max[idx] >= alt[idx] + LANDING_MIN_CLIMB
+
+    return pd.DataFrame({"time": time[idx],
+                         "latitude": lat[idx],
+                         "longitude": lon[idx],
+                         "airport": airport.astype(str),
+                         "touch_and_go": touch_and_go})
+
+
+def create_landings_table(mycursor):
+    """
+    Create the landings table of an aircraft schema. One row per landing (or touch-and-go) of each flight.
 
-        # build list of aloft time
-        aloft = []
-        for x in mycursor:
-            # Filter out any potential errors, or old history from the database that may contain a 0 flight time
-            if x[0].strip("'") != "0":
-                aloft.append(x[0].strip("'"))
+    :param mycursor: MySQL cursor connected to the aircraft schema
+    :rtype: None
+    """
+    mycursor.execute("CREATE TABLE IF NOT EXISTS landings("
+                     "flight VARCHAR(40), "
+                     "date DATE, "
+                     "time VARCHAR(8), "
+                     "latitude FLOAT, "
+                     "longitude FLOAT, "
+                     "airport VARCHAR(15), "
+                     "touch_and_go BOOLEAN)")
 
-        # crunch the data (convert from string (##:##) into engine hours (HH.MM)
-        hours_list = []
-        minutes_list = []
-        for x in aloft:
-            hours = int(x.split(":")[0])
-            minutes = int(x.split(":")[1])
 
-            hours_list.append(hours)
-            minutes_list.append(minutes)
+def landings_saver(db, engine, flight, track_df, index):
+    """
+    Detect the landings of a single, newly saved flight and store them in the aircraft landings table.
+    Any previous landings saved for this flight are replaced.
+
+    :param db: MySQL connection to the aircraft schema, from mysql_connect(aircraft)
+    :param engine: SQLAlchemy engine of the aircraft schema, from mysql_engine(aircraft)
+    :param flight: flight details table name. ex: 2022_07_22__mo3_kojc__14
+    :type flight: str
+    :param track_df: flight details dataframe
+    :param index: airport spatial index from airport_index()
+    :rtype: None
+    """
+    landings_df = detect_landings(track_df, index)
+    landings_df.insert(0, "flight", flight)
+    landings_df.insert(1, "date", flight[0:10].replace("_", "-"))
 
-        # Find the sum of hours and minutes, add them together, and convert into Hobbs time
-        time_aloft = sum(hours_list) + round(sum(minutes_list) / 60, 1)
+    mycursor = db.cursor()
+    try:
+        create_landings_table(mycursor)
+        mycursor.execute(f"DELETE FROM landings WHERE flight = \"{flight}\"")
+        db.commit()
+        if not landings_df.empty:
+            landings_df.to_sql("landings", engine, if_exists="append", index=False)
+    except Exception as e:
+        logger.warning(f" Error while saving the landings of {flight} (landings_saver)")
+        logger.warning(f" Error: {e}")
 
-        # Calculate average time aloft
-        hour_avg = sum(hours_list) / len(hours_list)
-        min_avg = round(sum(minutes_list) / len(minutes_list) / 60, 1)
 
-        avg_aloft = round(hour_avg + min_avg, 1)
-        print(f" The total time aloft was {time_aloft}")
-        print(f" The average time aloft was {avg_aloft}")
+def landings_backfill(fleet):
+    """
+    Batch job: run detect_landings over every stored flight and rebuild the landings table of each aircraft.
+    The airport index is built once and the landings of each aircraft are written with a single insert.
 
-        return time_aloft, avg_aloft
+    :param fleet: list of aircraft
+    :type fleet: list
+    :rtype: None
+    """
+    index = airport_index()
 
-    def airports_visited(aircraft, month, year):
-        """
-        Determine the airports visited
+    for aircraft in fleet:
+        engine = mysql_engine(aircraft)
+        hist_df = pd.read_sql("SELECT date, route, dept_time FROM flight_history ORDER BY date ASC", engine)
+        tables_exist = set(pd.read_sql("SHOW TABLES", engine).iloc[:, 0])
+
+        flights = []
+        for row in hist_df.itertuples(index=False):
+            flight = flight_table_name(row.date, row.route, row.dept_time)
+            if flight in tables_exist and flight not in flights:
+                flights.append(flight)
+
+        results = []
+        for flight in flights:
+            try:
+                landings_df = detect_landings(pd.read_sql(f"SELECT * FROM {flight}", engine), index)
+            except Exception as e:
+                logger.warning(f" Error while grabbing {flight}: {e}")
+                logger.warning(f" Attempting to continue...")
+                continue
+            landings_df.insert(0, "flight", flight)
+            landings_df.insert(1, "date", flight[0:10].replace("_", "-"))
+            results.append(landings_df)
 
-        :rtype: None
-        """
-        # Establish connection with MySQL and init cursor
         db = mysql_connect(aircraft)
         mycursor = db.cursor()
+        mycursor.execute("DROP TABLE IF EXISTS landings")
+        create_landings_table(mycursor)
+        db.commit()
+        db.close()
 
-        # convert month string format to number (January -> 1)
-        month_dates = {
-            "January": 1,
-            "February": 2,
-            "March": 3,
-            "April": 4,
-            "May": 5,
-            "June": 6,
-            "July": 7,
-            "August": 8,
-            "September": 9,
-            "October": 10,
-            "November": 11,
-            "December": 12}
-
-        # convert the month to a number, if not all selected
-        if month != "All":
-            month = month_dates[month]
+        if results:
+            landings_df = pd.concat(results, ignore_index=True)
+            landings_df.to_sql("landings", engine, if_exists="append", index=False)
+            logger.info(f" {aircraft}: {len(landings_df)} landings "
+                        f"({int(landings_df['touch_and_go'].sum())} touch-and-go) found in {len(flights)} flights")
+        else:
+            logger.info(f" {aircraft}: no landings found in {len(flights)} flights")
 
-        try:
-            if month != "All" and year != "All":
-                mycursor.execute(f"SELECT * FROM {aircraft}.flight_history "
-                                 f"WHERE month(date)={month} and year(date)={year}")
-            elif year != "All":
-                mycursor.execute(f"SELECT * FROM {aircraft}.flight_history "
-                                 f"WHERE year(date)={year}")
-            else:
-                mycursor.execute(f"SELECT * FROM {aircraft}.flight_history")
 
-            hist = []
-            for x in mycursor:
-                # extract the route information, using the destination as the airport used for graphing/stats
-                # TODO THIS COULD BE UPDATED TO SELECT ROUTE FROM FLIGHT HISTORY, INSTEAD OF SELECT *
-                dest = x[1].split("_")[1]
-                hist.append(dest)
-        except Exception as e:
-            db.close()
-            logger.critical(" An error occurred while getting the airports used! (airports_visited)")
-            logger.critical(e)
-            sys.exit(e)
+def landings_getter(aircraft):
+    """
+    Get the landings of every flight of an aircraft, in the order they happened.
+    Returns an empty dictionary if the landings table does not exist yet (see landings_backfill)
 
-        # exit condition if no flight history
-        if not hist or len(hist) == 0:
-            logger.info(f" Possible error condition (airports_visited)")
-            return
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :return: {flight table name: [airport, airport, ...]}
+    :rtype: dict
+    """
+    try:
+        landings_df = pd.read_sql("SELECT flight, airport FROM landings", mysql_engine(aircraft))
+    except Exception as e:
+        logger.debug(f" No landings available for {aircraft}: {e}")
+        return {}
+    return landings_df.groupby("flight", sort=False)["airport"].apply(list).to_dict()
 
-        # Find the number of unique airports and save to dictionary, count each time the airport occurs
-        landing_hist = {}
-        for airport in hist:
-            if airport not in landing_hist:
-                landing_hist[airport] = 1
-            else:
-                landing_hist[airport] += 1
 
-        # Remove UNKW from dictionary
-        if "UNKW" in landing_hist:
-            landing_hist.pop("UNKW")
+def fleet_landings_getter(fleet, month, year):
+    """
+    Get the landings of the selected flights of every aircraft in one query (UNION over the aircraft schemas),
+    instead of one connection per aircraft.
 
-        # sort the airports list
-        landing_hist = dict(sorted(landing_hist.items(), key=lambda item: item[1], reverse=True))
-        print(f" Trips to the following airports:")
-        print(landing_hist)
+    :param fleet: list of aircraft
+    :type fleet: list
+    :type month: str
+    :type year: int
+    :return: {aircraft: {flight table name: [airport, airport, ...]}}
+    :rtype: dict
+    """
+    engine = mysql_engine("information_schema")
+    try:
+        schemas = ", ".join(f"\"{aircraft}\"" for aircraft in fleet)
+        tables_df = pd.read_sql(f"SELECT table_schema FROM tables "
+                                f"WHERE table_name = \"landings\" AND table_schema IN ({schemas})", engine)
+    except Exception as e:
+        logger.debug(f" No landings available: {e}")
+        return {}
+    if tables_df.empty:
+        return {}
 
-    print(f" ~~~~~~~~~~~~~~~~~ {year} {month} stat line-up ~~~~~~~~~~~~~~~~~")
+    where = []
+    if month != "All":
+        where.append(f"month(date)={MONTHS.index(month) + 1}")
+    if year != "All":
+        where.append(f"year(date)={year}")
+    where = " WHERE " + " AND ".join(where) if where else ""
+    query = " UNION ALL ".join(f"SELECT \"{schema}\" AS aircraft, flight, airport FROM {schema}.landings{where}"
+                               for schema in tables_df.iloc[:, 0])
+    try:
+        landings_df = pd.read_sql(query, engine)
+    except Exception as e:
+        logger.warning(f" Unable to load the landings! (fleet_landings_getter)")
+        logger.warning(f" Error: {e}")
+        return {}
 
-    # N81673 Archer
-    if "N81673" in fleet:
-        df_N81673 = db_data_getter("N81673", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N81673.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N81673 (Archer) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N81673)
-            time_aloft("N81673", month, year)
-            airports_visited("N81673", month, year)
-
-    # N3892Q C172 (OJC)
-    if "N3892Q" in fleet:
-        df_N3892Q = db_data_getter("N3892Q", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N3892Q.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N3892Q (C172) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N3892Q)
-            time_aloft("N3892Q", month, year)
-            airports_visited("N3892Q", month, year)
-
-    # N20389 C172 (OJC)
-    if "N20389" in fleet:
-        df_N20389 = db_data_getter("N20389", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N20389.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N20389 (C172) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N20389)
-            time_aloft("N20389", month, year)
-            airports_visited("N20389", month, year)
-
-    # N182WK C182 (LXT)
-    if "N182WK" in fleet:
-        df_N182WK = db_data_getter("N182WK", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N182WK.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N182WK (C182) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N182WK)
-            time_aloft("N182WK", month, year)
-            airports_visited("N182WK", month, year)
-
-    # N58843 C182 (OJC)
-    if "N58843" in fleet:
-        df_N58843 = db_data_getter("N58843", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N58843.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N58843 (C182) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N58843)
-            time_aloft("N58843", month, year)
-            airports_visited("N58843", month, year)
-
-    # N82145 Saratoga
-    if "N82145" in fleet:
-        df_N82145 = db_data_getter("N82145", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N82145.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N82145 (Saratoga) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N82145)
-            time_aloft("N82145", month, year)
-            airports_visited("N82145", month, year)
-
-    # N4803P Debonair
-    if "N4803P" in fleet:
-        df_N4803P = db_data_getter("N4803P", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N4803P.empty:
-            print(f" ~~~~~~~~~~~~~~~~~ Stats for N4803P (Debonair) ~~~~~~~~~~~~~~~~~")
-            dist_travelled(df_N4803P)
-            time_aloft("N4803P", month, year)
-            airports_visited("N4803P", month, year)
+    return {aircraft: group.groupby("flight", sort=False)["airport"].apply(list).to_dict()
+            for aircraft, group in landings_df.groupby("aircraft")}
 
 
-def airport_coordinates(airport):
+def utilization_refresh(aircraft, since=None):
     """
-    Get the airport code from mySQL. If not available from mySQL: scrape airnav.com and save those coordinates to mySQL
-    for future use.
+    Refresh the cached daily utilization rollup (utilization_daily) of an aircraft from flight_history.
+    Only the days on or after `since` are recomputed. By default, the refresh starts at the last cached day,
+    which is recomputed since more legs may have been flown later that day.
 
-    :param airport: ICAO airport code
-    :return: set of lat/long coordinates and the airport code [lat, long, airport]
-    :rtype: list[str, str, str]
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :param since: first day to recompute (YYYY-MM-DD). None = last cached day
+    :type since: str or datetime.date
+    :rtype: None
     """
-    # Establish connection with MySQL and init cursor
-    db = mysql_connect("airport_coords")
+    db = mysql_connect(aircraft)
     mycursor = db.cursor()
+    mycursor.execute("CREATE TABLE IF NOT EXISTS utilization_daily("
+                     "date DATE PRIMARY KEY, "
+                     "legs SMALLINT, "
+                     "hours FLOAT)")
+
+    if since is None:
+        mycursor.execute("SELECT MAX(date) FROM utilization_daily")
+        since = mycursor.fetchone()[0]
+
+    # Single scan of the flight history, duplicate rows are only counted once
+    if since is None:
+        mycursor.execute("SELECT DISTINCT date, route, dept_time, time_aloft FROM flight_history")
+    else:
+        mycursor.execute(f"SELECT DISTINCT date, route, dept_time, time_aloft FROM flight_history "
+                         f"WHERE date >= \"{since}\"")
+    hist_df = pd.DataFrame(mycursor.fetchall(), columns=["date", "route", "dept_time", "time_aloft"])
 
-    # Create SQLAlchemy engine to connect to MySQL Database
-    user = "root"
-    passwd = pw
-    database = "airport_coords"
-    host_ip = '127.0.0.1'
-    port = "3306"
-
-    engine = create_engine(
-        'mysql+mysqlconnector://' + user + ':' + passwd + '@' + host_ip + ':' + port + '/' + database,
-        echo=False)
+    # convert the time aloft from string (HH:MM) into hours. Missing or "0" time aloft counts as a leg with 0 hours
+    aloft = hist_df["time_aloft"].astype(str).str.strip("'").str.split(":", expand=True).reindex(columns=[0, 1])
+    hist_df["hours"] = (pd.to_numeric(aloft[0], errors="coerce") +
+                        pd.to_numeric(aloft[1], errors="coerce") / 60).fillna(0)
 
-    # Create coordinates table
-    mycursor.execute("CREATE TABLE IF NOT EXISTS coords("
-                     "latitude FLOAT(9,4), "
-                     "longitude FLOAT(9,4), "
-                     "airport VARCHAR(15))")
+    daily_df = hist_df.groupby("date").agg(legs=("route", "size"), hours=("hours", "sum")).reset_index()
 
-    mycursor.execute(f"SELECT * FROM coords")
+    try:
+        if since is None:
+            mycursor.execute("DELETE FROM utilization_daily")
+        else:
+            mycursor.execute(f"DELETE FROM utilization_daily WHERE date >= \"{since}\"")
+        mycursor.executemany("INSERT INTO utilization_daily (date, legs, hours) VALUES (%s, %s, %s)",
+                             [(str(r.date), int(r.legs), round(float(r.hours), 2))
+                              for r in daily_df.itertuples(index=False)])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f" Error while refreshing the {aircraft} utilization rollup (utilization_refresh)")
+        logger.warning(e)
+    else:
+        logger.debug(f" {aircraft} utilization rollup refreshed ({len(daily_df)} days since {since})")
+    db.close()
 
-    # Get the list of airports that already have coordinates defined in the database
-    existing_airport = []
-    for x in mycursor:
-        stepper = str(x[2])
-        existing_airport.append(stepper)
 
-    if airport in existing_airport:
-        # if the airport is already in the database, return in format: lat, long, airport code
-        mycursor.execute(f"SELECT * FROM coords WHERE airport = \"{airport}\"")
-        for results in mycursor:
-            return results
+def utilization_getter(fleet, start, end, freq="day"):
+    """
+    Query the cached utilization rollups of the fleet for any date window.
 
-    else:
-        # else scrape airnav.com to find the lat long data
-        # Make a GET request to flightaware
-        url = "https://airnav.com/airport/" + f"{airport}"
-        logger.info(f" Getting GPS coordinate data from URL: {url}")
-        r = requests.get(url, timeout=5)
-        # Check the status code
-        if r.status_code != 200:
-            logger.critical(f" Failed to connect to Airnav.com! (airport_coordinates)")
-            logger.critical(f" status code: {r.status_code}")
-            sys.exit(r.status_code)
-
-        # Parse the HTML
-        soup = BeautifulSoup(r.text, "html.parser")
-        # ------------------------------------------------------------------------------------------------------------------
-        #   Extract table data
-        # ------------------------------------------------------------------------------------------------------------------
-        # find the latitude and longitude coordinates provided on airnav.com
+    :param fleet: list of aircraft
+    :type fleet: list
+    :param start: first day of the window (YYYY-MM-DD). None = first cached day
+    :param end: last day of the window (YYYY-MM-DD), inclusive. None = last cached day
+    :param freq: "day", "week" (weeks starting on Monday) or "dow" (totals per day of the week)
+    :type freq: str
+    :return: pandas df indexed by day/week/day of week, with columns (hours|legs, aircraft)
+    """
+    where = []
+    if start is not None:
+        where.append(f"date >= \"{start}\"")
+    if end is not None:
+        where.append(f"date <= \"{end}\"")
+    where = " WHERE " + " AND ".join(where) if where else ""
+
+    frames = {}
+    for aircraft in fleet:
         try:
-            s = soup.findAll("table")
-            raw_coords = s[6]
-            rows = raw_coords.find_all("tr")
-            column = rows[2].find_all("td")
-            column = str(column).split("<br/>")
-            column = column[2].split(",")
-            lat = column[0]
-            long = column[1]
+            frames[aircraft] = pd.read_sql(f"SELECT date, legs, hours FROM utilization_daily{where}",
+                                           mysql_engine(aircraft), parse_dates=["date"], index_col="date")
         except Exception as e:
-            logger.critical(f" Error finding information on Airnav.com! (airport_coordinates)")
-            logger.critical(f" Error: {e}")
-            sys.exit()
+            logger.warning(f" No utilization rollup for {aircraft}! Has utilization_refresh been run? Error: {e}")
+
+    frames = {aircraft: daily_df for aircraft, daily_df in frames.items() if not daily_df.empty}
+    if not frames:
+        return pd.DataFrame()
+
+    # days without flights are not stored, they are 0 hours / 0 legs
+    index = pd.date_range(start or min(x.index.min() for x in frames.values()),
+                          end or max(x.index.max() for x in frames.values()),
+                          freq="D", name="date")
+    usage_df = pd.concat({aircraft: daily_df.reindex(index, fill_value=0) for aircraft, daily_df in frames.items()},
+                         axis=1).swaplevel(axis=1).sort_index(axis=1)
+    if freq == "week":
+        usage_df = usage_df.resample("W-MON", label="left", closed="left").sum()
+    elif freq == "dow":
+        usage_df = usage_df.groupby(usage_df.index.day_name()).sum()
+        usage_df = usage_df.reindex(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])
+    return usage_df
+
+
+def utilization_report(fleet, start, end):
+    """
+    Summarize the fleet utilization over a date window, least used aircraft first.
 
-        # Save the newfound lat/long coordinates in mySQL, first saving it as a pandas DF
-        # build a row to be exported to pandas
-        res = [lat, long, airport]
-        # build pandas
-        airport_df = pd.DataFrame([res], columns=["latitude", "longitude", "airport"])
+    :param fleet: list of aircraft
+    :type fleet: list
+    :param start: first day of the window (YYYY-MM-DD). None = first cached day
+    :param end: last day of the window (YYYY-MM-DD), inclusive. None = last cached day
+    :rtype: None
+    """
+    usage_df = utilization_getter(fleet, start, end)
+    if usage_df.empty:
+        return
+    start, end = usage_df.index[0].strftime("%Y-%m-%d"), usage_df.index[-1].strftime("%Y-%m-%d")
 
-        try:
-            # Convert dataframe to sql table (airport_coordinates)
-            airport_df.to_sql('coords', engine, if_exists="append", index=False)
-        except Exception as e:
-            logger.critical(" An error occurred with the SQLAclhemy engine! (airport_coordinates)")
-            logger.critical(f" Error: {e}")
-            sys.exit(e)
+    summary = pd.DataFrame({"hours": usage_df["hours"].sum().round(1),
+                            "legs": usage_df["legs"].sum(),
+                            "days flown": (usage_df["legs"] > 0).sum()}).sort_values("hours")
+    logger.info(f" ~~~~~~~~~~~~~~~~~ Utilization {start} to {end} ~~~~~~~~~~~~~~~~~")
+    logger.info("\n" + summary.to_string())
+
+
+def stats_window(month, year):
+    """
+    Convert a month/year selection into a date window.
+
+    :type month: str
+    :type year: int
+    :return: (first day, last day) as YYYY-MM-DD strings. (None, None) if all years are selected
+    :rtype: tuple
+    """
+    if year == "All":
+        return None, None
+    if month == "All":
+        return f"{year}-01-01", f"{year}-12-31"
+    first = pd.Timestamp(year=year, month=MONTHS.index(month) + 1, day=1)
+    return first.strftime("%Y-%m-%d"), (first + pd.offsets.MonthEnd(0)).strftime("%Y-%m-%d")
+
+
+def create_track_index_table(mycursor):
+    """
+    Create the track_index table of an aircraft schema. One row per flight: bounding box (lon/lat) and track
+    geometry (LineString in EPSG:3857, WKB).
+
+    :param mycursor: MySQL cursor connected to the aircraft schema
+    :rtype: None
+    """
+    mycursor.execute("CREATE TABLE IF NOT EXISTS track_index("
+                     "flight VARCHAR(40) PRIMARY KEY, "
+                     "date DATE, "
+                     "min_lon DOUBLE, "
+                     "min_lat DOUBLE, "
+                     "max_lon DOUBLE, "
+                     "max_lat DOUBLE, "
+                     "geom LONGBLOB)")
+
+
+def track_index_row(flight, date, track_df):
+    """
+    Compute the track_index row of a flight: its extent and its track geometry.
+
+    :param flight: flight details table name
+    :type flight: str
+    :param date: date of the flight (YYYY-MM-DD)
+    :param track_df: flight details dataframe
+    :return: (flight, date, min_lon, min_lat, max_lon, max_lat, wkb). None if the track has less than 2 points
+    :rtype: tuple
+    """
+    lat = pd.to_numeric(track_df["latitude"], errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(track_df["longitude"], errors="coerce").to_numpy(dtype=float)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon = lat[valid], lon[valid]
+    if len(lat) < 2:
+        return None
+    x, y = lonlat_to_mercator(lon, lat)
+    line = shapely_geometry.LineString(np.column_stack([x, y]))
+    return flight, str(date), lon.min(), lat.min(), lon.max(), lat.max(), wkb.dumps(line)
+
+
+def track_index_saver(aircraft, flight, track_df):
+    """
+    Store the extent and the geometry of a single, newly saved flight in the aircraft track_index table.
+
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :param flight: flight details table name. ex: 2022_07_22__mo3_kojc__14
+    :type flight: str
+    :param track_df: flight details dataframe
+    :rtype: None
+    """
+    row = track_index_row(flight, flight[0:10].replace("_", "-"), track_df)
+    if row is None:
+        return
+
+    db = mysql_connect(aircraft)
+    mycursor = db.cursor()
+    try:
+        create_track_index_table(mycursor)
+        mycursor.execute("REPLACE INTO track_index (flight, date, min_lon, min_lat, max_lon, max_lat, geom) "
+                         "VALUES (%s, %s, %s, %s, %s, %s, %s)", row)
+        db.commit()
+    except Exception as e:
+        logger.warning(f" Error while indexing {flight} (track_index_saver)")
+        logger.warning(f" Error: {e}")
+    db.close()
 
-    # finally, return the airport information
-    return res
+
+def track_index_update(aircraft):
+    """
+    Incrementally add the flights of an aircraft that are missing from its track_index table.
+    New flights are indexed at ingest (track_index_saver), this backfills the flights saved before.
+    Only the flights not yet indexed are loaded.
+
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :rtype: None
+    """
+    db = mysql_connect(aircraft)
+    mycursor = db.cursor()
+    create_track_index_table(mycursor)
+
+    mycursor.execute("SELECT DISTINCT date, route, dept_time FROM flight_history")
+    hist = {flight_table_name(x[0], x[1], x[2]): x[0] for x in mycursor.fetchall()}
+    mycursor.execute("SHOW TABLES")
+    tables_exist = set(x[0] for x in mycursor.fetchall())
+    mycursor.execute("SELECT flight FROM track_index")
+    indexed = set(x[0] for x in mycursor.fetchall())
+    new_flights = [flight for flight in hist if flight in tables_exist and flight not in indexed]
+
+    if not new_flights:
+        db.close()
+        return
+
+    engine = mysql_engine(aircraft)
+    rows = []
+    for flight in new_flights:
+        try:
+            track_df = pd.read_sql(f"SELECT latitude, longitude FROM {flight}", engine)
+        except Exception as e:
+            logger.warning(f" Error while grabbing {flight}: {e}")
+            continue
+        row = track_index_row(flight, hist[flight], track_df)
+        if row is not None:
+            rows.append(row)
+
+    try:
+        mycursor.executemany("REPLACE INTO track_index (flight, date, min_lon, min_lat, max_lon, max_lat, geom) "
+                             "VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f" Error while updating the {aircraft} track index (track_index_update)")
+        logger.warning(e)
+    else:
+        logger.info(f" {len(rows)} flights added to the {aircraft} track index")
+    db.close()
+
+
+def flight_extents(aircraft, month, year):
+    """
+    Get the stored extent (bounding box) of each flight, without loading any track data.
+    Flights saved before the track index existed are missing until the next ingest of the aircraft (see
+    track_index_update) or the backfill command.
+
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :type month: str
+    :type year: int
+    :return: pandas df indexed by flight table name = [min_lon, min_lat, max_lon, max_lat]
+    """
+    query = "SELECT flight, min_lon, min_lat, max_lon, max_lat FROM track_index"
+    if month != "All" and year != "All":
+        query += f" WHERE month(date)={MONTHS.index(month) + 1} and year(date)={year}"
+    elif year != "All":
+        query += f" WHERE year(date)={year}"
+
+    try:
+        return pd.read_sql(query, mysql_engine(aircraft), index_col="flight")
+    except Exception as e:
+        logger.debug(f" No flight extents available for {aircraft}: {e}")
+        return pd.DataFrame(columns=["min_lon", "min_lat", "max_lon", "max_lat"])
+
+
+def extents_union(extents):
+    """
+    Union of flight extents, converted to Web Mercator.
+
+    :param extents: list of flight_extents dataframes
+    :return: (xmin, ymin, xmax, ymax) in EPSG:3857. None if there are no extents
+    :rtype: tuple
+    """
+    extents = [x for x in extents if not x.empty]
+    if not extents:
+        return None
+    all_extents = pd.concat(extents)
+    x, y = lonlat_to_mercator(np.array([all_extents["min_lon"].min(), all_extents["max_lon"].max()]),
+                              np.array([all_extents["min_lat"].min(), all_extents["max_lat"].max()]))
+    return x[0], y[0], x[1], y[1]
+
+
+def track_tree(fleet):
+    """
+    Get the STRtree of every indexed flight of the fleet.
+    The tree is built from the stored track_index geometries (no track data is loaded) and kept in memory until the
+    number of indexed flights or the data version of an aircraft changes (a re-ingested flight replaces its
+    track_index row and bumps the data version, see data_version_bump).
+
+    :param fleet: list of aircraft
+    :type fleet: list
+    :return: dict = {tree, ids, geoms, keys}, keys are (aircraft, flight) tuples
+    :rtype: dict
+    """
+    counts = []
+    for aircraft in fleet:
+        db = mysql_connect(aircraft)
+        mycursor = db.cursor()
+        try:
+            mycursor.execute("SELECT COUNT(*) FROM track_index")
+            count = mycursor.fetchone()[0]
+        except Exception as e:
+            logger.warning(f" No track index for {aircraft}! Run an ingest or the backfill command. Error: {e}")
+            db.close()
+            continue
+        db.close()
+        counts.append((aircraft, count, data_version_getter(aircraft, "All", "All")))
+    counts = tuple(counts)
+
+    if track_tree_cache.get("key") == counts:
+        return track_tree_cache["index"]
+
+    geoms = []
+    keys = []
+    for aircraft, _, _ in counts:
+        db = mysql_connect(aircraft)
+        mycursor = db.cursor()
+        mycursor.execute("SELECT flight, geom FROM track_index")
+        for flight, geom in mycursor:
+            geoms.append(wkb.loads(bytes(geom)))
+            keys.append((aircraft, flight))
+        db.close()
+
+    index = {"tree": strtree.STRtree(geoms),
+             "ids": {id(g): i for i, g in enumerate(geoms)},
+             "geoms": geoms,
+             "keys": keys}
+    track_tree_cache["key"] = counts
+    track_tree_cache["index"] = index
+    return index
+
+
+def flights_in_bbox(fleet, min_lon, min_lat, max_lon, max_lat):
+    """
+    Find the flights whose track crosses a lon/lat bounding box.
+
+    :param fleet: list of aircraft
+    :type fleet: list
+    :return: list of (aircraft, flight table name)
+    :rtype: list
+    """
+    index = track_tree(fleet)
+    if not index["keys"]:
+        return []
+    x, y = lonlat_to_mercator(np.array([min_lon, max_lon]), np.array([min_lat, max_lat]))
+    area = shapely_geometry.box(x[0], y[0], x[1], y[1])
+    return [index["keys"][i] for i in spatial_query(index, area) if index["geoms"][i].intersects(area)]
+
+
+def flights_near(fleet, lat, lon, radius_nm):
+    """
+    Find the flights whose track passed within radius_nm of a lat/long coordinate.
+
+    :param fleet: list of aircraft
+    :type fleet: list
+    :type lat: float
+    :type lon: float
+    :type radius_nm: float
+    :return: list of (aircraft, flight table name)
+    :rtype: list
+    """
+    index = track_tree(fleet)
+    if not index["keys"]:
+        return []
+    x, y = lonlat_to_mercator(np.array([lon]), np.array([lat]))
+    center = shapely_geometry.Point(x[0], y[0])
+    # Web Mercator stretches distances by 1 / cos(latitude)
+    radius = radius_nm * 1852 / cos(radians(lat))
+    hits = spatial_query(index, center.buffer(radius).envelope)
+    return [index["keys"][i] for i in hits if index["geoms"][i].distance(center) <= radius]
+
+
+def flights_near_airport(fleet, airport, radius_nm=5):
+    """
+    Find the flights that passed within radius_nm of an airport. ex: flights_near_airport(fleet, "KOJC", 5)
+
+    :param fleet: list of aircraft
+    :type fleet: list
+    :param airport: ICAO airport code
+    :type airport: str
+    :type radius_nm: float
+    :return: list of (aircraft, flight table name). Empty if the airport has no known coordinates
+    :rtype: list
+    """
+    coords = airport_coordinates(airport)
+    if coords is None:
+        return []
+    return flights_near(fleet, float(coords[0]), float(coords[1]), radius_nm)
+
+
+def calculate_stats(fleet, month, year):
+    """
+    Calculate various stats related to the aircraft's history
+
+    :type fleet: list
+    :type month: str
+    :type year: int
+    """
+
+    def dist_travelled(data_df):
+        """
+        Calculate the total distance travelled by the aircraft using lat/long data.
+
+        :param data_df: pandas dataframe that contains all of the data
+        :return: Total distance travelled in miles
+        :rtype: float(2)
+        """
+
+        # TODO dist_travelled needs to be reviewed. Output is not correct at all... showing 10,000 miles travelled
+        def lat_long_dist(lat1, lat2, lon1, lon2):
+            """
+            Calculate the distance between 2 sets of lat/long coordinates using the Haversine formula
+
+            :param lat1: Latitude point 1
+            :param lat2: Latitude point 2
+            :param lon1: Longitude point 1
+            :param lon2: Longitude point 2
+            :return: Distance between the two points in miles
+            :rtype: float
+            """
+            # The math module contains a function called radians which converts from degrees to radians.
+            lon1 = radians(lon1)
+            lon2 = radians(lon2)
+            lat1 = radians(lat1)
+            lat2 = radians(lat2)
+
+            # Haversine formula
+            dlon = lon2 - lon1
+            dlat = lat2 - lat1
+            a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+
+            c = 2 * asin(sqrt(a))
+
+            # Radius of earth in miles.
+            r = 3958.8
+
+            # calculate the result
+            return c * r
+
+        total_dist = 0
+        latitude = []
+        longitude = []
+        for row in data_df.itertuples(index=False):
+            latitude.append(row.latitude)
+            longitude.append(row.longitude)
+        latitude = [float(x) for x in latitude]
+        longitude = [float(x) for x in longitude]
+        for x in range(len(longitude[:-1:])):
+            total_dist += lat_long_dist(latitude[x], latitude[x + 1], longitude[x], longitude[x + 1])
+        logger.info(f" The total distance travelled was {round(total_dist, 2)} Miles")
+        return total_dist
+
+    def time_aloft(aircraft, month, year):
+        """
+        Calculate the max time aloft and average time aloft
+
+        :return: [total time aloft, average time aloft]
+        :rtype: tuple
+        """
+
+        db = mysql_connect(aircraft)
+        mycursor = db.cursor()
+
+        # convert month string format to number (January -> 1)
+        month_dates = {
+            "January": 1,
+            "February": 2,
+            "March": 3,
+            "April": 4,
+            "May": 5,
+            "June": 6,
+            "July": 7,
+            "August": 8,
+            "September": 9,
+            "October": 10,
+            "November": 11,
+            "December": 12}
+
+        # convert the month to a number, if not all selected
+        if month != "All":
+            month = month_dates[month]
+
+        # Use the flight history table
+        try:
+            if month != "All" and year != "All":
+                mycursor.execute(f"SELECT time_aloft FROM {aircraft}.flight_history "
+                                 f"WHERE month(date)={month} and year(date)={year}")
+            elif year != "All":
+                mycursor.execute(f"SELECT time_aloft FROM {aircraft}.flight_history "
+                                 f"WHERE year(date)={year}")
+            else:
+                mycursor.execute(f"SELECT time_aloft FROM {aircraft}.flight_history")
+
+        except Exception as e:
+            db.close()
+            logger.critical(" An error occurred while grabbing the time aloft! (time_aloft)")
+            logger.critical(e)
+            sys.exit(e)
+
+        # build list of aloft time
+        aloft = []
+        for x in mycursor:
+            # Filter out any potential errors, or old history from the database that may contain a 0 flight time
+            if x[0].strip("'") != "0":
+                aloft.append(x[0].strip("'"))
+
+        # crunch the data (convert from string (##:##) into engine hours (HH.MM)
+        hours_list = []
+        minutes_list = []
+        for x in aloft:
+            hours = int(x.split(":")[0])
+            minutes = int(x.split(":")[1])
+
+            hours_list.append(hours)
+            minutes_list.append(minutes)
+
+        # Find the sum of hours and minutes, add them together, and convert into Hobbs time
+        time_aloft = sum(hours_list) + round(sum(minutes_list) / 60, 1)
+
+        # Calculate average time aloft
+        hour_avg = sum(hours_list) / len(hours_list)
+        min_avg = round(sum(minutes_list) / len(minutes_list) / 60, 1)
+
+        avg_aloft = round(hour_avg + min_avg, 1)
+        logger.info(f" The total time aloft was {time_aloft}")
+        logger.info(f" The average time aloft was {avg_aloft}")
+
+        return time_aloft, avg_aloft
+
+    def airports_visited(aircraft, month, year):
+        """
+        Determine the airports visited
+
+        :rtype: None
+        """
+        # Establish connection with MySQL and init cursor
+        db = mysql_connect(aircraft)
+        mycursor = db.cursor()
+
+        # convert month string format to number (January -> 1)
+        month_dates = {
+            "January": 1,
+            "February": 2,
+            "March": 3,
+            "April": 4,
+            "May": 5,
+            "June": 6,
+            "July": 7,
+            "August": 8,
+            "September": 9,
+            "October": 10,
+            "November": 11,
+            "December": 12}
+
+        # convert the month to a number, if not all selected
+        if month != "All":
+            month = month_dates[month]
+
+        try:
+            if month != "All" and year != "All":
+                mycursor.execute(f"SELECT * FROM {aircraft}.flight_history "
+                                 f"WHERE month(date)={month} and year(date)={year}")
+            elif year != "All":
+                mycursor.execute(f"SELECT * FROM {aircraft}.flight_history "
+                                 f"WHERE year(date)={year}")
+            else:
+                mycursor.execute(f"SELECT * FROM {aircraft}.flight_history")
+
+            # Detected landings include touch-and-goes and intermediate stops, prefer them over the route destination
+            landings = landings_getter(aircraft)
+            hist = []
+            touch_and_go = 0
+            for x in mycursor:
+                flight = flight_table_name(x[0], x[1], x[2])
+                if flight in landings:
+                    hist.extend(landings[flight])
+                    touch_and_go += len(landings[flight]) - 1
+                else:
+                    # extract the route information, using the destination as the airport used for graphing/stats
+                    dest = x[1].split("_")[1]
+                    hist.append(dest)
+        except Exception as e:
+            db.close()
+            logger.critical(" An error occurred while getting the airports used! (airports_visited)")
+            logger.critical(e)
+            sys.exit(e)
+
+        # exit condition if no flight history
+        if not hist or len(hist) == 0:
+            logger.info(f" Possible error condition (airports_visited)")
+            return
+
+        # Find the number of unique airports and save to dictionary, count each time the airport occurs
+        landing_hist = {}
+        for airport in hist:
+            if airport not in landing_hist:
+                landing_hist[airport] = 1
+            else:
+                landing_hist[airport] += 1
+
+        # Remove UNKW from dictionary
+        if "UNKW" in landing_hist:
+            landing_hist.pop("UNKW")
+
+        # sort the airports list
+        landing_hist = dict(sorted(landing_hist.items(), key=lambda item: item[1], reverse=True))
+        logger.info(f" Trips to the following airports:")
+        logger.info(f" {landing_hist}")
+        logger.info(f" Landings in addition to the route destination (touch-and-go, multi-stop): {touch_and_go}")
+
+    logger.info(f" ~~~~~~~~~~~~~~~~~ {year} {month} stat line-up ~~~~~~~~~~~~~~~~~")
+
+    for aircraft, model, color in fleet_registry(fleet):
+        data_df = layers_cached(aircraft, month, year)[0]
+        # Catch condition where there are is no flight history
+        if not data_df.empty:
+            logger.info(f" ~~~~~~~~~~~~~~~~~ Stats for {aircraft} ({model}) ~~~~~~~~~~~~~~~~~")
+            with span("stats", aircraft=aircraft):
+                dist_travelled(data_df)
+                time_aloft(aircraft, month, year)
+                airports_visited(aircraft, month, year)
+
+    # Hours and legs of the whole selection, from the cached rollups (no track data needed)
+    start, end = stats_window(month, year)
+    utilization_report(fleet, start, end)
+
+
+def airnav_coordinates(airport, cancel=None):
+    """
+    Scrape the coordinates of an airport from airnav.com
+
+    :param airport: ICAO airport code
+    :param cancel: cancellation token, stops the retries of a throttled request. Returns None once cancelled
+    :type cancel: threading.Event
+    :return: [lat, long, airport]
+    :rtype: list[str, str, str]
+    """
+    # scrape airnav.com to find the lat long data
+    # Make a GET request to flightaware
+    url = AIRNAV_URL + "/airport/" + f"{airport}"
+    logger.info(f" Getting GPS coordinate data from URL: {url}")
+    r = http_get(url, cancel=cancel)
+    # Check the status code
+    if r.status_code != 200 and cancelled(cancel):
+        return None
+    if r.status_code != 200:
+        logger.critical(f" Failed to connect to Airnav.com! (airnav_coordinates)")
+        logger.critical(f" status code: {r.status_code}")
+        sys.exit(r.status_code)
+
+    # Parse the HTML
+    soup = bs4.BeautifulSoup(r.text, "html.parser")
+    # ------------------------------------------------------------------------------------------------------------------
+    #   Extract table data
+    # ------------------------------------------------------------------------------------------------------------------
+    # find the latitude and longitude coordinates provided on airnav.com
+    try:
+        s = soup.findAll("table")
+        raw_coords = s[6]
+        rows = raw_coords.find_all("tr")
+        column = rows[2].find_all("td")
+        column = str(column).split("<br/>")
+        column = column[2].split(",")
+        lat = column[0]
+        long = column[1]
+    except Exception as e:
+        logger.critical(f" Error finding information on Airnav.com! (airnav_coordinates)")
+        logger.critical(f" Error: {e}")
+        sys.exit()
+
+    return [lat, long, airport]
+
+
+def airports_coordinates(airports, cancel=None):
+    """
+    Batched airport_coordinates: get the coordinates of every airport with a single MySQL query, scrape airnav.com
+    only for the airports that are not saved yet and save them all at once.
+
+    :param airports: list of ICAO airport codes. "UNKW" is ignored
+    :type airports: list
+    :param cancel: cancellation token, stops scraping airnav.com. The airports not scraped yet are left out
+    :type cancel: threading.Event
+    :return: dataframe [latitude, longitude, airport], one row per airport
+    """
+    airports = sorted(set(airports) - {"UNKW"})
+    if not airports:
+        return pd.DataFrame(columns=["latitude", "longitude", "airport"])
+
+    # Establish connection with MySQL and init cursor
+    db = mysql_connect("airport_coords")
+    mycursor = db.cursor()
+
+    # Create coordinates table
+    mycursor.execute("CREATE TABLE IF NOT EXISTS coords("
+                     "latitude FLOAT(9,4), "
+                     "longitude FLOAT(9,4), "
+                     "airport VARCHAR(15))")
+
+    codes = ", ".join(f"\"{airport}\"" for airport in airports)
+    mycursor.execute(f"SELECT latitude, longitude, airport FROM coords WHERE airport IN ({codes})")
+    coords = {x[2]: [x[0], x[1], x[2]] for x in mycursor}
+    db.close()
+
+    missing = [airport for airport in airports if airport not in coords]
+    if missing:
+        scraped = []
+        for airport in missing:
+            if cancelled(cancel):
+                break
+            coords_row = airnav_coordinates(airport, cancel)
+            if coords_row is not None:
+                scraped.append(coords_row)
+        airport_df = pd.DataFrame(scraped, columns=["latitude", "longitude", "airport"])
+        try:
+            # Convert dataframe to sql table (airport_coordinates)
+            airport_df.to_sql('coords', mysql_engine("airport_coords"), if_exists="append", index=False)
+        except Exception as e:
+            logger.critical(" An error occurred with the SQLAclhemy engine! (airports_coordinates)")
+            logger.critical(f" Error: {e}")
+            sys.exit(e)
+        for row in airport_df.itertuples(index=False):
+            coords[row.airport] = list(row)
+
+    coord_df = pd.DataFrame([coords[airport] for airport in airports if airport in coords],
+                            columns=["latitude", "longitude", "airport"])
+    return coord_df.astype({"latitude": float, "longitude": float})
+
+
+def airport_coordinates(airport):
+    """
+    Get the airport code from mySQL. If not available from mySQL: scrape airnav.com and save those coordinates to mySQL
+    for future use.
+
+    :param airport: ICAO airport code
+    :return: set of lat/long coordinates and the airport code [lat, long, airport]. None for "UNKW" or an airport
+    without coordinates
+    :rtype: list[float, float, str]
+    """
+    coord_df = airports_coordinates([airport])
+    if coord_df.empty:
+        logger.warning(f" No coordinates available for {airport}! (airport_coordinates)")
+        return None
+    return list(coord_df.iloc[0])
+
+
+def airports_plotter(aircraft, month, year):
+    """
+    Determine the airports visited specifically to be used for plotting in Geopandas
+
+    :return: list of airport codes
+    :rtype: list
+    """
+    # Establish connection with MySQL and init cursor
+    db = mysql_connect(aircraft)
+    mycursor = db.cursor()
+
+    # convert month string format to number (January -> 1)
+    month_dates = {
+        "January": 1,
+        "February": 2,
+        "March": 3,
+        "April": 4,
+        "May": 5,
+        "June": 6,
+        "July": 7,
+        "August": 8,
+        "September": 9,
+        "October": 10,
+        "November": 11,
+        "December": 12}
+
+    # convert the month to a number, if not all selected
+    if month != "All":
+        month = month_dates[month]
+
+    try:
+        if month != "All" and year != "All":
+            mycursor.execute(f"SELECT * FROM flight_history "
+                             f"WHERE month(date)={month} and year(date)={year}")
+        elif year != "All":
+            mycursor.execute(f"SELECT * FROM flight_history "
+                             f"WHERE year(date)={year}")
+        elif month != "All":
+            mycursor.execute(f"SELECT * FROM flight_history "
+                             f"WHERE month(date)={month}")
+        else:
+            mycursor.execute(f"SELECT * FROM flight_history")
+
+        # Detected landings include touch-and-goes and intermediate stops, prefer them over the route destination
+        landings = landings_getter(aircraft)
+        hist = []
+        for x in mycursor:
+            flight = flight_table_name(x[0], x[1], x[2])
+            if flight in landings:
+                hist.extend(landings[flight])
+            else:
+                dest = x[1].split("_")[1]
+                hist.append(dest)
+    except Exception as e:
+        db.close()
+        logger.critical(" An error occurred while getting the route history! (airports_visited)")
+        logger.critical(e)
+        sys.exit(e)
+
+    # exit condition if no flight history. Return "UNKW" to avoid trying to concatenate empty lists
+    if not hist or len(hist) == 0:
+        logger.debug(f" {aircraft} has no flight history!")
+        landing_hist_list = ["UNKW"]
+        return landing_hist_list
+
+    return airports_ranked(hist)
+
+
+def airports_ranked(hist):
+    """
+    Unique airports of a list of landings, most visited first.
+
+    :param hist: list of airport codes, one per landing
+    :type hist: list
+    :return: list of airport codes
+    :rtype: list
+    """
+    # Find the number of unique airports and save to dictionary, count each time the airport occurs
+    landing_hist = {}
+    for airport in hist:
+        if airport not in landing_hist:
+            landing_hist[airport] = 1
+        else:
+            landing_hist[airport] += 1
+
+    # sort the airports list
+    landing_hist = dict(sorted(landing_hist.items(), key=lambda item: item[1], reverse=True))
+    # extract only the keys of the dictionary
+    landing_hist_list = list(landing_hist.keys())
+    return landing_hist_list
+
+
+def airports_from_history(history, landings):
+    """
+    Airports visited by the flights already loaded for the map layers (see db_data_getter), without querying the
+    flight history again. Detected landings are preferred over the route destination, like airports_plotter.
+
+    :param history: [(flight table name, route), ...]
+    :type history: list
+    :param landings: {flight table name: [airport, ...]} of the aircraft
+    :type landings: dict
+    :return: list of airport codes, most visited first
+    :rtype: list
+    """
+    hist = []
+    for flight, route in history:
+        if flight in landings:
+            hist.extend(landings[flight])
+        else:
+            hist.append(route.split("_")[1])
+    return airports_ranked(hist)
+
+
+def heatmap_counts(lon, lat):
+    """
+    Count the track points falling in each cell of the heatmap grid.
+
+    :param lon: array of longitudes
+    :param lat: array of latitudes
+    :return: sparse grid, only the non-empty cells. pandas df = [ix, iy, count]
+    """
+    x, y = lonlat_to_mercator(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    counts, _, _ = np.histogram2d(x, y,
+                                  bins=HEATMAP_SHAPE,
+                                  range=[[HEATMAP_BOUNDS[0], HEATMAP_BOUNDS[2]],
+                                         [HEATMAP_BOUNDS[1], HEATMAP_BOUNDS[3]]])
+    ix, iy = np.nonzero(counts)
+    return pd.DataFrame({"ix": ix, "iy": iy, "count": counts[ix, iy].astype(int)})
+
+
+def heatmap_update(aircraft):
+    """
+    Incrementally update the heatmap tables of an aircraft.
+    Only the months whose data version changed since the last update are re-aggregated. The data version only counts
+    the flights whose track data was actually saved (see data_version_bump), so the legs of a cancelled or failed
+    ingest are added once a later run saves them. The difference between the new and the old month grid is added to
+    the yearly and all-time totals, history is never rescanned.
+
+    heatmap_month: grid of each month [year, month, ix, iy, count]
+    heatmap_total: running totals [year, ix, iy, count], year 0 holds the all-time total
+    heatmap_version: data version of each month when it was aggregated [year, month, version]
+
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :rtype: None
+    """
+    db = mysql_connect(aircraft)
+    mycursor = db.cursor()
+
+    mycursor.execute("CREATE TABLE IF NOT EXISTS heatmap_month("
+                     "year SMALLINT, month TINYINT, ix SMALLINT, iy SMALLINT, count INT, "
+                     "PRIMARY KEY (year, month, ix, iy))")
+    mycursor.execute("CREATE TABLE IF NOT EXISTS heatmap_total("
+                     "year SMALLINT, ix SMALLINT, iy SMALLINT, count INT, "
+                     "PRIMARY KEY (year, ix, iy))")
+    mycursor.execute("CREATE TABLE IF NOT EXISTS heatmap_version("
+                     "year SMALLINT, month TINYINT, version INT, "
+                     "PRIMARY KEY (year, month))")
+    # replaced by heatmap_version: it held the flight_history count, which includes the legs never saved
+    mycursor.execute("DROP TABLE IF EXISTS heatmap_state")
+
+    # Find the months that changed since the last update. The months flown before the data versions were introduced
+    # have version 0, they are aggregated once
+    mycursor.execute("SELECT DISTINCT year(date), month(date) FROM flight_history")
+    versions = {(x[0], x[1]): 0 for x in mycursor.fetchall()}
+    try:
+        mycursor.execute("SELECT year, month, version FROM data_version")
+        versions.update({(x[0], x[1]): x[2] for x in mycursor.fetchall()})
+    except Exception:
+        # no flight was ingested since the data versions were introduced
+        pass
+    mycursor.execute("SELECT year, month, version FROM heatmap_version")
+    state = {(x[0], x[1]): x[2] for x in mycursor.fetchall()}
+    stale = sorted(key for key in versions if state.get(key) != versions[key])
+
+    if not stale:
+        logger.debug(f" {aircraft} heatmap is up to date.")
+        db.close()
+        return
+
+    for year, month in stale:
+        data_df = db_data_getter(aircraft, MONTHS[month - 1], year)
+        if data_df.empty:
+            new_df = pd.DataFrame(columns=["ix", "iy", "count"])
+        else:
+            new_df = heatmap_counts(data_df["longitude"].astype(float), data_df["latitude"].astype(float))
+
+        mycursor.execute(f"SELECT ix, iy, count FROM heatmap_month WHERE year={year} AND month={month}")
+        old_df = pd.DataFrame(mycursor.fetchall(), columns=["ix", "iy", "count"])
+
+        # delta = new - old, for every cell present in either grid
+        delta = pd.concat([new_df, old_df.assign(count=-old_df["count"])])
+        delta = delta.groupby(["ix", "iy"], as_index=False)["count"].sum()
+        delta = delta[delta["count"] != 0]
+
+        try:
+            upsert = ("INSERT INTO heatmap_total (year, ix, iy, count) VALUES (%s, %s, %s, %s) "
+                      "ON DUPLICATE KEY UPDATE count = count + VALUES(count)")
+            for total_year in (year, 0):
+                mycursor.executemany(upsert, [(total_year, int(r.ix), int(r.iy), int(r.count))
+                                              for r in delta.itertuples(index=False)])
+
+            mycursor.execute(f"DELETE FROM heatmap_month WHERE year={year} AND month={month}")
+            mycursor.executemany("INSERT INTO heatmap_month (year, month, ix, iy, count) VALUES (%s, %s, %s, %s, %s)",
+                                 [(year, month, int(r.ix), int(r.iy), int(r.count))
+                                  for r in new_df.itertuples(index=False)])
+            mycursor.execute(f"REPLACE INTO heatmap_version (year, month, version) "
+                             f"VALUES ({year}, {month}, {versions[(year, month)]})")
+            # commit each month on its own, a failure never leaves the totals out of sync with the month grids
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f" Error while updating the {aircraft} heatmap for {MONTHS[month - 1]} {year}")
+            logger.warning(e)
+            continue
+        logger.info(f" {aircraft} heatmap updated for {MONTHS[month - 1]} {year}")
+
+    mycursor.execute("DELETE FROM heatmap_total WHERE count = 0")
+    db.commit()
+    db.close()
+
+
+def heatmap_getter(fleet, month, year):
+    """
+    Sum the stored heatmap grids of the fleet. The amount of data read is bounded by the grid size, not by the
+    number of track points behind it.
+
+    :type fleet: list
+    :type month: str
+    :type year: int
+    :return: dense grid of point counts, shape HEATMAP_SHAPE
+    :rtype: numpy.ndarray
+    """
+    grid = np.zeros(HEATMAP_SHAPE)
+
+    for aircraft in fleet:
+        db = mysql_connect(aircraft)
+        mycursor = db.cursor()
+        try:
+            if month != "All" and year != "All":
+                mycursor.execute(f"SELECT ix, iy, count FROM heatmap_month "
+                                 f"WHERE year={year} AND month={MONTHS.index(month) + 1}")
+            elif year != "All":
+                mycursor.execute(f"SELECT ix, iy, count FROM heatmap_total WHERE year={year}")
+            elif month != "All":
+                # same month of every year
+                mycursor.execute(f"SELECT ix, iy, SUM(count) FROM heatmap_month "
+                                 f"WHERE month={MONTHS.index(month) + 1} GROUP BY ix, iy")
+            else:
+                mycursor.execute(f"SELECT ix, iy, count FROM heatmap_total WHERE year=0")
+            cells = np.array(mycursor.fetchall(), dtype=int).reshape(-1, 3)
+        except Exception as e:
+            logger.warning(f" No heatmap available for {aircraft}! Has heatmap_update been run? Error: {e}")
+            db.close()
+            continue
+        db.close()
+        np.add.at(grid, (cells[:, 0], cells[:, 1]), cells[:, 2])
+
+    return grid
+
+
+def tile_cache_init():
+    """
+    Point contextily at the persistent tile cache (TILE_CACHE_DIR) and evict the oldest tiles if the cache grew
+    larger than TILE_CACHE_MAX_MB. Only runs once per session.
+
+    :rtype: None
+    """
+    if tile_cache_state.get("ready"):
+        return
+    os.makedirs(os.path.join(TILE_CACHE_DIR, "tiles"), exist_ok=True)
+    ctx.set_cache_dir(os.path.join(TILE_CACHE_DIR, "tiles"))
+    tile_cache_evict()
+    tile_cache_state["ready"] = True
+
+
+def tile_cache_evict(max_mb=None):
+    """
+    Least recently used eviction of the tile cache. Each cached tile is a joblib entry directory, the entries that
+    were accessed the longest time ago are deleted until the cache fits in max_mb.
+
+    :param max_mb: cache size limit in megabytes. None = TILE_CACHE_MAX_MB
+    :type max_mb: int
+    :rtype: None
+    """
+    max_mb = TILE_CACHE_MAX_MB if max_mb is None else max_mb
+
+    entries = []
+    for folder, _, files in os.walk(os.path.join(TILE_CACHE_DIR, "tiles")):
+        if "output.pkl" not in files:
+            continue
+        stats = [os.stat(os.path.join(folder, f)) for f in files]
+        last_used = max(max(st.st_atime, st.st_mtime) for st in stats)
+        entries.append((last_used, sum(st.st_size for st in stats), folder))
+
+    total = sum(entry[1] for entry in entries)
+    if total <= max_mb * 1024 * 1024:
+        return
+
+    removed = 0
+    for last_used, size, folder in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        shutil.rmtree(folder, ignore_errors=True)
+        total -= size
+        removed += 1
+    logger.info(f" {removed} tiles evicted from the tile cache ({total / 1024 / 1024:.0f} MB left)")
+
+
+def place_bounds(search, zoom):
+    """
+    Get the bounds of a place, geocoding it only the first time. Results are kept in TILE_CACHE_DIR/places.json
+
+    :param search: place to geocode. ex: "Kansas City"
+    :type search: str
+    :param zoom: tile zoom level used for the place
+    :type zoom: int
+    :return: (west, south, east, north, zoom) in lon/lat
+    :rtype: tuple
+    """
+    path = os.path.join(TILE_CACHE_DIR, "places.json")
+    places = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            places = json.load(f)
+
+    key = f"{search}|{zoom}"
+    if key not in places:
+        tile_cache_init()
+        logger.info(f" Geocoding {search}...")
+        place = ctx.Place(search, zoom=zoom, source=BASEMAP_SOURCE)
+        places[key] = list(place.bbox) + [place.zoom]
+        os.makedirs(TILE_CACHE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(places, f, indent=2)
+
+    return tuple(places[key])
+
+
+def basemap(ax, zoom="auto"):
+    """
+    Add the basemap tiles to the map, using the persistent tile cache.
+    When offline and the tiles are not cached, the map is drawn without basemap instead of failing.
+
+    :param ax: matplotlib axes, in EPSG:3857
+    :param zoom: tile zoom level, or "auto"
+    :rtype: None
+    """
+    if not BASEMAP:
+        return
+    tile_cache_init()
+    try:
+        with span("basemap"):
+            ctx.add_basemap(ax, zoom=zoom, source=BASEMAP_SOURCE)
+    except Exception as e:
+        logger.warning(f" Unable to add the basemap, tiles not cached and no network? (basemap)")
+        logger.warning(f" Error: {e}")
+
+
+def tile_prefetch(bounds=PREFETCH_BOUNDS, zooms=PREFETCH_ZOOMS):
+    """
+    Seed the tile cache with the tiles covering our usual area, and the local KC map.
+    Run once while online, renders can then be done offline.
+
+    :param bounds: (west, south, east, north) in lon/lat
+    :type bounds: tuple
+    :param zooms: tile zoom levels to download
+    :type zooms: iterable
+    :rtype: None
+    """
+    tile_cache_init()
+    w, s, e, n = bounds
+    for zoom in zooms:
+        logger.info(f" Prefetching zoom {zoom}: {ctx.howmany(w, s, e, n, zoom, ll=True, verbose=False)} tiles")
+        ctx.bounds2img(w, s, e, n, zoom=zoom, ll=True, source=BASEMAP_SOURCE)
+
+    w, s, e, n, zoom = place_bounds(*KC_PLACE)
+    logger.info(f" Prefetching {KC_PLACE[0]}: {ctx.howmany(w, s, e, n, zoom, ll=True, verbose=False)} tiles")
+    ctx.bounds2img(w, s, e, n, zoom=zoom, ll=True, source=BASEMAP_SOURCE)
+
+    tile_cache_evict()
+    logger.info(" Tile prefetch completed!")
+
+
+def map_axes(local):
+    """
+    Create the map axes, in EPSG:3857.
+    Full map: autoscaled over the plotted data, the basemap is added once everything has been drawn.
+    Local map: fixed to the (cached) Kansas City bounds, with the basemap drawn first.
+
+    :param local: False = total area map, True = Local KC map
+    :type local: bool
+    :return: matplotlib axes
+    """
+    if not local:
+        fig, ax = plt.subplots()
+        ax.set_aspect("equal")
+        # hide the x and y-axis labels
+        ax.get_xaxis().set_visible(False)
+        ax.get_yaxis().set_visible(False)
+    else:
+        w, s, e, n, zoom = place_bounds(*KC_PLACE)
+        fig, ax = plt.subplots(figsize=(12, 12))
+        ax.set_axis_off()
+        x, y = lonlat_to_mercator(np.array([w, e]), np.array([s, n]))
+        ax.set_xlim(x)
+        ax.set_ylim(y)
+        basemap(ax, zoom=zoom)
+        ax.autoscale(False)
+    return ax
+
+
+def heatmap_map(fleet, month, year, local, output=None, cache=None):
+    """
+    Plot the fleet activity as a heatmap, using the pre-aggregated grids from heatmap_update.
+
+    :param fleet: list of aircraft that will be plotted.
+    :type fleet: list
+    :type month: str
+    :type year: int
+    :param local: False = total area map, True = Local KC map
+    :type local: bool
+    :param output: image file to write (.png/.jpg). None = show the map
+    :type output: str
+    :param cache: render cache file (see render_cached)
+    :type cache: str
+
+    :rtype: None
+    """
+    with span("heatmap_getter"):
+        grid = heatmap_getter(fleet, month, year)
+
+    ax = map_axes(local)
+
+    # log scale, otherwise the home airports hide everything else. Empty cells are transparent
+    heat = np.ma.masked_equal(np.log1p(grid.T), 0)
+    im = ax.imshow(heat,
+                   extent=(HEATMAP_BOUNDS[0], HEATMAP_BOUNDS[2], HEATMAP_BOUNDS[1], HEATMAP_BOUNDS[3]),
+                   origin="lower",
+                   cmap="inferno",
+                   alpha=0.8,
+                   interpolation="nearest",
+                   zorder=2)
+    plt.colorbar(im, ax=ax, label="Track points (log)")
+
+    # zoom to the cells that contain data
+    ix, iy = np.nonzero(grid)
+    if not local and ix.size:
+        pad = 10
+        ax.set_xlim(HEATMAP_BOUNDS[0] + (ix.min() - pad) * HEATMAP_CELL,
+                    HEATMAP_BOUNDS[0] + (ix.max() + pad) * HEATMAP_CELL)
+        ax.set_ylim(HEATMAP_BOUNDS[1] + (iy.min() - pad) * HEATMAP_CELL,
+                    HEATMAP_BOUNDS[1] + (iy.max() + pad) * HEATMAP_CELL)
+
+    # Airports from the stored landings of the whole fleet (one query), the flight history is only read for the
+    # aircraft without stored landings in the selection (see landings_backfill)
+    landings = fleet_landings_getter(fleet, month, year)
+    airports_fleet = []
+    for aircraft in fleet:
+        if aircraft in landings:
+            airports_fleet += airports_ranked([airport for stops in landings[aircraft].values() for airport in stops])
+        else:
+            airports_fleet += airports_plotter(aircraft, month, year)
+    airports_annotate(ax, list(set(airports_fleet)))
+
+    if month != "All":
+        ax.set_title(f"{month} flight heatmap")
+    else:
+        ax.set_title(f"{year} flight heatmap")
+
+    if not local:
+        basemap(ax)
+
+    map_output(ax, output, cache)
+
+
+def airports_annotate(ax, airports_fleet):
+    """
+    Label the visited airports on the map.
+
+    :param ax: matplotlib axes, in EPSG:3857
+    :param airports_fleet: list of ICAO airport codes
+    :type airports_fleet: list
+    :rtype: None
+    """
+    # UNKW airports and aircraft that returned "UNKW" because the flight history was empty are skipped
+    # All the coordinates are looked up at once, then projected together
+    coord_df = airports_coordinates(airports_fleet)
+    xs, ys = lonlat_to_mercator(coord_df["longitude"].to_numpy(dtype=float), coord_df["latitude"].to_numpy(dtype=float))
+    for x, y, label in zip(xs, ys, coord_df["airport"]):
+        ax.annotate(label, xy=(x, y), xytext=(3, 3), textcoords="offset points", )
+
+
+def track_geometry(data_df):
+    """
+    Project the track data of db_data_getter to Web Mercator (EPSG:3857) and find where each flight starts.
+    Single vectorized pass over the coordinate arrays, no shapely object is created per point.
+
+    :param data_df: pandas df containing latitude, longitude and the flight ID
+    :return: x, y arrays and the flight offsets (start index of each flight, followed by the total length)
+    :rtype: tuple
+    """
+    lon = pd.to_numeric(data_df["longitude"], errors="coerce").to_numpy(dtype=float)
+    lat = pd.to_numeric(data_df["latitude"], errors="coerce").to_numpy(dtype=float)
+    ids = data_df["ID"].to_numpy()
+
+    valid = ~(np.isnan(lon) | np.isnan(lat))
+    lon, lat, ids = lon[valid], lat[valid], ids[valid]
+
+    x, y = lonlat_to_mercator(lon, lat)
+    # db_data_getter concatenates the flights one after the other, a new flight starts wherever the ID changes
+    offsets = np.r_[0, np.flatnonzero(ids[1:] != ids[:-1]) + 1, len(ids)]
+    return x, y, offsets
+
+
+def track_lines(x, y, offsets):
+    """
+    Build one LineString per flight directly from the projected coordinate arrays.
+
+    :param x: array of x coordinates
+    :param y: array of y coordinates
+    :param offsets: flight offsets from track_geometry()
+    :return: list of LineString, flights with less than 2 points are skipped
+    :rtype: list
+    """
+    xy = np.column_stack([x, y])
+    return [shapely_geometry.LineString(xy[a:b]) for a, b in zip(offsets[:-1], offsets[1:]) if b - a > 1]
+
+
+def density_plotter(ax, x, y, extent, color, label):
+    """
+    Draw a dense point layer as a single raster image: the points are binned over the map extent and the opacity
+    of each pixel follows the (log) number of points in it. Render time no longer depends on the number of points.
+
+    :param ax: matplotlib axes, in EPSG:3857
+    :param x: array of x coordinates
+    :param y: array of y coordinates
+    :param extent: (xmin, ymin, xmax, ymax) covered by the raster
+    :param color: matplotlib color of the layer
+    :param label: legend label of the layer
+    :rtype: None
+    """
+    xmin, ymin, xmax, ymax = extent
+    # RASTER_BINS pixels on the longest side of the map
+    scale = RASTER_BINS / max(xmax - xmin, ymax - ymin, 1)
+    bins = (max(1, int((xmax - xmin) * scale)), max(1, int((ymax - ymin) * scale)))
+    counts, _, _ = np.histogram2d(x, y, bins=bins, range=[[xmin, xmax], [ymin, ymax]])
+    counts = counts.T
+
+    rgba = np.zeros(counts.shape + (4,))
+    rgba[..., :3] = mcolors.to_rgba(color)[:3]
+    if counts.max() > 0:
+        # every visited pixel is at least 30% opaque, the busiest ones are fully opaque
+        density = np.log1p(counts) / np.log1p(counts.max())
+        rgba[..., 3] = np.where(counts > 0, 0.3 + 0.7 * density, 0)
+
+    ax.imshow(rgba, extent=(xmin, xmax, ymin, ymax), origin="lower", zorder=2)
+    # imshow has no legend entry, use an empty line as a proxy
+    ax.plot([], [], color=color, label=label)
+
+
+def fleet_registry(fleet=None):
+    """
+    Get the registry entries (tail number, model, map color) of the selected aircraft, in registry order.
+    Aircraft missing from FLEET get a generic model and a color from the matplotlib color cycle.
+
+    :param fleet: list of aircraft. None = whole registry
+    :type fleet: list
+    :return: list of (tail number, model, color)
+    :rtype: list
+    """
+    if fleet is None:
+        return list(FLEET)
+    registry = [entry for entry in FLEET if entry[0] in fleet]
+    known = [entry[0] for entry in FLEET]
+    unknown = [aircraft for aircraft in fleet if aircraft not in known]
+    for i, aircraft in enumerate(unknown):
+        registry.append((aircraft, "Aircraft", f"C{i % 10}"))
+    return registry
+
+
+def layers_cached(aircraft, month, year, viewport=None):
+    """
+    db_data_getter and flight_extents of one aircraft-month, through the in-memory cache. An entry is reused while
+    the data version of the selection is unchanged (see data_version_bump). A full entry (viewport None) also serves
+    the viewport requests. The cached dataframes are shared: callers must not modify them.
+
+    :param aircraft: N# of club aircraft
+    :type aircraft: str
+    :type month: str
+    :type year: int
+    :param viewport: (west, south, east, north) lon/lat, see db_data_getter
+    :type viewport: tuple
+    :return: (track data df, flight extents df)
+    :rtype: tuple
+    """
+    version = data_version_getter(aircraft, month, year)
+    with layers_cache_lock:
+        for key in [(aircraft, month, year, None), (aircraft, month, year, viewport)]:
+            entry = layers_cache.get(key)
+            if entry is not None and entry[0] == version:
+                layers_cache.move_to_end(key)
+                return entry[1], entry[2]
+
+    with span("db_data_getter", aircraft=aircraft, month=month, year=year):
+        data_df = db_data_getter(aircraft, month, year, viewport)
+    with span("flight_extents", aircraft=aircraft, month=month, year=year):
+        extents = flight_extents(aircraft, month, year)
+    with layers_cache_lock:
+        layers_cache[(aircraft, month, year, viewport)] = (version, data_df, extents)
+        while len(layers_cache) > LAYERS_CACHE_SIZE:
+            layers_cache.popitem(last=False)
+    return data_df, extents
+
+
+def layers_prefetch(aircraft, month, year, viewport=None):
+    """
+    Load an aircraft-month into the in-memory cache ahead of time (see layers_cached). The GUI runs it in the render
+    process (maps) and on its prefetch thread (stats).
+
+    :rtype: None
+    """
+    layers_cached(aircraft, month, year, viewport)
+    logger.debug(f" {aircraft} {month} {year} prefetched.")
+
+
+def fleet_layers_loader(fleet, month, year, viewport=None):
+    """
+    Load the track data, the visited airports and the flight extents of each aircraft concurrently on a thread pool.
+    Database loads are I/O bound, so the total wait is bounded by the slowest aircraft instead of the sum of them all.
+
+    :param fleet: list of aircraft
+    :type fleet: list
+    :type month: str
+    :type year: int
+    :param viewport: (west, south, east, north) lon/lat, flights entirely outside are skipped. None = everything
+    :type viewport: tuple
+    :return: {aircraft: (track data df, list of airport codes, flight extents df)}
+    :rtype: dict
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(fleet) + 1)) as pool:
+        # track data and extents come from the in-memory cache when they were prefetched
+        data = {aircraft: pool.submit(trace_bound(layers_cached), aircraft, month, year, viewport)
+                for aircraft in fleet}
+        landings = pool.submit(trace_bound(fleet_landings_getter), fleet, month, year)
+
+        # The airports come from the flight history loaded with the track data, and one landings query for the fleet
+        layers = {}
+        for aircraft in fleet:
+            data_df, extents = data[aircraft].result()
+            airports = airports_from_history(data_df.attrs.get("history", []), landings.result().get(aircraft, {}))
+            layers[aircraft] = (data_df, airports, extents)
+        return layers
+
+
+def full_area_map(fleet, month, year, option, local, output=None, cache=None):
+    """
+    Use the lat/long data to plot a composite map of the KC area
+
+    :param fleet: list of aircraft that will be plotted.
+    :type fleet: list
+    :param month: month of data that will be pulled from MySQL.
+    :type month: str
+    :param year: year of data that will be pulled from MySql
+    :type year: int
+    :param option: "Points", "Lines" or "Heatmap", to determine the graphing option.
+    :type option: str
+    :param local: False = total area map, True = Local KC map
+    :type local: bool
+    :param output: image file to write (.png/.jpg). None = show the map
+    :type output: str
+    :param cache: render cache file (see render_cached)
+    :type cache: str
+
+    :rtype: None
+    """
+    # The heatmap is drawn from the pre-aggregated grids, no track data has to be loaded
+    if option == "Heatmap":
+        heatmap_map(fleet, month, year, local, output, cache)
+        return
+
+    # Define the map size
+    ax = map_axes(local)
+
+    # The local map only loads the flights that cross it
+    viewport = place_bounds(*KC_PLACE)[0:4] if local else None
+
+    # Load the data of every aircraft concurrently, the map is drawn once all the layers are ready
+    layers = fleet_layers_loader(fleet, month, year, viewport)
+
+    # project every layer straight to EPSG:3857 first, the rendering path depends on the total number of points
+    airports_fleet = []
+    geometry = {}
+    for aircraft, model, color in fleet_registry(fleet):
+        data_df, airports, extents = layers[aircraft]
+        airports_fleet += airports
+        # Catch condition where there are is no flight history
+        if not data_df.empty:
+            with span("reprojection", aircraft=aircraft, points=len(data_df)):
+                geometry[aircraft] = track_geometry(data_df)
+
+    # Dense selections are aggregated into a raster instead of drawing every point/segment
+    raster_extent = None
+    if sum(len(g[0]) for g in geometry.values()) > RENDER_MAX_POINTS:
+        if local:
+            raster_extent = (ax.get_xlim()[0], ax.get_ylim()[0], ax.get_xlim()[1], ax.get_ylim()[1])
+        else:
+            raster_extent = (min(g[0].min() for g in geometry.values()), min(g[1].min() for g in geometry.values()),
+                             max(g[0].max() for g in geometry.values()), max(g[1].max() for g in geometry.values()))
+
+    for aircraft, model, color in fleet_registry(fleet):
+        if aircraft not in geometry:
+            continue
+        x, y, offsets = geometry[aircraft]
+        label = f"{model} - {aircraft}"
+
+        if raster_extent is not None:
+            density_plotter(ax, x, y, raster_extent, color, label)
+        elif option == "Lines":
+            # one LineCollection per aircraft, the flights are slices of the coordinate arrays
+            xy = np.column_stack([x, y])
+            segments = [xy[a:b] for a, b in zip(offsets[:-1], offsets[1:]) if b - a > 1]
+            ax.add_collection(mcollections.LineCollection(segments, colors=color, linewidths=1, label=label))
+        else:
+            ax.scatter(x, y, s=1, color=color, linewidths=0, label=label, rasterized=True)
+
+    if not local:
+        ax.autoscale_view()
+
+    # Combined all the airport data, save only the unique values
+    airports_fleet = list(set(airports_fleet))
+    with span("airports"):
+        airports_annotate(ax, airports_fleet)
+
+    # Auto-zoom: fit the full map to the union of the selected flights' extents (5% margin)
+    # Only when every loaded flight has a stored extent, otherwise keep the autoscaled view
+    view = extents_union([layer[2] for layer in layers.values()])
+    indexed = all(layer[0].empty or len(layer[2]) >= layer[0]["ID"].nunique() for layer in layers.values())
+    if not local and view is not None and indexed:
+        xmin, ymin, xmax, ymax = view
+        margin = 0.05 * max(xmax - xmin, ymax - ymin, 10000)
+        ax.set_xlim(xmin - margin, xmax + margin)
+        ax.set_ylim(ymin - margin, ymax + margin)
+
+    # finally, plot
+    if ax.get_legend_handles_labels()[0]:
+        ax.legend(loc="upper left")
+    if month != "All":
+        ax.set_title(f"{month} flight history")
+    else:
+        ax.set_title(f"{year} flight history")
+
+    if not local:
+        basemap(ax)
+
+    map_output(ax, output, cache)
+
+
+def mercator_to_lonlat(x, y):
+    """
+    Vectorized inverse of lonlat_to_mercator: Web Mercator (EPSG:3857) meters to lon/lat (EPSG:4326).
+
+    :param x: array of x coordinates
+    :param y: array of y coordinates
+    :return: lon, lat arrays
+    :rtype: tuple
+    """
+    r = 6378137.0
+    lon = np.degrees(np.asarray(x) / r)
+    lat = np.degrees(2 * np.arctan(np.exp(np.asarray(y) / r)) - np.pi / 2)
+    return lon, lat
+
+
+def geojson_line(line, decimals):
+    """
+    Convert a simplified EPSG:3857 LineString into quantized GeoJSON lon/lat coordinates.
+    Consecutive points that collapse onto the same quantized coordinate are dropped.
+
+    :param line: shapely LineString in EPSG:3857
+    :param decimals: number of decimals kept in the lon/lat coordinates
+    :type decimals: int
+    :return: list of [lon, lat]. None if less than 2 points are left
+    :rtype: list
+    """
+    xy = np.asarray(line.coords)
+    lon, lat = mercator_to_lonlat(xy[:, 0], xy[:, 1])
+    coords = np.column_stack([lon, lat]).round(decimals)
+    keep = np.r_[True, np.any(coords[1:] != coords[:-1], axis=1)]
+    coords = coords[keep]
+    if len(coords) < 2:
+        return None
+    return coords.tolist()
+
+
+def geojson_export(fleet=None, export_dir=EXPORT_DIR):
+    """
+    Export the stored tracks as pre-simplified, quantized GeoJSON for the web map (web/index.html).
+    One file per aircraft, month and zoom band (EXPORT_BANDS): <export_dir>/<aircraft>/<YYYY-MM>/<band>.geojson
+
+    Generation is incremental: manifest.json keeps a signature of the flights of each aircraft-month, only the
+    months whose flights changed since the last export are regenerated.
+
+    :param fleet: list of aircraft. None = whole registry
+    :type fleet: list
+    :param export_dir: output directory
+    :type export_dir: str
+    :rtype: None
+    """
+    manifest_path = os.path.join(export_dir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    bands = [{"name": name, "min_zoom": min_zoom, "max_zoom": max_zoom, "tolerance": tolerance, "decimals": decimals}
+             for name, min_zoom, max_zoom, tolerance, decimals in EXPORT_BANDS]
+    # Changing the zoom bands invalidates everything
+    if manifest.get("bands") != bands:
+        manifest = {}
+    manifest["bands"] = bands
+    months_done = manifest.setdefault("months", {})
+
+    registry = fleet_registry(fleet)
+    for aircraft, model, color in registry:
+        engine = mysql_engine(aircraft)
+        hist_df = pd.read_sql("SELECT DISTINCT date, route, dept_time FROM flight_history ORDER BY date ASC", engine)
+        tables_exist = set(pd.read_sql("SHOW TABLES", engine).iloc[:, 0])
+        hist_df["flight"] = [flight_table_name(x.date, x.route, x.dept_time) for x in hist_df.itertuples()]
+        hist_df = hist_df[hist_df["flight"].isin(tables_exist)].drop_duplicates(subset="flight")
+        hist_df["month"] = pd.to_datetime(hist_df["date"]).dt.strftime("%Y-%m")
+
+        aircraft_done = months_done.setdefault(aircraft, {})
+        for month, month_df in hist_df.groupby("month"):
+            signature = hashlib.sha1(",".join(month_df["flight"]).encode()).hexdigest()
+            if aircraft_done.get(month) == signature:
+                continue
+
+            # flight tracks as EPSG:3857 lines, simplified once per zoom band
+            lines = []
+            for flight in month_df.itertuples(index=False):
+                track_df = pd.read_sql(f"SELECT latitude, longitude FROM {flight.flight}", engine)
+                track_df["ID"] = flight.flight
+                x, y, offsets = track_geometry(track_df)
+                for line in track_lines(x, y, offsets):
+                    lines.append((flight, line))
+
+            month_dir = os.path.join(export_dir, aircraft, month)
+            os.makedirs(month_dir, exist_ok=True)
+            for band in bands:
+                features = []
+                for flight, line in lines:
+                    coords = geojson_line(line.simplify(band["tolerance"], preserve_topology=False), band["decimals"])
+                    if coords is None:
+                        continue
+                    features.append({"type": "Feature",
+                                     "geometry": {"type": "LineString", "coordinates": coords},
+                                     "properties": {"flight": flight.flight,
+                                                    "date": str(flight.date),
+                                                    "route": flight.route.replace("_", "-")}})
+                with open(os.path.join(month_dir, band["name"] + ".geojson"), "w") as f:
+                    json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"))
+
+            aircraft_done[month] = signature
+            logger.info(f" {aircraft} {month} exported ({len(lines)} flights)")
+
+    manifest["fleet"] = [{"aircraft": aircraft, "model": model, "color": color,
+                          "months": sorted(months_done.get(aircraft, {}))}
+                         for aircraft, model, color in fleet_registry(list(months_done))]
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    # web map page
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "web", "index.html"),
+                os.path.join(export_dir, "index.html"))
+    logger.info(f" GeoJSON export completed! Open {os.path.join(export_dir, 'index.html')} through a web server.")
+
+
+def map_output(ax, output=None, cache=None):
+    """
+    Show the map, or write it to an image file and close its figure (headless rendering).
+
+    :param ax: matplotlib axes of the map
+    :param output: image file to write (.png/.jpg). None = show the map
+    :type output: str
+    :param cache: render cache file to also write the map to before it is shown
+    :type cache: str
+    :rtype: None
+    """
+    if cache is not None:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        with span("savefig"):
+            ax.figure.savefig(cache, dpi=RENDER_DPI, bbox_inches="tight")
+    if output is None:
+        plt.show()
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with span("savefig"):
+        ax.figure.savefig(output, dpi=RENDER_DPI, bbox_inches="tight")
+    plt.close(ax.figure)
+    logger.info(f" Map saved to {output}")
+
+
+def archive_path(archive_dir, fleet, month, year, option, local, fmt="png"):
+    """
+    Location of a rendered map in the archive, organized by year & month.
+    ex: archive/2022/07-July/fleet_Lines_full.png
+
+    :rtype: str
+    """
+    if month == "All":
+        month_dir = "All"
+    else:
+        month_dir = f"{MONTHS.index(month) + 1:02d}-{month}"
+    if sorted(fleet) == sorted(entry[0] for entry in FLEET):
+        fleet_tag = "fleet"
+    else:
+        fleet_tag = "-".join(fleet)
+    map_tag = "kc" if local else "full"
+    return os.path.join(archive_dir, str(year), month_dir, f"{fleet_tag}_{option}_{map_tag}.{fmt}")
+
+
+def render_worker_init(password, host=None, port=None, user=None):
+    """
+    Initialize a render process: headless Agg backend and MySQL connection settings.
+
+    :type password: str
+    :param host: MySQL host. None = keep MYSQL_HOST
+    :type host: str
+    :type port: int
+    :type user: str
+    :rtype: None
+    """
+    global pw, MYSQL_HOST, MYSQL_PORT, MYSQL_USER
+    pw = password
+    MYSQL_HOST = host or MYSQL_HOST
+    MYSQL_PORT = port or MYSQL_PORT
+    MYSQL_USER = user or MYSQL_USER
+    plt.switch_backend("Agg")
+
+
+def render_job(job, archive_dir, fmt="png"):
+    """
+    Render a single map into the archive. Runs inside a render process.
+
+    :param job: (month, year, fleet, option, local)
+    :type job: tuple
+    :return: path of the image file
+    :rtype: str
+    """
+    month, year, fleet, option, local = job
+    output = archive_path(archive_dir, fleet, month, year, option, local, fmt)
+    render_cached(fleet, month, year, option, local, output)
+    return output
+
+
+def render_batch(jobs, archive_dir=ARCHIVE_DIR, processes=None, fmt="png"):
+    """
+    Render many maps in parallel, one process per core. Each process renders headless with its own figures.
+
+    :param jobs: list of (month, year, fleet, option, local)
+    :type jobs: list
+    :param archive_dir: root of the year/month archive tree
+    :type archive_dir: str
+    :param processes: number of render processes. None = every core
+    :type processes: int
+    :param fmt: "png" or "jpg"
+    :type fmt: str
+    :return: list of the image files written
+    :rtype: list
+    """
+    written = []
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                             initializer=render_worker_init,
+                             initargs=(pw, MYSQL_HOST, MYSQL_PORT, MYSQL_USER)) as pool:
+        futures = {pool.submit(traced, render_job, job, archive_dir, fmt): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                output, spans = future.result()
+                trace_merge(spans)
+                written.append(output)
+            except BaseException as e:
+                logger.warning(f" Failed to render {futures[future]} (render_batch)")
+                logger.warning(f" Error: {e}")
+    logger.info(f" {len(written)} out of {len(jobs)} maps rendered into {archive_dir}")
+    return written
+
+
+def data_version_bump(aircraft, flights):
+    """
+    Bump the data version of the aircraft-months that received new flights. The render cache keys include these
+    versions, so only the cached maps covering the affected aircraft-months are invalidated.
+
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :param flights: flight details table names that were saved. ex: ["2022_07_22__mo3_kojc__14"]
+    :type flights: list
+    :rtype: None
+    """
+    months = sorted({(int(flight[0:4]), int(flight[5:7])) for flight in flights})
+    if not months:
+        return
+
+    db = mysql_connect(aircraft)
+    mycursor = db.cursor()
+    try:
+        mycursor.execute("CREATE TABLE IF NOT EXISTS data_version("
+                         "year SMALLINT, "
+                         "month TINYINT, "
+                         "version INT, "
+                         "PRIMARY KEY (year, month))")
+        mycursor.executemany("INSERT INTO data_version (year, month, version) VALUES (%s, %s, 1) "
+                             "ON DUPLICATE KEY UPDATE version = version + 1", months)
+        db.commit()
+    except Exception as e:
+        logger.warning(f" Error while updating the data version of {aircraft} (data_version_bump)")
+        logger.warning(f" Error: {e}")
+    db.close()
 
 
-def airports_plotter(aircraft, month, year):
+def data_version_getter(aircraft, month, year):
     """
-    Determine the airports visited specifically to be used for plotting in Geopandas
+    Data version of an aircraft for the selected month & year: the sum of the version counters of the covered months.
+    Every bump increases it, so it changes whenever any flight of the selection was added.
 
-    :return: list of airport codes
-    :rtype: list
+    :param aircraft: N# of club aircraft, used for MySQL schema name
+    :type aircraft: str
+    :type month: str
+    :type year: int
+    :rtype: int
     """
-    # Establish connection with MySQL and init cursor
+    where = []
+    if month != "All":
+        where.append(f"month={MONTHS.index(month) + 1}")
+    if year != "All":
+        where.append(f"year={year}")
+
     db = mysql_connect(aircraft)
     mycursor = db.cursor()
+    try:
+        mycursor.execute("SELECT COALESCE(SUM(version), 0) FROM data_version" +
+                         (" WHERE " + " AND ".join(where) if where else ""))
+        version = int(mycursor.fetchone()[0])
+    except Exception:
+        # no flight was ingested since the data versions were introduced
+        version = 0
+    db.close()
+    return version
 
-    # convert month string format to number (January -> 1)
-    month_dates = {
-        "January": 1,
-        "February": 2,
-        "March": 3,
-        "April": 4,
-        "May": 5,
-        "June": 6,
-        "July": 7,
-        "August": 8,
-        "September": 9,
-        "October": 10,
-        "November": 11,
-        "December": 12}
 
-    # convert the month to a number, if not all selected
-    if month != "All":
-        month = month_dates[month]
+def render_cache_path(fleet, month, year, option, local, fmt="png"):
+    """
+    Render cache file of a map: hash of the selection and of the data versions of the selected aircraft.
 
-    try:
-        if month != "All" and year != "All":
-            mycursor.execute(f"SELECT * FROM flight_history "
-                             f"WHERE month(date)={month} and year(date)={year}")
-        elif year != "All":
-            mycursor.execute(f"SELECT * FROM flight_history "
-                             f"WHERE year(date)={year}")
-        else:
-            mycursor.execute(f"SELECT * FROM flight_history")
+    :rtype: str
+    """
+    key = {"fleet": sorted(fleet),
+           "month": month,
+           "year": str(year),
+           "option": option,
+           "local": bool(local),
+           "dpi": RENDER_DPI,
+           "basemap": BASEMAP,
+           "basemap_source": str(BASEMAP_SOURCE),
+           "versions": [data_version_getter(aircraft, month, year) for aircraft in sorted(fleet)]}
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return os.path.join(RENDER_CACHE_DIR, f"{digest}.{fmt}")
+
+
+def render_cache_evict(max_mb=None):
+    """
+    Least recently used eviction of the render cache, until it fits in max_mb.
+    Stale maps (older data versions) are never hit again and age out first.
 
-        hist = []
-        for x in mycursor:
-            # convert DATE format to string with underscores to allow to be used as table name
-            dest = x[1].split("_")[1]
-            hist.append(dest)
-    except Exception as e:
-        db.close()
-        logger.critical(" An error occurred while getting the route history! (airports_visited)")
-        logger.critical(e)
-        sys.exit(e)
+    :param max_mb: cache size limit in megabytes. None = RENDER_CACHE_MAX_MB
+    :type max_mb: int
+    :rtype: None
+    """
+    max_mb = RENDER_CACHE_MAX_MB if max_mb is None else max_mb
+    if not os.path.isdir(RENDER_CACHE_DIR):
+        return
 
-    # exit condition if no flight history. Return "UNKW" to avoid trying to concatenate empty lists
-    if not hist or len(hist) == 0:
-        logger.debug(f" {aircraft} has no flight history!")
-        landing_hist_list = ["UNKW"]
-        return landing_hist_list
+    entries = []
+    for name in os.listdir(RENDER_CACHE_DIR):
+        st = os.stat(os.path.join(RENDER_CACHE_DIR, name))
+        entries.append((st.st_mtime, st.st_size, name))
 
-    # Find the number of unique airports and save to dictionary, count each time the airport occurs
-    landing_hist = {}
-    for airport in hist:
-        if airport not in landing_hist:
-            landing_hist[airport] = 1
-        else:
-            landing_hist[airport] += 1
+    total = sum(entry[1] for entry in entries)
+    removed = 0
+    for last_used, size, name in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(os.path.join(RENDER_CACHE_DIR, name))
+        except OSError:
+            # already evicted by another render process
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f" {removed} maps evicted from the render cache ({total / 1024 / 1024:.0f} MB left)")
 
-    # sort the airports list
-    landing_hist = dict(sorted(landing_hist.items(), key=lambda item: item[1], reverse=True))
-    # extract only the keys of the dictionary
-    landing_hist_list = list(landing_hist.keys())
-    return landing_hist_list
 
+def image_show(path):
+    """
+    Show a rendered map image in a matplotlib window.
 
-def full_area_map(fleet, month, year, option, local):
+    :param path: image file
+    :type path: str
+    :rtype: None
     """
-    Use the lat/long data to plot a composite map of the KC area
+    img = plt.imread(path)
+    height, width = img.shape[0:2]
+    # screen size: at most 12 inches on the long side
+    scale = min(1.0, 12 * plt.rcParams["figure.dpi"] / max(height, width))
+    fig = plt.figure(figsize=(width * scale / plt.rcParams["figure.dpi"], height * scale / plt.rcParams["figure.dpi"]))
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.imshow(img)
+    ax.set_axis_off()
+    plt.show()
+
+
+def render_cache_fill(fleet, month, year, option, local, fmt="png"):
+    """
+    Render a map into the render cache, unless it is already cached. Safe to run in a render process.
 
     :param fleet: list of aircraft that will be plotted.
     :type fleet: list
-    :param month: month of data that will be pulled from MySQL.
     :type month: str
-    :param year: year of data that will be pulled from MySql
     :type year: int
-    :param option: "Points" or "Lines", to determine the graphing option.
+    :param option: "Points", "Lines" or "Heatmap"
     :type option: str
     :param local: False = total area map, True = Local KC map
     :type local: bool
-
-    :rtype: None
+    :param fmt: "png" or "jpg"
+    :type fmt: str
+    :return: path of the cached image
+    :rtype: str
     """
+    path = render_cache_path(fleet, month, year, option, local, fmt)
+    if os.path.exists(path):
+        # mark as recently used
+        os.utime(path)
+        logger.info(f" Map loaded from the render cache")
+        return path
 
-    # Define the map size
-    if not local:
-        ax = plt.subplot()
-        # hide the x and y-axis labels
-        ax.get_xaxis().set_visible(False)
-        ax.get_yaxis().set_visible(False)
-    else:
-        KC = ctx.Place("Kansas City", zoom=12)
-        # "Loch Lloyd, MO", zoom=9
-        ax = KC.plot()
-        ax.autoscale(False)
-
-    # N81673 Archer
-    if "N81673" in fleet:
-        df_N81673 = db_data_getter("N81673", month, year)
-        airports_N81673 = airports_plotter("N81673", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N81673.empty:
-            geom_N81673 = \
-                [Point(xy) for xy in zip(df_N81673["longitude"].astype(float), df_N81673["latitude"].astype(float))]
-            gdf_N81673 = GeoDataFrame(df_N81673, geometry=geom_N81673)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N81673.crs = "EPSG:4326"
-            gdf_N81673 = gdf_N81673.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N81673_line = gdf_N81673.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N81673_line = gpd.GeoDataFrame(gdf_N81673_line, geometry="geometry")
-                gdf_N81673_line.plot(ax=ax, color="red", markersize=1, label="Archer - N81673")
-            else:
-                gdf_N81673 = gpd.GeoDataFrame(gdf_N81673, geometry="geometry")
-                gdf_N81673.plot(ax=ax, color="red", markersize=1, label="Archer - N81673")
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N81673 = []
-
-    # N3892Q C172 (OJC)
-    if "N3892Q" in fleet:
-        df_N3892Q = db_data_getter("N3892Q", month, year)
-        airports_N3892Q = airports_plotter("N3892Q", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N3892Q.empty:
-            geom_N3892Q = \
-                [Point(xy) for xy in zip(df_N3892Q["longitude"].astype(float), df_N3892Q["latitude"].astype(float))]
-            gdf_N3892Q = GeoDataFrame(df_N3892Q, geometry=geom_N3892Q)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N3892Q.crs = "EPSG:4326"
-            gdf_N3892Q = gdf_N3892Q.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N3892Q_line = gdf_N3892Q.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N3892Q_line = gpd.GeoDataFrame(gdf_N3892Q_line, geometry="geometry")
-                gdf_N3892Q_line.plot(ax=ax, color="blue", markersize=1, label="C172 - N3892Q")
-            else:
-                gdf_N3892Q = gpd.GeoDataFrame(gdf_N3892Q, geometry="geometry")
-                gdf_N3892Q.plot(ax=ax, color="blue", markersize=1, label="C172 - N3892Q")
-
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N3892Q = []
+    with span("render", option=option, local=local):
+        full_area_map(fleet, month, year, option, local, output=path)
+    render_cache_evict()
+    return path
 
-    # N20389 C172 (OJC)
-    if "N20389" in fleet:
-        df_N20389 = db_data_getter("N20389", month, year)
-        airports_N20389 = airports_plotter("N20389", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N20389.empty:
-            geom_N20389 = \
-                [Point(xy) for xy in zip(df_N20389["longitude"].astype(float), df_N20389["latitude"].astype(float))]
-            gdf_N20389 = GeoDataFrame(df_N20389, geometry=geom_N20389)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N20389.crs = "EPSG:4326"
-            gdf_N20389 = gdf_N20389.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N20389_line = gdf_N20389.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N20389_line = gpd.GeoDataFrame(gdf_N20389_line, geometry="geometry")
-                gdf_N20389_line.plot(ax=ax, color="green", markersize=1, label="C172 - N20389")
-            else:
-                gdf_N20389 = gpd.GeoDataFrame(gdf_N20389, geometry="geometry")
-                gdf_N20389.plot(ax=ax, color="green", markersize=1, label="C172 - N20389")
 
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N20389 = []
+def render_cached(fleet, month, year, option, local, output=None):
+    """
+    full_area_map through the render cache. The same selection with unchanged data is shown (or copied to output)
+    straight from the cached image, without loading the data, projecting or fetching the basemap.
 
-    # N182WK C182 (LXT)
-    if "N182WK" in fleet:
-        df_N182WK = db_data_getter("N182WK", month, year)
-        airports_N182WK = airports_plotter("N182WK", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N182WK.empty:
-            geom_N182WK = \
-                [Point(xy) for xy in zip(df_N182WK["longitude"].astype(float), df_N182WK["latitude"].astype(float))]
-            gdf_N182WK = GeoDataFrame(df_N182WK, geometry=geom_N182WK)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N182WK.crs = "EPSG:4326"
-            gdf_N182WK = gdf_N182WK.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N182WK_line = gdf_N182WK.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N182WK_line = gpd.GeoDataFrame(gdf_N182WK_line, geometry="geometry")
-                gdf_N182WK_line.plot(ax=ax, color="orange", markersize=1, label="C182 - N182WK")
-            else:
-                gdf_N182WK = gpd.GeoDataFrame(gdf_N182WK, geometry="geometry")
-                gdf_N182WK.plot(ax=ax, color="orange", markersize=1, label="C182 - N182WK")
+    :param fleet: list of aircraft that will be plotted.
+    :type fleet: list
+    :type month: str
+    :type year: int
+    :param option: "Points", "Lines" or "Heatmap"
+    :type option: str
+    :param local: False = total area map, True = Local KC map
+    :type local: bool
+    :param output: image file to write (.png/.jpg). None = show the map
+    :type output: str
+    :rtype: None
+    """
+    if output is None:
+        path = render_cache_path(fleet, month, year, option, local)
+        if os.path.exists(path):
+            os.utime(path)
+            logger.info(f" Map loaded from the render cache")
+            image_show(path)
+        else:
+            # interactive figure, saved to the cache before it is shown
+            with span("render", option=option, local=local):
+                full_area_map(fleet, month, year, option, local, cache=path)
+            render_cache_evict()
+        return
 
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N182WK = []
+    path = render_cache_fill(fleet, month, year, option, local, os.path.splitext(output)[1].lstrip(".").lower())
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    shutil.copy(path, output)
+    logger.info(f" Map saved to {output}")
 
-    # N58843 C182 (LXT)
-    if "N58843" in fleet:
-        df_N58843 = db_data_getter("N58843", month, year)
-        airports_N58843 = airports_plotter("N58843", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N58843.empty:
-            geom_N58843 = \
-                [Point(xy) for xy in zip(df_N58843["longitude"].astype(float), df_N58843["latitude"].astype(float))]
-            gdf_N58843 = GeoDataFrame(df_N58843, geometry=geom_N58843)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N58843.crs = "EPSG:4326"
-            gdf_N58843 = gdf_N58843.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N58843_line = gdf_N58843.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N58843_line = gpd.GeoDataFrame(gdf_N58843_line, geometry="geometry")
-                gdf_N58843_line.plot(ax=ax, color="grey", markersize=1, label="C182 - N58843")
-            else:
-                gdf_N58843 = gpd.GeoDataFrame(gdf_N58843, geometry="geometry")
-                gdf_N58843.plot(ax=ax, color="grey", markersize=1, label="C182 - N58843")
 
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N58843 = []
+def fleet_ingest(fleet=None, cancel=None):
+    """
+    Get the new flights of every aircraft, one after the other. A failing aircraft does not stop the others.
 
-    # N82145 Saratoga
-    if "N82145" in fleet:
-        df_N82145 = db_data_getter("N82145", month, year)
-        airports_N82145 = airports_plotter("N82145", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N82145.empty:
-            geom_N82145 = \
-                [Point(xy) for xy in zip(df_N82145["longitude"].astype(float), df_N82145["latitude"].astype(float))]
-            gdf_N82145 = GeoDataFrame(df_N82145, geometry=geom_N82145)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N82145.crs = "EPSG:4326"
-            gdf_N82145 = gdf_N82145.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N82145_line = gdf_N82145.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N82145_line = gpd.GeoDataFrame(gdf_N82145_line, geometry="geometry")
-                gdf_N82145_line.plot(ax=ax, color="black", markersize=1, label="Saratoga - N82145")
-            else:
-                gdf_N82145 = gpd.GeoDataFrame(gdf_N82145, geometry="geometry")
-                gdf_N82145.plot(ax=ax, color="black", markersize=1, label="Saratoga - N82145")
+    :param fleet: list of aircraft. None = whole registry
+    :type fleet: list
+    :param cancel: cancellation token
+    :type cancel: threading.Event
+    :return: run report = {started, finished, seconds, cancelled, aircraft: {N#: {status, legs, error, seconds}}}
+    :rtype: dict
+    """
+    started = datetime.now()
+    report = {"started": started.isoformat(timespec="seconds"), "aircraft": {}}
+    for aircraft, model, color in fleet_registry(fleet):
+        if cancelled(cancel):
+            break
+        logger.info(f" ~~~~~~~~~~~~~ {aircraft} ~~~~~~~~~~~~~")
+        aircraft_start = datetime.now()
+        try:
+            with span("ingest", aircraft=aircraft):
+                entry = {"status": "ok", "legs": db_data_saver(aircraft, cancel=cancel)}
+        # the pipeline calls sys.exit() on fatal errors, only this aircraft is lost
+        except (Exception, SystemExit) as e:
+            logger.critical(f" Data gathering failed for {aircraft}! (fleet_ingest)")
+            logger.critical(f" Error: {e}")
+            entry = {"status": "failed", "legs": 0, "error": str(e)}
+        entry["seconds"] = round((datetime.now() - aircraft_start).total_seconds(), 1)
+        report["aircraft"][aircraft] = entry
 
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N82145 = []
+    report["finished"] = datetime.now().isoformat(timespec="seconds")
+    report["seconds"] = round((datetime.now() - started).total_seconds(), 1)
+    report["cancelled"] = cancelled(cancel)
+    logger.info(f" Data gathering completed: {sum(e['legs'] for e in report['aircraft'].values())} new legs, "
+                f"{sum(e['status'] == 'failed' for e in report['aircraft'].values())} aircraft failed.")
+    return report
 
-    # N4803P Debonair
-    if "N4803P" in fleet:
-        df_N4803P = db_data_getter("N4803P", month, year)
-        airports_N4803P = airports_plotter("N4803P", month, year)
-        # Catch condition where there are is no flight history
-        if not df_N4803P.empty:
-            geom_N4803P = \
-                [Point(xy) for xy in zip(df_N4803P["longitude"].astype(float), df_N4803P["latitude"].astype(float))]
-            gdf_N4803P = GeoDataFrame(df_N4803P, geometry=geom_N4803P)
-
-            # define the coordinates initially as 4326 then convert to 3857
-            gdf_N4803P.crs = "EPSG:4326"
-            gdf_N4803P = gdf_N4803P.to_crs(epsg=3857)
-
-            if option == "Lines":
-                gdf_N4803P_line = gdf_N4803P.groupby(["ID"])["geometry"].apply(lambda x: LineString(x.tolist()))
-                gdf_N4803P_line = gpd.GeoDataFrame(gdf_N4803P_line, geometry="geometry")
-                gdf_N4803P_line.plot(ax=ax, color="magenta", markersize=1, label="Debonair - N4803P")
-            else:
-                gdf_N4803P = gpd.GeoDataFrame(gdf_N4803P, geometry="geometry")
-                gdf_N4803P.plot(ax=ax, color="magenta", markersize=1, label="Debonair - N4803P")
 
-    else:
-        # Create an empty list to allow for the airports plotter to combine all lists correctly
-        airports_N4803P = []
+def run_report_saver(report, path=RUN_REPORT):
+    """
+    Write a run report as JSON (replacing the previous one), and append it to the run history <path>l (JSON lines).
 
-    # Combined all the airport data, save only the unique values
-    airports_fleet = list(set(airports_N81673 +
-                              airports_N3892Q +
-                              airports_N20389 +
-                              airports_N182WK +
-                              airports_N58843 +
-                              airports_N82145 +
-                              airports_N4803P))
-    # Remove UNKW from list
-    # This catches both UNKW airports as well as aircraft that returned "UNKW" because the flight history was empty
-    if "UNKW" in airports_fleet:
-        airports_fleet.remove("UNKW")
-
-    # create list of visited airports in a list with format [lat, long, airport code]
-    airport_coords = []
-    for airport in airports_fleet:
-        airport_coords.append(airport_coordinates(airport))
-
-    coord_df = pd.DataFrame(columns=["latitude", "longitude", "airport"])
-
-    for step in airport_coords:
-        coord_df.loc[len(coord_df)] = step
-
-    # create geodataframe of airports
-    airport_gdf = \
-        geopandas.GeoDataFrame(coord_df, geometry=geopandas.points_from_xy(coord_df.longitude, coord_df.latitude))
-    airport_gdf = airport_gdf.set_crs(epsg=4326)
-    airport_gdf = airport_gdf.to_crs(epsg=3857)
-    for x, y, label in zip(airport_gdf.geometry.x, airport_gdf.geometry.y, airport_gdf.airport):
-        ax.annotate(label, xy=(x, y), xytext=(3, 3), textcoords="offset points", )
+    :type report: dict
+    :param path: report file
+    :type path: str
+    :rtype: None
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+    with open(path + "l", "a") as f:
+        f.write(json.dumps(report) + "\n")
 
-    # finally, plot
-    plt.legend(loc="upper left")
-    if month != "All":
-        plt.title(f"{month} flight history")
-    else:
-        plt.title(f"{year} flight history")
 
-    if not local:
-        ctx.add_basemap(ax)
+def ingest_daemon(fleet=None, interval_h=DAEMON_INTERVAL_H, jitter_min=DAEMON_JITTER_MIN, report_path=RUN_REPORT,
+                  cancel=None):
+    """
+    Scheduled fleet ingest for unattended runs: run fleet_ingest every interval_h hours, each run shifted by a random
+    +/- jitter_min minutes so the requests do not hit FlightAware at the same time every day.
+    Stops (at the next safe point) when cancel is set.
 
-    plt.show()
-    pass
+    :param fleet: list of aircraft. None = whole registry
+    :type fleet: list
+    :type interval_h: float
+    :type jitter_min: float
+    :param report_path: run report file, see run_report_saver
+    :type report_path: str
+    :param cancel: cancellation token
+    :type cancel: threading.Event
+    :rtype: None
+    """
+    cancel = Event() if cancel is None else cancel
+    # spread the first run as well
+    cancel.wait(random.uniform(0, jitter_min * 60))
+    while not cancel.is_set():
+        report = fleet_ingest(fleet, cancel)
+        delay = max(60.0, interval_h * 3600 + random.uniform(-jitter_min, jitter_min) * 60)
+        report["next_run"] = datetime.fromtimestamp(datetime.now().timestamp() + delay).isoformat(timespec="seconds")
+        run_report_saver(report, report_path)
+        trace_report("daemon")
+        logger.info(f" Next run at {report['next_run']}")
+        cancel.wait(delay)
+    logger.info(" Daemon stopped.")
 
 
 def main():
@@ -1789,13 +4294,220 @@ def main():
     root.update()
     root.attributes('-topmost', False)
 
-    fleet = ("N81673 - Archer",
-             "N3892Q - C172",
-             "N20389 - C172",
-             "N182WK - C182",
-             "N58843 - C182",
-             "N82145 - Saratoga",
-             "N4803P - Debonair")
+    fleet = tuple(f"{aircraft} - {model}" for aircraft, model, color in FLEET)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    #   Background jobs
+    #   Ingest, stats and render jobs run on worker threads (renders in a separate process, matplotlib is not thread
+    #   safe). Workers never touch the widgets: every event (progress, log, result) is a function put on job_events
+    #   and run on the Tk thread by poll_jobs.
+    # ------------------------------------------------------------------------------------------------------------------
+    job_events = queue.Queue()
+    job_pool = ThreadPoolExecutor(max_workers=3)
+    jobs_running = set()
+    job_cancels = set()
+    closing = Event()
+    render_pool = {}
+
+    def poll_jobs():
+        while True:
+            try:
+                event = job_events.get_nowait()
+            except queue.Empty:
+                break
+            event()
+        root.after(100, poll_jobs)
+
+    def invoke_on_tk(func, *args):
+        # Called by a worker: run func on the Tk thread and wait for its result (see airport_prompt)
+        done = Event()
+        result = {}
+
+        def call():
+            try:
+                result["value"] = func(*args)
+            finally:
+                done.set()
+        job_events.put(call)
+        # the window may be closed before the call runs
+        while not done.wait(0.5):
+            if closing.is_set():
+                break
+        return result.get("value")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    #   Log panel
+    #   Every logger record (from any thread) goes through the LogPanelHandler queue. drain_log inserts them in
+    #   batches: repeated lines are coalesced and only the last LOG_PANEL_MAX_LINES lines are kept.
+    # ------------------------------------------------------------------------------------------------------------------
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    log_handler = LogPanelHandler(log_queue)
+    log_handler.setLevel(logging.INFO)
+    log_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def drain_log():
+        lines = []
+        for _ in range(LOG_PANEL_BATCH):
+            try:
+                record = log_queue.get_nowait()
+            except queue.Empty:
+                break
+            line = record.getMessage()
+            if record.levelno >= logging.WARNING:
+                line = f"{record.levelname} -{line}"
+            # coalesce repeated lines
+            if lines and lines[-1][0] == line:
+                lines[-1][1] += 1
+            else:
+                lines.append([line, 1])
+        if log_handler.dropped:
+            lines.append([f" ... {log_handler.dropped} log messages dropped, the log panel could not keep up", 1])
+            log_handler.dropped = 0
+
+        if lines:
+            log_output.configure(state="normal")  # allow editing of the log
+            log_output.insert(tk.END, "\n".join(line if count == 1 else f"{line} (x{count})"
+                                                for line, count in lines) + "\n")
+            # trim the oldest lines
+            excess = int(log_output.index("end-1c").split(".")[0]) - LOG_PANEL_MAX_LINES
+            if excess > 0:
+                log_output.delete("1.0", f"{excess + 1}.0")
+            # Always scroll to the index: "end"
+            log_output.see(tk.END)
+            log_output.configure(state="disabled")  # disable editing of the log
+        root.after(LOG_PANEL_INTERVAL_MS, drain_log)
+
+    def run_job(name, func, *args, on_done=None, on_error=None, cancel=None):
+        """
+        Run func(*args) on a worker thread. on_done(result) is then called on the Tk thread.
+        Only one job of each name runs at a time.
+
+        :param name: job name, ex: "Ingest"
+        :type name: str
+        :param func: function executed by the worker
+        :param on_done: called with the result of func, on the Tk thread
+        :param on_error: called with the exception if func failed, on the Tk thread
+        :param cancel: cancellation token of the job, set when the main window is closed
+        :type cancel: threading.Event
+        """
+        if name in jobs_running:
+            logger.info(f" {name} is already running...")
+            return
+        jobs_running.add(name)
+        if cancel is not None:
+            job_cancels.add(cancel)
+
+        def work():
+            run_id = trace_run_id(name)
+            try:
+                with span("job", job=name, run=run_id):
+                    result = func(*args)
+            # the pipeline calls sys.exit() on fatal errors, it must only end the job
+            except BaseException as e:
+                logger.critical(f" {name} failed! (run_job)")
+                logger.critical(f" Error: {e}")
+                job_events.put(lambda error=e: finished(None, error))
+            else:
+                job_events.put(lambda: finished(result, None))
+            trace_report(name, run_id=run_id)
+
+        def finished(result, error):
+            jobs_running.discard(name)
+            job_cancels.discard(cancel)
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+            elif on_done is not None:
+                on_done(result)
+
+        job_pool.submit(work)
+
+    def render_process():
+        # the render process is started on first use, and kept: its in-memory cache holds the prefetched data.
+        # Spawned, not forked: by then Tk and the worker threads are running, a forked child could inherit their
+        # locks (Xlib, logging) in a held state and deadlock
+        if "pool" not in render_pool:
+            render_pool["pool"] = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                                      initializer=render_worker_init,
+                                                      initargs=(pw, MYSQL_HOST, MYSQL_PORT, MYSQL_USER))
+        return render_pool["pool"]
+
+    def render_in_process(*job):
+        # render the map in the render process, then show the cached image. Renders go first: the prefetches still
+        # queued on the single render worker are dropped
+        for future in prefetch_state["render"]:
+            future.cancel()
+        result, spans = render_process().submit(traced, render_cache_fill, *job, attrs=trace_attrs()).result()
+        trace_merge(spans)
+        return result
+
+    # ------------------------------------------------------------------------------------------------------------------
+    #   Prefetch
+    #   When the month, year or aircraft selection changes, the selected aircraft-months are loaded ahead of time
+    #   (layers_prefetch), one task per aircraft: into the render process cache for the maps, and into this process
+    #   cache for the stats (calculate_stats runs on a job thread). A new selection or a render cancels the tasks not
+    #   started yet.
+    # ------------------------------------------------------------------------------------------------------------------
+    prefetch_state = {"render": [], "local": [], "after": None}
+    prefetch_pool = ThreadPoolExecutor(max_workers=1)
+
+    def prefetch_selection(event=None):
+        # wait for the selection to settle (shift-click, scrolling through the comboboxes)
+        if prefetch_state["after"] is not None:
+            root.after_cancel(prefetch_state["after"])
+        prefetch_state["after"] = root.after(300, prefetch_start)
+
+    def prefetch_start():
+        prefetch_state["after"] = None
+        for future in prefetch_state["render"] + prefetch_state["local"]:
+            future.cancel()
+        prefetch_state["render"] = []
+        prefetch_state["local"] = []
+
+        # only once connected, changing the selection must not open the password window
+        if "pw" not in globals():
+            return
+        sel_aircraft = [fleet_listbox.get(i).split("-")[0].strip() for i in fleet_listbox.curselection()]
+        sel_month = month_cb.get()
+        sel_year = year_cb.get()
+        if sel_year != "All":
+            sel_year = int(sel_year)
+        if not sel_aircraft:
+            return
+
+        # the prefetch of a selection is one traced run, reported once all its tasks are done or cancelled
+        attrs = {"run": trace_run_id("Prefetch")}
+        pending = {"tasks": 2 * len(sel_aircraft)}
+        pending_lock = Lock()
+
+        def prefetch_done(future):
+            if not future.cancelled() and future.exception() is None and future.result() is not None:
+                trace_merge(future.result()[1])
+            with pending_lock:
+                pending["tasks"] -= 1
+                last = pending["tasks"] == 0
+            if last:
+                trace_report("Prefetch", run_id=attrs["run"])
+
+        pool = render_process()
+        prefetch_state["render"] = [pool.submit(traced, layers_prefetch, aircraft, sel_month, sel_year, attrs=attrs)
+                                    for aircraft in sel_aircraft]
+        prefetch_state["local"] = [prefetch_pool.submit(trace_bound(layers_prefetch, attrs), aircraft, sel_month,
+                                                        sel_year)
+                                   for aircraft in sel_aircraft]
+        for future in prefetch_state["render"] + prefetch_state["local"]:
+            future.add_done_callback(prefetch_done)
+
+    def close_window():
+        # cancel the running jobs at their next safe point and drop the queued ones
+        closing.set()
+        for cancel in list(job_cancels):
+            cancel.set()
+        job_pool.shutdown(wait=False, cancel_futures=True)
+        prefetch_pool.shutdown(wait=False, cancel_futures=True)
+        if "pool" in render_pool:
+            render_pool["pool"].shutdown(wait=False, cancel_futures=True)
+        root.destroy()
 
     def check_pw():
         # Check if the PW has been set. If not, get PW with mysql_connect()
@@ -1893,30 +4605,26 @@ def main():
             pw = pass_text.get()
 
             # log output
-            log_output.configure(state="normal")  # allow editing of the log
-            log_output.insert(tk.END, f" Attempting to connect to MySQL...\n\n")
+            logger.info(f" Attempting to connect to MySQL...")
 
             # Test the database connection
             try:
                 # Init connection to MySQL database
-                db = mysql.connector.connect(
-                    host="localhost",
-                    user="root",
+                db = mysql_connector.connect(
+                    host=MYSQL_HOST,
+                    port=MYSQL_PORT,
+                    user=MYSQL_USER,
                     passwd=pw,
                 )
-                log_output.insert(tk.END, f" Connection successful!\n\n")
+                logger.info(f" Connection successful!")
             except Exception as e:
                 logger.critical(f" database connection failed! (mysql_dummy)")
                 logger.critical(f" Error: {e}")
-                log_output.insert(tk.END, f" Incorrect password, please try again.\n\n")
+                logger.info(f" Incorrect password, please try again.")
             else:
                 connector.destroy()
                 db.close()  # close db connection, as it was only used to test the password
 
-            # Always scroll to the index: "end"
-            log_output.see(tk.END)
-            log_output.configure(state="disabled")  # disable editing of the log
-
         # Wait for the window to close before continuing.
         # This is most useful when "interrupting" other functions to ask for the password to be entered.
         connector.wait_window(connector)
@@ -1937,6 +4645,10 @@ def main():
 
         selected_aircraft_str = "\n".join(selected_aircraft)
 
+        if "Data gathering" in jobs_running:
+            logger.info(f" Data gathering is already running...")
+            return
+
         # create message box that contains a progress bar on the status of the fleet
         aircraft_progress = tk.Toplevel(root)
         aircraft_progress.title("Data Gathering Progress")
@@ -1963,16 +4675,20 @@ def main():
                             text=f" Getting aircraft data for: \n{selected_aircraft_str}")
         prog_msg.grid(column=1, row=0)
 
-        # create the progressbar
+        # create the progressbar: one unit per aircraft, split between the flight legs of the aircraft
         pb = ttk.Progressbar(
             aircraft_progress,
             orient='horizontal',
-            mode='indeterminate',
+            mode='determinate',
+            maximum=len(selected_aircraft),
             length=280)
 
         # place the progressbar
-        pb.grid(column=1, row=1, columnspan=2, padx=10, pady=20)
-        pb.start()
+        pb.grid(column=1, row=1, columnspan=2, padx=10, pady=5)
+
+        # LABEL: current aircraft and leg
+        leg_msg = tk.Label(aircraft_progress, text="")
+        leg_msg.grid(column=1, row=2, pady=5)
 
         # BUTTON: cancel data gathering
         data_cancel_button = ttk.Button(
@@ -1981,34 +4697,52 @@ def main():
             command=lambda: data_cancel())
         data_cancel_button.grid(
             column=1,
-            row=2)
-
-        # 11/24/22 TODO threading is not quite working. Progress bar is not progressing, only updating with .update()
-        # Call data gathering
-        for aircraft in selected_aircraft:
-            aircraft_progress.update_idletasks()
-            aircraft_progress.update()
-            logger.info(f" ~~~~~~~~~~~~~ {aircraft} ~~~~~~~~~~~~~")
-            Thread(target=db_data_saver(aircraft)).start()
-            logger.info(f"\n")
-            if aircraft == selected_aircraft[-1]:
-                log_output.configure(state="normal")  # allow editing of the log
-                log_output.insert(tk.END, f"Data gathering completed!\n\n")
+            row=3)
+
+        def show_progress(n, aircraft, done, total):
+            # runs on the Tk thread, the window may already be closed
+            if not aircraft_progress.winfo_exists():
+                return
+            pb["value"] = n + (done / total if total else 1)
+            if total:
+                leg_msg.configure(text=f"{aircraft}: leg {done} of {total}")
+            else:
+                leg_msg.configure(text=f"{aircraft}: no new legs")
+
+        # set by the Cancel button, db_data_saver stops at the next flight leg
+        cancel = Event()
+
+        def ingest():
+            # runs on a worker thread
+            for n, aircraft in enumerate(selected_aircraft):
+                if cancel.is_set():
+                    break
+                logger.info(f" ~~~~~~~~~~~~~ {aircraft} ~~~~~~~~~~~~~")
+                with span("ingest", aircraft=aircraft):
+                    db_data_saver(aircraft,
+                                  progress=lambda done, total, n=n, aircraft=aircraft:
+                                  job_events.put(lambda: show_progress(n, aircraft, done, total)),
+                                  cancel=cancel)
+                job_events.put(lambda n=n, aircraft=aircraft: show_progress(n, aircraft, 0, 0))
+                logger.info(f"\n")
+
+        def ingest_done(result):
+            if cancel.is_set():
+                logger.info(" Data gathering has been cancelled! The remaining legs will be fetched next time.")
+            else:
                 logger.info(" Data gathering completed!")
+            if aircraft_progress.winfo_exists():
                 aircraft_progress.destroy()
-                # Always scroll to the index: "end"
-                log_output.see(tk.END)
-                log_output.configure(state="disabled")  # disable editing of the log
-            else:
-                aircraft_progress.after(1000)
 
         def data_cancel():
-            log_output.configure(state="normal")  # allow editing of the log
-            log_output.insert(tk.END, f"Data gathering has been cancelled!\n\n")
-            aircraft_progress.destroy()
-            # Always scroll to the index: "end"
-            log_output.see(tk.END)
-            log_output.configure(state="disabled")  # disable editing of the log
+            # the window closes once the current leg is saved
+            cancel.set()
+            data_cancel_button.configure(state="disabled")
+            leg_msg.configure(text="Cancelling...")
+
+        # closing the progress window also cancels
+        aircraft_progress.protocol("WM_DELETE_WINDOW", data_cancel)
+        run_job("Data gathering", ingest, on_done=ingest_done, on_error=lambda e: ingest_done(None), cancel=cancel)
 
     def graph_aircraft(map_size):
         """
@@ -2034,26 +4768,23 @@ def main():
         # get the month from the month combobox
         sel_month = month_cb.get()
 
-        # get the year from the year combobox, convert to integer
-        sel_year = int(year_cb.get())
+        # get the year from the year combobox, convert to integer (unless "All" is selected)
+        sel_year = year_cb.get()
+        if sel_year != "All":
+            sel_year = int(sel_year)
 
         # get the plotting option (points or strings) from the sel_options radio buttons
         sel_option = selected_option.get()
 
-        # call the grapher
-        if map_size == "full":
-            full_area_map(sel_aircraft, sel_month, sel_year, sel_option, False)
-        else:
-            full_area_map(sel_aircraft, sel_month, sel_year, sel_option, True)
+        def graph_done(path):
+            image_show(path)
+            # log the commands
+            logger.info(f" A graph with the following aircraft has been created: {sel_aircraft_str}")
 
-        # log the commands
-        log_output.configure(state="normal")  # allow editing of the log
-        log_output.insert(tk.END,
-                          f" \nA local graph with the following aircraft has been created:\n {sel_aircraft_str}")
-        log_output.insert(tk.END, f"\n\n")
-        # Always scroll to the index: "end"
-        log_output.see(tk.END)
-        log_output.configure(state="disabled")  # disable editing of the log
+        # call the grapher in the render process
+        logger.info(f" Rendering the map...")
+        run_job("Rendering", render_in_process, sel_aircraft, sel_month, sel_year, sel_option, map_size != "full",
+                on_done=graph_done)
 
     def calculate_stats_tkinter():
         check_pw()
@@ -2067,22 +4798,19 @@ def main():
             sel_aircraft[i] = x.split("-")[0].strip()
         if not sel_aircraft:
             error_none_selected()
+            return
 
         # get the month from the month combobox
         sel_month = month_cb.get()
 
-        # get the year from the year combobox, convert to integer
-        sel_year = int(year_cb.get())
-
-        calculate_stats(sel_aircraft, sel_month, sel_year)
+        # get the year from the year combobox, convert to integer (unless "All" is selected)
+        sel_year = year_cb.get()
+        if sel_year != "All":
+            sel_year = int(sel_year)
 
-        # log the commands
-        log_output.configure(state="normal")  # allow editing of the log
-        log_output.insert(tk.END, f"\n Stats! Stats! Stats!")
-        log_output.insert(tk.END, f"\n")
-        # Always scroll to the index: "end"
-        log_output.see(tk.END)
-        log_output.configure(state="disabled")  # disable editing of the log
+        # log the commands once the stats are done
+        run_job("Stats", calculate_stats, sel_aircraft, sel_month, sel_year,
+                on_done=lambda result: logger.info(f" Stats! Stats! Stats!"))
 
     def clear_log():
         log_output.configure(state="normal")  # allow editing of the log
@@ -2099,13 +4827,6 @@ def main():
         # Catch no URL error condition
         if len(entered_url) == 1:
             logger.warning(f" No URL has been entered!")
-            # log the commands
-            log_output.configure(state="normal")  # allow editing of the log
-            log_output.insert(tk.END, f"\n No URL has been entered!")
-            log_output.insert(tk.END, f"\n")
-            # Always scroll to the index: "end"
-            log_output.see(tk.END)
-            log_output.configure(state="disabled")  # disable editing of the log
             return
 
         # strip any potential extra pieces to properly call flightaware_getter
@@ -2129,74 +4850,61 @@ def main():
 
         # Check if password exists
         check_pw()
-        # Create SQLAlchemy engine to connect to MySQL Database
-        user = "root"
-        passwd = pw
-        database = db_name
-        host_ip = '127.0.0.1'
-        port = "3306"
-        engine = create_engine(
-            'mysql+mysqlconnector://' + user + ':' + passwd + '@' + host_ip + ':' + port + '/' + database,
-            echo=False)
-        try:
-            # Convert dataframe to sql table (flight_history)
-            new_hist_df.to_sql('flight_history', engine, if_exists="append", index=False)
-        except Exception as e:
-            logger.critical(" An error occurred with the SQLAclhemy engine! (db_data_saver)")
-            logger.critical(f" Error: {e}")
-            sys.exit(e)
 
-        # make table name
-        date = date.replace("-", "_")
-        hour = time[0:2:]
-        table_name = date + "__" + route.lower() + "__" + hour
+        def url_data_saver():
+            # runs on a worker thread
+            # Create SQLAlchemy engine to connect to MySQL Database
+            engine = mysql_engine(db_name)
+            try:
+                # Convert dataframe to sql table (flight_history)
+                new_hist_df.to_sql('flight_history', engine, if_exists="append", index=False)
+            except Exception as e:
+                logger.critical(" An error occurred with the SQLAclhemy engine! (db_data_saver)")
+                logger.critical(f" Error: {e}")
+                sys.exit(e)
+            utilization_refresh(db_name, since=date)
 
-        # create new MySQL table and populate with data
-        try:
-            # Init connection to MySQL database
-            db = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                passwd=pw,
-                database=db_name)
-            logger.info(f" Database connection to {db_name} successful.")
-        except Exception as e:
-            logger.critical(f" {db_name} database connection failed! (mysql_connect)")
-            sys.exit(e)
-        mycursor = db.cursor()
+            # make table name
+            table_date = date.replace("-", "_")
+            hour = time[0:2:]
+            table_name = table_date + "__" + route.lower() + "__" + hour
 
-        # Build new flight details tables
-        try:
-            # Create a flight details CHILD table
-            mycursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name}("
-                             "time MEDIUMINT(10), "
-                             "latitude FLOAT, "
-                             "longitude FLOAT, "
-                             "knots MEDIUMINT(5), "
-                             "altitude MEDIUMINT(5))")
-        except Exception as e:
-            logger.warning(f" Error while attempting to create table {table_name}")
-            logger.warning(e)
+            # create new MySQL table and populate with data
+            db = mysql_connect(db_name)
+            mycursor = db.cursor()
 
-        # get the flight details
-        details_df = flightaware_getter(entered_url)
-        try:
-            # Convert dataframe to sql table (flight details)
-            details_df.to_sql(table_name, engine, if_exists="replace", index=False)
-        except Exception as e:
-            logger.warning(f" An error occurred while trying to populate the flight data tables! (db_data_saver)")
-            logger.warning(f" Error: {e}")
+            # Build new flight details tables
+            try:
+                # Create a flight details CHILD table
+                mycursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name}("
+                                 "time VARCHAR(8), "
+                                 "timestamp BIGINT, "
+                                 "latitude FLOAT, "
+                                 "longitude FLOAT, "
+                                 "knots MEDIUMINT(5), "
+                                 "altitude MEDIUMINT(5))")
+            except Exception as e:
+                logger.warning(f" Error while attempting to create table {table_name}")
+                logger.warning(e)
 
-        logger.info(f" Table built successfully!")
-        db.close()
+            # get the flight details
+            details_df = flightaware_getter(entered_url)
+            try:
+                # Convert dataframe to sql table (flight details)
+                details_df.to_sql(table_name, engine, if_exists="replace", index=False)
+                landings_saver(db, engine, table_name, details_df, airport_index())
+                track_index_saver(db_name, table_name, details_df)
+                data_version_bump(db_name, [table_name])
+            except Exception as e:
+                logger.warning(f" An error occurred while trying to populate the flight data tables! (db_data_saver)")
+                logger.warning(f" Error: {e}")
 
-        # log the commands
-        log_output.configure(state="normal")  # allow editing of the log
-        log_output.insert(tk.END, f"\n {entered_url} has been successfully uploaded to the DB!")
-        log_output.insert(tk.END, f"\n")
-        # Always scroll to the index: "end"
-        log_output.see(tk.END)
-        log_output.configure(state="disabled")  # disable editing of the log
+            logger.info(f" Table built successfully!")
+            db.close()
+
+        # log the commands once the flight is saved
+        run_job("URL upload", url_data_saver,
+                on_done=lambda result: logger.info(f" {entered_url.strip()} has been successfully uploaded to the DB!"))
 
     # define the row where the main buttons are
     bot_button_row = 7
@@ -2266,6 +4974,11 @@ def main():
         row=5,
         sticky="N")
 
+    # Start loading the selected data as soon as the selection changes
+    month_cb.bind("<<ComboboxSelected>>", prefetch_selection)
+    year_cb.bind("<<ComboboxSelected>>", prefetch_selection)
+    fleet_listbox.bind("<<ListboxSelect>>", prefetch_selection)
+
     # BUTTON: Connect to MySQL Database
     connect_mysql = ttk.Button(
         root,
@@ -2276,8 +4989,9 @@ def main():
         row=bot_button_row,
         padx=25)
 
-    def thread_sub1():  # TODO DOCUMENTATION OF THREAD_SUB1
-        Thread(target=get_aircraft_data()).start()
+    def thread_sub1():
+        # the data gathering itself runs as a background job (see run_job)
+        get_aircraft_data()
 
     # BUTTON: Get flight history
     aircraft_button = ttk.Button(
@@ -2379,7 +5093,8 @@ def main():
     selected_option = tk.StringVar()
     selected_option.set("Lines")  # Default radio button option
     options = (("Points", "Points"),
-               ("Lines", "Lines"))
+               ("Lines", "Lines"),
+               ("Heatmap", "Heatmap"))
 
     for i, option in enumerate(options):
         rad_opt = ttk.Radiobutton(
@@ -2394,11 +5109,147 @@ def main():
             row=10 + i
         )
 
-    # Execute the root window
-    Thread(target=root.mainloop()).start()
+    # Execute the root window, polling the background job events
+    global gui_invoke
+    gui_invoke = invoke_on_tk
+    root.protocol("WM_DELETE_WINDOW", close_window)
+    root.after(100, poll_jobs)
+    logger.addHandler(log_handler)
+    root.after(LOG_PANEL_INTERVAL_MS, drain_log)
+    if WARM_IMPORTS:
+        root.after(200, lambda: Thread(target=warm_imports, daemon=True).start())
+    root.mainloop()
+    logger.removeHandler(log_handler)
+    gui_invoke = None
 
     logger.info(" Code complete.")
 
 
+def cli_credentials(config):
+    """
+    MySQL credentials of a command line run: config file / environment (see load_credentials), or a password prompt
+    when running in a terminal. Exits when no password is available (cron, daemon).
+
+    :param config: JSON config file
+    :type config: str
+    :rtype: None
+    """
+    global pw
+    if load_credentials(config):
+        return
+    if not sys.stdin.isatty():
+        logger.critical(f" No MySQL password: set FCKC_MYSQL_PW or add it to {config} (cli_credentials)")
+        sys.exit(2)
+    pw = getpass.getpass("MySQL password: ")
+
+
+def cli(argv):
+    """
+    Command line entry point, used when main.py is called with arguments. Runs headless: no window is opened.
+
+    :param argv: command line arguments (excluding the script name)
+    :type argv: list
+    :return: exit code
+    :rtype: int
+    """
+    global TILE_CACHE_MAX_MB, HEADLESS
+
+    parser = argparse.ArgumentParser(prog="main.py", description="FCKC Plane Tracker")
+    parser.add_argument("--config", default=CONFIG_FILE, help="JSON config file with the MySQL credentials")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="get the new flights of the fleet from FlightAware")
+    ingest.add_argument("--fleet", nargs="+", default=None, help="aircraft to update. Default: whole fleet")
+    ingest.add_argument("--report", default=None, help="write the run report to this JSON file")
+
+    daemon = subparsers.add_parser("daemon", help="scheduled fleet ingest, runs until stopped (SIGTERM/Ctrl-C)")
+    daemon.add_argument("--fleet", nargs="+", default=None, help="aircraft to update. Default: whole fleet")
+    daemon.add_argument("--interval", type=float, default=DAEMON_INTERVAL_H, help="hours between runs")
+    daemon.add_argument("--jitter", type=float, default=DAEMON_JITTER_MIN, help="random +/- minutes per run")
+    daemon.add_argument("--report", default=RUN_REPORT, help="run report JSON file")
+
+    stats = subparsers.add_parser("stats", help="calculate the fleet stats")
+    stats.add_argument("--year", default=datetime.now().strftime("%Y"), help="year, or All")
+    stats.add_argument("--month", choices=MONTHS + ["All"], default=datetime.now().strftime("%B"))
+    stats.add_argument("--fleet", nargs="+", default=None, help="aircraft. Default: whole fleet")
+
+    prefetch = subparsers.add_parser("prefetch-tiles", help="seed the local basemap tile cache")
+    prefetch.add_argument("--min-zoom", type=int, default=PREFETCH_ZOOMS[0])
+    prefetch.add_argument("--max-zoom", type=int, default=PREFETCH_ZOOMS[-1])
+    prefetch.add_argument("--max-mb", type=int, default=None, help="tile cache size limit (FCKC_TILE_CACHE_MB)")
+
+    render = subparsers.add_parser("render", help="render maps into the year/month archive (headless)")
+    render.add_argument("--year", type=int, required=True)
+    render.add_argument("--month", choices=MONTHS + ["All"], default=None,
+                        help="single month to render. Default: every month plus the full year")
+    render.add_argument("--fleet", nargs="+", default=None, help="aircraft to plot. Default: whole fleet")
+    render.add_argument("--option", nargs="+", choices=["Points", "Lines", "Heatmap"], default=["Lines"])
+    render.add_argument("--local", choices=["full", "kc", "both"], default="both", help="map size")
+    render.add_argument("--processes", type=int, default=None, help="render processes. Default: every core")
+    render.add_argument("--format", choices=["png", "jpg"], default="png")
+    render.add_argument("--archive", default=ARCHIVE_DIR, help="archive directory")
+
+    backfill = subparsers.add_parser("backfill", help="timestamps, track index and landings of the older flights")
+    backfill.add_argument("--fleet", nargs="+", default=None, help="aircraft to backfill. Default: whole fleet")
+
+    export = subparsers.add_parser("export", help="incremental GeoJSON export for the web map")
+    export.add_argument("--fleet", nargs="+", default=None, help="aircraft to export. Default: whole fleet")
+    export.add_argument("--output", default=EXPORT_DIR, help="export directory")
+
+    args = parser.parse_args(argv)
+
+    HEADLESS = True
+    plt.switch_backend("Agg")
+
+    if args.command == "prefetch-tiles":
+        if args.max_mb is not None:
+            TILE_CACHE_MAX_MB = args.max_mb
+        tile_prefetch(zooms=range(args.min_zoom, args.max_zoom + 1))
+        return 0
+
+    cli_credentials(args.config)
+
+    if args.command in ("ingest", "daemon"):
+        # SIGTERM/Ctrl-C stop the run at the next flight leg, see db_data_saver
+        cancel = Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: cancel.set())
+        signal.signal(signal.SIGTERM, lambda signum, frame: cancel.set())
+        if args.command == "daemon":
+            ingest_daemon(args.fleet, args.interval, args.jitter, args.report, cancel)
+            return 0
+        report = fleet_ingest(args.fleet, cancel)
+        if args.report is not None:
+            run_report_saver(report, args.report)
+        return 1 if any(entry["status"] == "failed" for entry in report["aircraft"].values()) else 0
+
+    elif args.command == "stats":
+        year = args.year if args.year == "All" else int(args.year)
+        calculate_stats([entry[0] for entry in fleet_registry(args.fleet)], args.month, year)
+
+    elif args.command == "render":
+        fleet = [entry[0] for entry in fleet_registry(args.fleet)]
+        months = MONTHS + ["All"] if args.month is None else [args.month]
+        local = {"full": [False], "kc": [True], "both": [False, True]}[args.local]
+        jobs = [(month, args.year, fleet, option, loc) for month in months for option in args.option for loc in local]
+        written = render_batch(jobs, args.archive, args.processes, args.format)
+        return 0 if len(written) == len(jobs) else 1
+
+    elif args.command == "backfill":
+        fleet = [entry[0] for entry in fleet_registry(args.fleet)]
+        for aircraft in fleet:
+            timestamp_backfill(aircraft)
+            track_index_update(aircraft)
+        landings_backfill(fleet)
+
+    elif args.command == "export":
+        geojson_export(args.fleet, args.output)
+
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        exit_code = cli(sys.argv[1:])
+        trace_report(" ".join(sys.argv[1:]))
+        sys.exit(exit_code)
     sys.exit(main())